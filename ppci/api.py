@@ -3,12 +3,15 @@ The api module contains a set of handy functions to invoke compilation,
 linking and assembling.
 """
 
+import hashlib
 import io
 import logging
 import os
 import stat
 import xml
 from .lang.c import preprocess, c_to_ir, COptions
+from .lang.c import CBuilder, CPreProcessor
+from .lang.c.utils import LineInfo
 from .lang.c3 import c3_to_ir
 from .lang.bf import bf_to_ir
 from .lang.fortran import fortran_to_ir
@@ -17,17 +20,11 @@ from .lang.pascal import pascal_to_ir
 from .lang.ws import ws_to_ir
 from .lang.python import python_to_ir, ir_to_python
 from .wasm import wasm_to_ir, read_wasm
-from .irutils import verify_module
+from . import ir
+from .irutils import verify_module, Writer
 from .utils.reporting import DummyReportGenerator, HtmlReportGenerator
-from .opt.transform import DeleteUnusedInstructionsPass
-from .opt.transform import RemoveAddZeroPass
-from .opt import CommonSubexpressionEliminationPass
-from .opt import ConstantFolder
-from .opt import LoadAfterStorePass
-from .opt import CleanPass
-from .opt.mem2reg import Mem2RegPromotor
-from .opt.cjmp import CJumpPass
-from .opt.tailcall import TailCallOptimization
+from .utils.cache import DiskCache, make_key
+from .opt import PassManager
 from .codegen import CodeGenerator
 from .binutils.linker import link
 from .binutils.archive import archive
@@ -59,6 +56,7 @@ __all__ = [
     "optimize",
     "preprocess",
     "get_arch",
+    "get_cache",
     "get_current_arch",
     "is_platform_supported",
     "ir_to_object",
@@ -86,6 +84,25 @@ def get_reporter(reporter):
         return reporter
 
 
+def get_cache(cache):
+    """Get a compilation cache.
+
+    Args:
+        cache: Either None for no caching, True to use the default cache
+            directory, a directory name or a
+            :class:`ppci.utils.cache.DiskCache` instance.
+    """
+    if cache is None or cache is False:
+        return None
+    elif cache is True:
+        return DiskCache()
+    elif isinstance(cache, str):
+        return DiskCache(cache)
+    else:
+        assert isinstance(cache, DiskCache)
+        return cache
+
+
 def is_platform_supported():
     """ Determine if this platform is supported """
     return get_current_arch() is not None
@@ -181,7 +198,7 @@ def disasm(data, march):
     disassembler.disasm(data, ostream)
 
 
-OPT_LEVELS = ("0", "1", "2", "s")
+OPT_LEVELS = ("0", "1", "2", "3", "s")
 
 
 def optimize(ir_module, level=0, reporter=None):
@@ -191,10 +208,11 @@ def optimize(ir_module, level=0, reporter=None):
 
     Args:
         ir_module (ppci.ir.Module): The ir module to optimize.
-        level: The optimization level, 0 is default. Can be 0,1,2 or s
+        level: The optimization level, 0 is default. Can be 0,1,2,3 or s
             0: No optimization
             1: some optimization
             2: more optimization
+            3: inline larger functions and unroll small loops
             s: optimize for size
         reporter: Report detailed log to this reporter
     """
@@ -212,41 +230,28 @@ def optimize(ir_module, level=0, reporter=None):
     if level == "0":
         return
 
-    # TODO: differentiate between optimization levels!
-
-    # Optimization passes (bag of tricks) run them three times:
-    opt_passes = [
-        Mem2RegPromotor(),
-        RemoveAddZeroPass(),
-        ConstantFolder(),
-        CommonSubexpressionEliminationPass(),
-        TailCallOptimization(),
-        LoadAfterStorePass(),
-        DeleteUnusedInstructionsPass(),
-        CleanPass(),
-    ] * 3
-
-    if level == "3":
-        opt_passes.append(CJumpPass())
-
-    # Run the passes over the module:
+    pass_manager = PassManager.from_level(level)
     verify_module(ir_module)
-    for opt_pass in opt_passes:
-        opt_pass.run(ir_module)
-        # reporter.message('{} after {}:'.format(ir_module, opt_pass))
-        # reporter.dump_ir(ir_module)
+    pass_manager.run(ir_module)
 
     if reporter:
         # Dump report:
         reporter.message("{} after optimization:".format(ir_module))
         reporter.message("{} {}".format(ir_module, ir_module.stats()))
+        pass_manager.report(reporter)
         reporter.dump_ir(ir_module)
 
     verify_module(ir_module)
 
 
 def ir_to_stream(
-    ir_module, march, output_stream, reporter=None, debug=False, opt="speed"
+    ir_module,
+    march,
+    output_stream,
+    reporter=None,
+    debug=False,
+    opt="speed",
+    regalloc="auto",
 ):
     """Translate IR module to output stream."""
     march = get_arch(march)
@@ -254,7 +259,9 @@ def ir_to_stream(
     if not reporter:  # pragma: no cover
         reporter = DummyReportGenerator()
 
-    code_generator = CodeGenerator(march, reporter, optimize_for=opt)
+    code_generator = CodeGenerator(
+        march, reporter, optimize_for=opt, regalloc=regalloc
+    )
     verify_module(ir_module)
 
     # Code generation:
@@ -271,7 +278,15 @@ def ir_to_assembly(ir_modules, march, add_binary=False):
 
 
 def ir_to_object(
-    ir_modules, march, reporter=None, debug=False, opt="speed", outstream=None
+    ir_modules,
+    march,
+    reporter=None,
+    debug=False,
+    opt="speed",
+    outstream=None,
+    jobs=None,
+    cache=None,
+    regalloc="auto",
 ):
     """Translate IR-modules into code for the given architecture.
 
@@ -283,6 +298,13 @@ def ir_to_object(
         debug (bool): include debugging information
         opt (str): optimization goal. Can be 'speed', 'size' or 'co2'.
         outstream: instruction stream to write instructions to
+        jobs (int): the amount of processes to use for code generation of
+            the functions. The object file is the same as the object
+            file of a serial build. Not used when an outstream is given.
+        cache: cache for the generated object, see :func:`get_cache`.
+            Not used when debug information or an outstream is requested.
+        regalloc (str): the register allocator to use. Can be 'coloring',
+            'linear' or 'auto', see :class:`ppci.codegen.CodeGenerator`.
 
     Returns:
         ObjectFile: An object file
@@ -295,6 +317,32 @@ def ir_to_object(
     reporter.heading(2, "Code generation")
     reporter.message("Target: {}".format(march))
 
+    cache = get_cache(cache)
+    if cache is not None and not debug and not outstream:
+        # The ir-code identifies the module, except for the debug
+        # database, hence the debug check above.
+        key = make_key(
+            "ir",
+            _ir_cache_text(ir_modules),
+            opt,
+            regalloc,
+            march.make_id_str(),
+        )
+        obj = cache.get_object(key)
+        if obj is None:
+            obj = ir_to_object(
+                ir_modules,
+                march,
+                reporter=reporter,
+                opt=opt,
+                jobs=jobs,
+                regalloc=regalloc,
+            )
+            cache.put_object(key, obj)
+        else:
+            reporter.message("Loaded object from {}".format(cache))
+        return obj
+
     # Construct output object:
     obj = ObjectFile(march)
     if debug:
@@ -309,14 +357,20 @@ def ir_to_object(
         sub_streams.append(outstream)
     output_stream = MasterOutputStream(sub_streams)
 
+    if outstream and jobs:
+        # Instructions generated in parallel are only available in binary
+        # form, which cannot be written as assembly:
+        reporter.message("Not generating in parallel, outstream is given")
+        jobs = None
+
     for ir_module in ir_modules:
-        ir_to_stream(
-            ir_module,
-            march,
-            output_stream,
-            reporter=reporter,
-            debug=debug,
-            opt=opt,
+        code_generator = CodeGenerator(
+            march, reporter, optimize_for=opt, regalloc=regalloc
+        )
+        verify_module(ir_module)
+        # With several jobs, functions are emitted in binary form:
+        code_generator.generate(
+            ir_module, output_stream, debug=debug, jobs=jobs
         )
 
     reporter.message("All modules generated!")
@@ -331,6 +385,7 @@ def cc(
     opt_level=0,
     debug=False,
     reporter=None,
+    cache=None,
 ):
     """C compiler. compiles a single source file into an object file.
 
@@ -339,6 +394,8 @@ def cc(
         march: The architecture for which to compile
         coptions: options for the C frontend
         debug: Create debug info when set to True
+        cache: cache the object file, keyed on the preprocessed source.
+            See :func:`get_cache`.
 
     Returns:
         an object file
@@ -359,11 +416,99 @@ def cc(
     if not coptions:
         coptions = COptions()
 
-    ir_module = c_to_ir(source, march, coptions=coptions, reporter=reporter)
+    cache = get_cache(cache)
+    if cache is None:
+        ir_module = c_to_ir(
+            source, march, coptions=coptions, reporter=reporter
+        )
+    else:
+        march = get_arch(march)
+        filename = getattr(source, "name", None)
+        preprocessor = CPreProcessor(coptions)
+        tokens = list(preprocessor.process_file(source, filename))
+        key = make_key(
+            "cc",
+            _hash_c_tokens(tokens, debug),
+            sorted(coptions.settings.items()),
+            opt_level,
+            debug,
+            march.make_id_str(),
+        )
+        obj = cache.get_object(key)
+        if obj is not None:
+            reporter.message("Loaded object from {}".format(cache))
+            return obj
+        cbuilder = CBuilder(march.info, coptions)
+        ir_module = cbuilder.build_tokens(tokens, filename, reporter=reporter)
+
     reporter.message("{} {}".format(ir_module, ir_module.stats()))
     reporter.dump_ir(ir_module)
     optimize(ir_module, level=opt_level, reporter=reporter)
-    return ir_to_object([ir_module], march, debug=debug, reporter=reporter)
+    obj = ir_to_object([ir_module], march, debug=debug, reporter=reporter)
+    if cache is not None:
+        cache.put_object(key, obj)
+    return obj
+
+
+def _ir_cache_text(ir_modules):
+    """Get the text which identifies ir-modules in the object cache.
+
+    This is the ir-code as text, extended with what the text omits: the
+    initial values of variables and the operands of inline assembly.
+    """
+    f = io.StringIO()
+    writer = Writer(file=f)
+    for ir_module in ir_modules:
+        writer.write(ir_module, verify=False)
+        for variable in ir_module.variables:
+            print(variable.name, "=", repr(variable.value), file=f)
+        for function in ir_module.functions:
+            for instruction in function.get_instructions():
+                if isinstance(instruction, ir.InlineAsm):
+                    print(
+                        repr(instruction.template),
+                        repr(instruction.clobbers),
+                        [value.name for value in instruction.input_values],
+                        [value.name for value in instruction.output_values],
+                        file=f,
+                    )
+    return f.getvalue()
+
+
+def _hash_c_tokens(tokens, debug):
+    """Calculate a hash over a stream of preprocessed C tokens.
+
+    Only with debug information, the source locations end up in the
+    object file, so only then include them into the hash. Whitespace
+    is skipped, since it is not passed to the parser.
+    """
+    h = hashlib.sha256()
+    for token in tokens:
+        if isinstance(token, LineInfo):
+            if debug:
+                h.update(str(token).encode("utf8"))
+        elif token.typ not in ("WS", "BOL"):
+            if debug:
+                loc = token.loc
+                h.update(
+                    "{}:{}:{}".format(loc.filename, loc.row, loc.col).encode(
+                        "utf8"
+                    )
+                )
+            h.update("{}\0{}\0".format(token.typ, token.val).encode("utf8"))
+    return h.hexdigest()
+
+
+def _read_source(source):
+    """ Read a source into a memory file, retaining the filename """
+    f = get_file(source)
+    text = f.read()
+    if f is not source:
+        f.close()
+    memory_file = io.StringIO(text)
+    if hasattr(f, "name"):
+        memory_file.name = f.name
+    return memory_file
 
 
 def wasmcompile(source: io.TextIOBase, march, opt_level=2, reporter=None):
@@ -400,6 +545,7 @@ def c3c(
     reporter=None,
     debug=False,
     outstream=None,
+    cache=None,
 ):
     """Compile a set of sources into binary format for the given target.
 
@@ -410,6 +556,8 @@ def c3c(
         march: the architecture for which to compile.
         reporter: reporter to write compilation report to
         debug: include debugging information
+        cache: cache the object file, keyed on the source texts. See
+            :func:`get_cache`. Not used when an outstream is given.
 
     Returns:
         An object file
@@ -425,12 +573,35 @@ def c3c(
     """
     reporter = get_reporter(reporter)
     march = get_arch(march)
+
+    cache = get_cache(cache)
+    if cache is not None and not outstream:
+        sources = [_read_source(source) for source in sources]
+        includes = [_read_source(include) for include in includes]
+        key = make_key(
+            "c3c",
+            *[
+                (getattr(f, "name", None), f.getvalue())
+                for f in sources + includes
+            ],
+            len(sources),
+            opt_level,
+            debug,
+            march.make_id_str()
+        )
+        obj = cache.get_object(key)
+        if obj is not None:
+            reporter.message("Loaded object from {}".format(cache))
+            return obj
+    else:
+        cache = None
+
     ir_module = c3_to_ir(sources, includes, march, reporter=reporter)
 
     optimize(ir_module, level=opt_level, reporter=reporter)
 
     opt_cg = "size" if opt_level == "s" else "speed"
-    return ir_to_object(
+    obj = ir_to_object(
         [ir_module],
         march,
         debug=debug,
@@ -438,6 +609,9 @@ def c3c(
         opt=opt_cg,
         outstream=outstream,
     )
+    if cache is not None:
+        cache.put_object(key, obj)
+    return obj
 
 
 def pascal(sources, march, opt_level=0, reporter=None, debug=False):
@@ -1,7 +1,10 @@
 """ Machine architecture description module """
 
 import abc
+import glob
 import logging
+import os
+import sys
 from functools import lru_cache
 from .stack import Frame, FramePointerLocation
 from .asm_printer import AsmPrinter
@@ -43,6 +46,11 @@ class VirtualMachineArchitecture(MachineArchitecture):
 class Architecture(MachineArchitecture):
     """ Base class for all targets """
 
+    # Where to cache the compiled runtime between processes. Either None
+    # for no caching, True to use the default cache directory, a directory
+    # name or a DiskCache instance:
+    runtime_cache = True
+
     def __init__(self, options=None):
         """Create a new machine instance.
 
@@ -58,6 +66,25 @@ class Architecture(MachineArchitecture):
                 assert option_name in self.option_names
                 self.option_settings[option_name] = True
         self.asm_printer = AsmPrinter()
+        self._assembler = None
+
+    @property
+    def assembler(self):
+        """The assembler for this architecture.
+
+        Generating the grammar for all instructions takes time, so the
+        assembler is created when it is used for the first time.
+        """
+        if self._assembler is None:
+            self._assembler = self.make_assembler()
+            self._assembler.gen_asm_parser(self.isa)
+        return self._assembler
+
+    def make_assembler(self):
+        """ Create the assembler for this architecture """
+        from ..binutils.assembler import BaseAssembler
+
+        return BaseAssembler()
 
     def has_option(self, name):
         """ Check for an option setting selected """
@@ -153,11 +180,56 @@ class Architecture(MachineArchitecture):
     @lru_cache(maxsize=30)
     def get_compiler_rt_lib(self):
         """Gets the runtime for the compiler. Returns an object with the
-        compiler runtime for this architecture"""
-        return self.get_runtime()
+        compiler runtime for this architecture.
+
+        Building the runtime takes time, so the object is stored in the
+        runtime cache, keyed on the architecture, its options and the
+        sources of the runtime.
+        """
+        from ..api import get_cache
+        from ..utils.cache import make_key
+
+        cache = get_cache(self.runtime_cache)
+        if cache is None:
+            return self.get_runtime()
+
+        key = make_key(
+            "runtime", self.make_id_str(), *self.get_runtime_sources()
+        )
+        obj = cache.get_object(key)
+        if obj is None:
+            obj = self.get_runtime()
+            try:
+                cache.put_object(key, obj)
+            except OSError as ex:
+                self.logger.warning("Cannot cache runtime: %s", ex)
+        else:
+            self.logger.debug("Loaded runtime of %s from %s", self, cache)
+        return obj
 
     runtime = property(get_compiler_rt_lib)
 
+    def get_runtime_sources(self):
+        """Get the contents of the source files which define the runtime.
+
+        These are the modules in the packages of this architecture class
+        and its base classes, which contain the runtime sources and
+        get_runtime.
+        """
+        folders = set()
+        for cls in type(self).__mro__:
+            module = sys.modules.get(cls.__module__)
+            filename = getattr(module, "__file__", None)
+            if filename:
+                folders.add(os.path.dirname(os.path.abspath(filename)))
+
+        sources = []
+        for folder in sorted(folders):
+            for filename in sorted(glob.glob(os.path.join(folder, "*.py"))):
+                with open(filename, "rb") as f:
+                    sources.append(f.read())
+        return sources
+
     def get_reloc_type(self, reloc_type, symbol):
         """Re-implement this function to support ELF format
         relocations.
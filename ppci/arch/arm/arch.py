@@ -31,7 +31,6 @@ class ArmArch(Architecture):
     def __init__(self, options=None):
         super().__init__(options=options)
         if self.has_option("thumb"):
-            self.assembler = ThumbAssembler()
             self.isa = thumb_isa + data_isa
             # We use r7 as frame pointer (in case of thumb ;)):
             self.fp = R7
@@ -48,7 +47,6 @@ class ArmArch(Architecture):
             ]
         else:
             self.isa = arm_isa + data_isa
-            self.assembler = ArmAssembler()
             self.fp = R11
             self.callee_save = (R5, R6, R7, R8, R9, R10)
 
@@ -67,7 +65,6 @@ class ArmArch(Architecture):
                     [R0, R1, R2, R3, R4, R5, R6, R7, R8, R9, R10, R11],
                 ),
             ]
-        self.assembler.gen_asm_parser(self.isa)
         self.gdb_registers = all_registers
         self.gdb_pc = PC
 
@@ -89,6 +86,12 @@ class ArmArch(Architecture):
             register_classes=register_classes,
         )
 
+    def make_assembler(self):
+        if self.has_option("thumb"):
+            return ThumbAssembler()
+        else:
+            return ArmAssembler()
+
     def get_runtime(self):
         """ Implement compiler runtime functions """
         from ...api import asm
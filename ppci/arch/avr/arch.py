@@ -51,7 +51,6 @@ Stack grows
 
 import io
 from ... import ir
-from ...binutils.assembler import BaseAssembler
 from ..arch import Architecture
 from ..arch_info import ArchInfo, TypeInfo
 from ..generic_instructions import Label, Alignment, SectionInstruction
@@ -81,8 +80,6 @@ class AvrArch(Architecture):
     def __init__(self, options=None):
         super().__init__(options=options)
         self.isa = avr_isa + data_isa
-        self.assembler = BaseAssembler()
-        self.assembler.gen_asm_parser(self.isa)
         # TODO: make it possible to choose between 16 and 8 bit int type size
         # with an option -mint8 every integer is 8 bits wide.
         self.info = ArchInfo(
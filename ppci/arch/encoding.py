@@ -440,7 +440,7 @@ class Instruction(Constructor, metaclass=InsMeta):
     def sizes(cls):
         """ Get possible encoding sizes in bytes """
         if hasattr(cls, "tokens"):
-            return [sum(t.size for t in cls.tokens) // 8]
+            return [sum(t.Info.size for t in cls.tokens) // 8]
         else:
             return []
 
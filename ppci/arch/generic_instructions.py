@@ -53,6 +53,32 @@ class RelocationHolder(Instruction):
         return bytes()
 
 
+class EncodedInstruction(Instruction):
+    """Instruction which was already encoded into binary form.
+
+    This holds the encoded bytes, the symbols and the relocations of
+    an instruction, for example one generated in a worker process.
+    """
+
+    def __init__(self, data, symbols=(), relocations=()):
+        super().__init__()
+        self.data = data
+        self._symbols = list(symbols)
+        self._relocations = list(relocations)
+
+    def __repr__(self):
+        return "encoded {}".format(self.data.hex())
+
+    def encode(self):
+        return self.data
+
+    def symbols(self):
+        return self._symbols
+
+    def relocations(self):
+        return self._relocations
+
+
 class Nop(Instruction):
     """ Instruction that does nothing and has zero size """
 
@@ -1,5 +1,4 @@
 from ... import ir
-from ...binutils.assembler import BaseAssembler
 from ..arch import Architecture
 from ..arch_info import ArchInfo, TypeInfo, Endianness
 from ..generic_instructions import Label, Alignment, RegisterUseDef
@@ -34,8 +33,6 @@ class HadesArch(Architecture):
             endianness=Endianness.BIG
         )
         self.isa = instructions.isa + data_isa
-        self.assembler = BaseAssembler()
-        self.assembler.gen_asm_parser(self.isa)
 
     def get_runtime(self):
         """ Retrieve the runtime for this target """
@@ -7,7 +7,6 @@ Calling convention:
 """
 
 from ... import ir
-from ...binutils.assembler import BaseAssembler
 from ..arch import Architecture
 from ..arch_info import ArchInfo, TypeInfo, Endianness
 from ..data_instructions import data_isa
@@ -23,8 +22,6 @@ class M68kArch(Architecture):
     def __init__(self, options=None):
         super().__init__(options=options)
         self.isa = instructions.m68k_isa + data_isa
-        self.assembler = BaseAssembler()
-        self.assembler.gen_asm_parser(self.isa)
         self.info = ArchInfo(
             type_infos={
                 ir.i8: TypeInfo(1, 1),
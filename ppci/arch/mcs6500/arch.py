@@ -3,7 +3,6 @@ from ..arch import Architecture
 from ..arch_info import ArchInfo, TypeInfo
 from ..generic_instructions import Label
 from ..data_instructions import data_isa
-from ...binutils.assembler import BaseAssembler
 from .instructions import isa
 from . import registers, instructions
 
@@ -16,8 +15,6 @@ class Mcs6500Arch(Architecture):
     def __init__(self, options=None):
         super().__init__(options=options)
         self.isa = isa + data_isa
-        self.assembler = BaseAssembler()
-        self.assembler.gen_asm_parser(self.isa)
         self.info = ArchInfo(
             type_infos={
                 ir.i8: TypeInfo(1, 1),
@@ -6,7 +6,6 @@ from ..arch_info import ArchInfo, TypeInfo, Endianness
 from ..generic_instructions import Label, RegisterUseDef, Alignment
 from ..data_instructions import Db
 from ..stack import StackLocation, FramePointerLocation
-from ...binutils.assembler import BaseAssembler
 from . import instructions
 from . import registers
 
@@ -38,8 +37,6 @@ class MicroBlazeArch(Architecture):
         )
         self.fp_location = FramePointerLocation.BOTTOM
         self.isa = instructions.isa
-        self.assembler = BaseAssembler()
-        self.assembler.gen_asm_parser(self.isa)
 
     def move(self, dst, src):
         if isinstance(dst, registers.MicroBlazeRegister):
@@ -1,7 +1,6 @@
 """ Define MIPS architecture """
 
 from ... import ir
-from ...binutils.assembler import BaseAssembler
 from ..arch import Architecture
 from ..arch_info import ArchInfo, TypeInfo
 from ..generic_instructions import Label, Alignment, RegisterUseDef
@@ -37,8 +36,6 @@ class MipsArch(Architecture):
         )
 
         self.isa = instructions.isa + data_isa
-        self.assembler = BaseAssembler()
-        self.assembler.gen_asm_parser(self.isa)
 
     def get_runtime(self):
         """ Retrieve the runtime for this target """
@@ -20,7 +20,6 @@ See also: http://www.ti.com/lit/an/slaa534/slaa534.pdf
 
 import io
 from ... import ir
-from ...binutils.assembler import BaseAssembler
 from ...utils.reporting import DummyReportGenerator
 from ..arch import Architecture
 from ..arch_info import ArchInfo, TypeInfo
@@ -63,8 +62,6 @@ class Msp430Arch(Architecture):
         )
 
         self.isa = isa + data_isa
-        self.assembler = BaseAssembler()
-        self.assembler.gen_asm_parser(self.isa)
 
         # Allocatable registers:
         self.callee_save = (r4, r5, r6, r7, r8, r9, r10)
@@ -1,7 +1,6 @@
 """ Open risc 1K architecture """
 
 from ... import ir
-from ...binutils.assembler import BaseAssembler
 from ..arch import Architecture
 from ..arch_info import ArchInfo, TypeInfo, Endianness
 from ..generic_instructions import Label, Alignment, SectionInstruction
@@ -35,8 +34,6 @@ class Or1kArch(Architecture):
         super().__init__(options=options)
         # TODO: extend with architecture options like vector and 64 bit
         self.isa = orbis32 + data_isa
-        self.assembler = BaseAssembler()
-        self.assembler.gen_asm_parser(self.isa)
 
         self.info = ArchInfo(
             type_infos={
@@ -96,8 +96,6 @@ class RiscvArch(Architecture):
         self.gdb_registers = gdb_registers
         self.gdb_pc = PC
         self.asm_printer = RiscvAsmPrinter()
-        self.assembler = RiscvAssembler()
-        self.assembler.gen_asm_parser(self.isa)
 
         self.info = ArchInfo(
             type_infos={
@@ -134,6 +132,9 @@ class RiscvArch(Architecture):
         self.caller_save = (R10, R11, R12, R13, R14, R15, R16, R17)
         # (LR, FP, R9, R18, R19, R20, R21 ,R22, R23 ,R24, R25, R26, R27)
 
+    def make_assembler(self):
+        return RiscvAssembler()
+
     def branch(self, reg, lab):
         if self.has_option("rvc"):
             if isinstance(lab, RiscvRegister):
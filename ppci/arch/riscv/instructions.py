@@ -24,7 +24,7 @@ from .relocations import BImm12Relocation, BImm20Relocation
 from .relocations import Abs32Imm20Relocation
 from .relocations import Abs32Imm12Relocation, RelImm20Relocation
 from .relocations import RelImm12Relocation
-from .tokens import RiscvToken, RiscvIToken
+from .tokens import RiscvToken, RiscvIToken, RiscvSToken, RiscvUToken
 import struct
 
 isa = Isa()
@@ -224,18 +224,6 @@ Srli = make_si("srli", 0b0000000, 0b101)
 Srai = make_si("srai", 0b0100000, 0b101)
 
 
-class IBase(RiscvInstruction):
-    def encode(self):
-        tokens = self.get_tokens()
-        tokens[0][0:7] = 0b0010011
-        tokens[0][7:12] = self.rd.num
-        tokens[0][12:15] = self.func
-        tokens[0][15:20] = self.rs1.num
-        self.offset = self.offset & 0xFFF
-        tokens[0][20:32] = self.offset
-        return tokens[0].encode()
-
-
 def make_i(mnemonic, func):
     """ Factory function for immediate value instructions """
     rd = Operand("rd", RiscvRegister, write=True)
@@ -243,15 +231,25 @@ def make_i(mnemonic, func):
     offset = Operand("offset", int)
     fprel = False
     syntax = Syntax([mnemonic, " ", rd, ",", " ", rs1, ",", " ", offset])
+    tokens = [RiscvIToken]
+    patterns = {
+        "opcode": 0b0010011,
+        "rd": rd,
+        "funct3": func,
+        "rs1": rs1,
+        "imm": offset,
+    }
     members = {
         "syntax": syntax,
+        "tokens": tokens,
+        "patterns": patterns,
         "func": func,
         "fprel": fprel,
         "rd": rd,
         "rs1": rs1,
         "offset": offset,
     }
-    return type(mnemonic + "_ins", (IBase,), members)
+    return type(mnemonic + "_ins", (RiscvInstruction,), members)
 
 
 Addi = make_i("addi", 0b000)
@@ -277,22 +275,25 @@ class Nop(RiscvInstruction):
     }
 
 
-class SmBase(RiscvInstruction):
-    def encode(self):
-        tokens = self.get_tokens()
-        tokens[0][0:7] = 0b1110011
-        tokens[0][7:12] = self.rd.num
-        tokens[0][12:15] = 0b010
-        tokens[0][15:20] = 0
-        tokens[0][20:32] = self.code
-        return tokens[0].encode()
-
-
 def make_sm(mnemonic, code):
     rd = Operand("rd", RiscvRegister, write=True)
     syntax = Syntax([mnemonic, " ", rd])
-    members = {"syntax": syntax, "rd": rd, "code": code}
-    return type(mnemonic + "_ins", (SmBase,), members)
+    tokens = [RiscvIToken]
+    patterns = {
+        "opcode": 0b1110011,
+        "rd": rd,
+        "funct3": 0b010,
+        "rs1": 0,
+        "imm": code,
+    }
+    members = {
+        "syntax": syntax,
+        "tokens": tokens,
+        "patterns": patterns,
+        "rd": rd,
+        "code": code,
+    }
+    return type(mnemonic + "_ins", (RiscvInstruction,), members)
 
 
 Rdcyclei = make_sm("rdcycle", 0b110000000000)
@@ -349,29 +350,22 @@ class Blr(RiscvInstruction):
     rs1 = Operand("rs1", RiscvRegister, read=True)
     offset = Operand("offset", int)
     syntax = Syntax(["jalr", " ", rd, ",", rs1, ",", " ", offset])
-
-    def encode(self):
-        tokens = self.get_tokens()
-        tokens[0][0:7] = 0b1100111
-        tokens[0][7:12] = self.rd.num
-        tokens[0][12:15] = 0
-        tokens[0][15:20] = self.rs1.num
-        tokens[0][20:32] = self.offset
-        return tokens[0].encode()
+    tokens = [RiscvIToken]
+    patterns = {
+        "opcode": 0b1100111,
+        "rd": rd,
+        "funct3": 0,
+        "rs1": rs1,
+        "imm": offset,
+    }
 
 
 class Lui(RiscvInstruction):
     rd = Operand("rd", RiscvRegister, write=True)
     imm = Operand("imm", int)
     syntax = Syntax(["lui", " ", rd, ",", " ", imm])
-
-    def encode(self):
-        tokens = self.get_tokens()
-        imm20 = self.imm & 0xFFFFF
-        tokens[0][0:7] = 0b0110111
-        tokens[0][7:12] = self.rd.num
-        tokens[0][12:32] = imm20
-        return tokens[0].encode()
+    tokens = [RiscvUToken]
+    patterns = {"opcode": 0b0110111, "rd": rd, "imm": imm}
 
 
 class Adru(RiscvInstruction):
@@ -469,13 +463,8 @@ class Auipc(RiscvInstruction):
     rd = Operand("rd", RiscvRegister, write=True)
     imm = Operand("imm", int)
     syntax = Syntax(["auipc", " ", rd, ",", " ", imm])
-
-    def encode(self):
-        tokens = self.get_tokens()
-        tokens[0][0:7] = 0b0010111
-        tokens[0][7:12] = self.rd.num
-        tokens[0][12:32] = self.imm
-        return tokens[0].encode()
+    tokens = [RiscvUToken]
+    patterns = {"opcode": 0b0010111, "rd": rd, "imm": imm}
 
 
 class Labelrel(PseudoRiscvInstruction):
@@ -510,7 +499,7 @@ class Li(PseudoRiscvInstruction):
         else:
             if (self.imm & 0x800) != 0:
                 self.imm += 0x1000
-            yield Lui(self.rd, self.imm >> 12)
+            yield Lui(self.rd, (self.imm >> 12) & 0xFFFFF)
             lower_bits = self.imm & 0xFFF
             yield Addi(self.rd, self.rd, lower_bits)
 
@@ -570,35 +559,31 @@ def reg_list_to_mask(reg_list):
     return mask
 
 
-class StrBase(RiscvInstruction):
-    def encode(self):
-        imml5 = self.offset & 0x1F
-        immh7 = (self.offset >> 5) & 0x7F
-        tokens = self.get_tokens()
-        tokens[0][0:7] = 0b0100011
-        tokens[0][7:12] = imml5
-        tokens[0][12:15] = self.func
-        tokens[0][15:20] = self.rs1.num
-        tokens[0][20:25] = self.rs2.num
-        tokens[0][25:32] = immh7
-        return tokens[0].encode()
-
-
 def make_str(mnemonic, func):
     rs2 = Operand("rs2", RiscvRegister, read=True)
     offset = Operand("offset", int)
     rs1 = Operand("rs1", RiscvRegister, read=True)
     fprel = False
     syntax = Syntax([mnemonic, " ", rs2, ",", " ", offset, "(", rs1, ")"])
+    tokens = [RiscvSToken]
+    patterns = {
+        "opcode": 0b0100011,
+        "funct3": func,
+        "rs1": rs1,
+        "rs2": rs2,
+        "imm": offset,
+    }
     members = {
         "syntax": syntax,
+        "tokens": tokens,
+        "patterns": patterns,
         "func": func,
         "fprel": fprel,
         "offset": offset,
         "rs1": rs1,
         "rs2": rs2,
     }
-    return type(mnemonic.title(), (StrBase,), members)
+    return type(mnemonic.title(), (RiscvInstruction,), members)
 
 
 Sb = make_str("sb", 0b000)
@@ -639,31 +624,28 @@ Lbu = make_ldr("lbu", 0b100)
 Lhu = make_ldr("lhu", 0b101)
 
 
-class MextBase(RiscvInstruction):
-    def encode(self):
-        tokens = self.get_tokens()
-        tokens[0][0:7] = 0b0110011
-        tokens[0][7:12] = self.rd.num
-        tokens[0][12:15] = self.func
-        tokens[0][15:20] = self.rs1.num
-        tokens[0][20:25] = self.rs2.num
-        tokens[0][25:32] = 0b0000001
-        return tokens[0].encode()
-
-
 def make_mext(mnemonic, func):
     rs1 = Operand("rs1", RiscvRegister, read=True)
     rs2 = Operand("rs2", RiscvRegister, read=True)
     rd = Operand("rd", RiscvRegister, write=True)
     syntax = Syntax([mnemonic, " ", rd, ",", " ", rs1, ",", " ", rs2])
+    patterns = {
+        "opcode": 0b0110011,
+        "rd": rd,
+        "funct3": func,
+        "rs1": rs1,
+        "rs2": rs2,
+        "funct7": 0b0000001,
+    }
     members = {
         "syntax": syntax,
+        "patterns": patterns,
         "func": func,
         "rd": rd,
         "rs1": rs1,
         "rs2": rs2,
     }
-    return type(mnemonic + "_ins", (MextBase,), members)
+    return type(mnemonic + "_ins", (RiscvInstruction,), members)
 
 
 Mul = make_mext("mul", 0b000)
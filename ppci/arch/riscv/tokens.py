@@ -21,7 +21,7 @@ class RiscvIToken(Token):
     rd = bit_range(7, 12)
     funct3 = bit_range(12, 15)
     rs1 = bit_range(15, 20)
-    imm = bit_range(20, 32)
+    imm = bit_range(20, 32, signed=True)
 
 
 class RiscvSToken(Token):
@@ -32,7 +32,16 @@ class RiscvSToken(Token):
     funct3 = bit_range(12, 15)
     rs1 = bit_range(15, 20)
     rs2 = bit_range(20, 25)
-    imm = bit_concat(bit_range(25, 32), bit_range(7, 12))
+    imm = bit_concat(bit_range(25, 32, signed=True), bit_range(7, 12))
+
+
+class RiscvUToken(Token):
+    class Info:
+        size = 32
+
+    opcode = bit_range(0, 7)
+    rd = bit_range(7, 12)
+    imm = bit_range(12, 32)
 
 
 class RiscvSBToken(Token):
@@ -1,5 +1,4 @@
 from ... import ir
-from ...binutils.assembler import BaseAssembler
 from ..arch import Architecture
 from ..arch_info import ArchInfo, TypeInfo
 from .registers import A, X, Y
@@ -16,8 +15,6 @@ class Stm8Arch(Architecture):
     def __init__(self, options=None):
         super().__init__(options=options)
         self.isa = stm8_isa
-        self.assembler = BaseAssembler()
-        self.assembler.gen_asm_parser(self.isa)
         self.fp = registers.vrw4
 
         self.info = ArchInfo(
@@ -1,42 +1,39 @@
-""" Contains a list of instantiated targets. """
+""" Contains a list of instantiated targets.
 
+The modules of the targets are imported when a target is used, since
+importing all instruction sets takes a considerable amount of time.
+"""
+
+import importlib
 from functools import lru_cache
-from .arm import ArmArch
-from .avr import AvrArch
-from .example import ExampleArch
-from .msp430 import Msp430Arch
-from .x86_64 import X86_64Arch
-from .m68k import M68kArch
-from .mcs6500 import Mcs6500Arch
-from .mips import MipsArch
-from .microblaze import MicroBlazeArch
-from .or1k import Or1kArch
-from .riscv import RiscvArch
-from .stm8 import Stm8Arch
-from .xtensa import XtensaArch
-from .hades import HadesArch
-
-
-target_classes = [
-    ArmArch,
-    AvrArch,
-    ExampleArch,
-    M68kArch,
-    Mcs6500Arch,
-    MicroBlazeArch,
-    MipsArch,
-    Msp430Arch,
-    Or1kArch,
-    RiscvArch,
-    Stm8Arch,
-    X86_64Arch,
-    XtensaArch,
-    HadesArch,
-]
-
-
-target_class_map = {t.name: t for t in target_classes}
-target_names = tuple(sorted(target_class_map.keys()))
+
+
+# Map of target name to the module and the class implementing the target:
+target_modules = {
+    "arm": ("ppci.arch.arm", "ArmArch"),
+    "avr": ("ppci.arch.avr", "AvrArch"),
+    "example": ("ppci.arch.example", "ExampleArch"),
+    "hades": ("ppci.arch.hades", "HadesArch"),
+    "m68k": ("ppci.arch.m68k", "M68kArch"),
+    "mcs6500": ("ppci.arch.mcs6500", "Mcs6500Arch"),
+    "microblaze": ("ppci.arch.microblaze", "MicroBlazeArch"),
+    "mips": ("ppci.arch.mips", "MipsArch"),
+    "msp430": ("ppci.arch.msp430", "Msp430Arch"),
+    "or1k": ("ppci.arch.or1k", "Or1kArch"),
+    "riscv": ("ppci.arch.riscv", "RiscvArch"),
+    "stm8": ("ppci.arch.stm8", "Stm8Arch"),
+    "x86_64": ("ppci.arch.x86_64", "X86_64Arch"),
+    "xtensa": ("ppci.arch.xtensa", "XtensaArch"),
+}
+
+target_names = tuple(sorted(target_modules.keys()))
+
+
+def get_target_class(name):
+    """ Import the module of the given target, and return its class """
+    module_name, class_name = target_modules[name]
+    module = importlib.import_module(module_name)
+    return getattr(module, class_name)
 
 
 @lru_cache(maxsize=30)
@@ -45,5 +42,5 @@ def create_arch(name, options=None):
     given.
     """
     # Create the instance!
-    target = target_class_map[name](options=options)
+    target = get_target_class(name)(options=options)
     return target
@@ -27,7 +27,6 @@ from ..generic_instructions import Label, RegisterUseDef
 from ..stack import StackLocation
 from ..cc import CallingConvention
 from ..registers import Register
-from ...binutils.assembler import BaseAssembler
 from ..data_instructions import data_isa
 from ..data_instructions import Db
 from .instructions import bits64, RmReg64, MovRegRm8, RmReg8, RmMemDisp, isa
@@ -162,8 +161,6 @@ class X86_64Arch(Architecture):
         if self.has_option("x87"):
             # TODO: implement x87 isa also!
             self.isa = self.isa + x87_isa
-        self.assembler = BaseAssembler()
-        self.assembler.gen_asm_parser(self.isa)
         self.stack_grows_down = True
         self.gdb_registers = registers.full_registers
 
@@ -1,7 +1,6 @@
 """ Xtensa architecture """
 
 from ... import ir
-from ...binutils.assembler import BaseAssembler
 from ..arch import Architecture
 from ..arch_info import ArchInfo, TypeInfo
 from ..generic_instructions import Label, Alignment, RegisterUseDef
@@ -20,8 +19,6 @@ class XtensaArch(Architecture):
     def __init__(self, options=None):
         super().__init__(options=options)
         self.isa = instructions.core_isa + data_isa
-        self.assembler = BaseAssembler()
-        self.assembler.gen_asm_parser(self.isa)
         self.fp = registers.a15  # The frame pointer in call0 abi mode
 
         self.info = ArchInfo(
@@ -1,9 +1,15 @@
 """ Grouping of multiple object files into a single archive.
+
+Similar to the armap of GNU ar, an archive contains an index which maps
+defined global symbols to the object file defining it. This index is
+stored in the archive file, so the linker can find objects without
+loading all objects in the archive.
 """
 
 import json
 import logging
 from . import objectfile
+from . import binary_format
 
 
 def archive(objs):
@@ -12,7 +18,10 @@ def archive(objs):
 
 
 def get_archive(filename):
-    """ Load an archive from file. """
+    """Load an archive from file.
+
+    Both the json and the binary format are detected.
+    """
     if isinstance(filename, Archive):
         return filename
 
@@ -24,19 +33,71 @@ class Archive:
 
     logger = logging.getLogger("ar")
 
-    def __init__(self, objs):
-        self.objs = objs
+    def __init__(self, objs, symbol_index=None, loader=None):
+        self._objs = list(objs)
+        self._symbol_index = symbol_index
+        self._loader = loader
 
     def __iter__(self):
-        return iter(self.objs)
+        for index in range(len(self._objs)):
+            yield self.get_object(index)
+
+    @property
+    def objs(self):
+        """ All object files in this archive """
+        return list(self)
+
+    def get_object(self, index):
+        """ Get the object at the given index, loading it when required """
+        obj = self._objs[index]
+        if obj is None:
+            obj = self._loader(index)
+            self._objs[index] = obj
+        return obj
+
+    @property
+    def symbol_index(self):
+        """Mapping of global symbol name to the index of the object file
+        which defines this symbol.
+
+        When several objects define a symbol, the first object is used.
+        """
+        if self._symbol_index is None:
+            self._symbol_index = self.build_symbol_index()
+        return self._symbol_index
+
+    def build_symbol_index(self):
+        """ Create a mapping from defined symbol to object index """
+        symbol_index = {}
+        for index, obj in enumerate(self):
+            for name in obj.get_defined_symbols():
+                symbol_index.setdefault(name, index)
+        return symbol_index
+
+    def find_symbol(self, name):
+        """ Get the object defining the given symbol, or None. """
+        index = self.symbol_index.get(name, None)
+        if index is None:
+            return None
+        return self.get_object(index)
 
     def save(self, output_file):
-        """ Save archive to file. """
+        """Save archive to file.
+
+        When the file is opened in binary mode, the compact binary format
+        is used. Otherwise json is written.
+        """
         self.logger.debug("Saving archive")
+        if binary_format.is_binary_file(output_file):
+            output_file.write(
+                binary_format.serialize_archive(self.objs, self.symbol_index)
+            )
+            return
+
         # Create funky json.
-        objs = [obj.serialize() for obj in self.objs]
+        objs = [obj.serialize() for obj in self]
 
-        d = {"objects": objs}
+        d = {"objects": objs, "symbol_index": self.symbol_index}
 
         # Save to file:
         json.dump(d, output_file, indent=2, sort_keys=True)
@@ -44,8 +105,22 @@ class Archive:
 
     @classmethod
     def load(cls, f):
-        """ Load archive from disk. """
+        """Load archive from disk, given a file or filename.
+
+        Objects in binary archives are only loaded when used.
+        """
         cls.logger.debug("Loading archive")
-        d = json.load(f)
+        data = binary_format.read_buffer(f)
+        if isinstance(data, str):
+            d = json.loads(data)
+        elif binary_format.is_binary_archive(data):
+            offsets, symbol_index = binary_format.read_archive_table(data)
+
+            def loader(index):
+                return binary_format.deserialize_object(data, offsets[index])
+
+            return cls([None] * len(offsets), symbol_index, loader)
+        else:
+            d = json.loads(bytes(data).decode("utf8"))
         objs = list(map(objectfile.deserialize, d["objects"]))
-        return cls(objs)
+        return cls(objs, d.get("symbol_index", None))
@@ -0,0 +1,452 @@
+""" Compact binary format for object files and archives.
+
+Next to the json format, object files and archives can be stored in a
+binary container. This container holds the raw section data, a string
+table and packed records for sections, symbols, relocations and images.
+
+All numbers are stored little endian. An object file is laid out as
+follows. All offsets are relative to the start of the object, so that
+objects can be embedded in archives.
+
+- header (see ``OBJECT_HEADER``)
+- section records
+- symbol records
+- relocation records
+- image records
+- section indices of the images (u32 each)
+- string table (zero terminated utf-8 strings)
+- debug information (json encoded, optional)
+- section data, each aligned to 8 bytes
+
+An archive consists of a header, a table with the offset and size of
+each object, the symbol index, its string table, followed by the objects.
+
+When loading, the file is read into memory at once, and the section data
+is only copied out of this buffer on first use. The buffer is owned by the
+loaded objects, so the file can be overwritten while they are alive.
+"""
+
+import io
+import json
+import struct
+from . import debuginfo
+from .objectfile import ObjectFile, Section, Image, RelocationEntry
+
+OBJECT_MAGIC = b"PPCIOBJ\x00"
+ARCHIVE_MAGIC = b"PPCIARC\x00"
+VERSION = 1
+
+# magic, version, flags, arch, #sections, #symbols, #relocations, #images,
+# entry symbol id, string table offset and size, debug offset and size
+OBJECT_HEADER = struct.Struct("<8sHHIIIIIqQQQQ")
+SECTION_RECORD = struct.Struct("<IQIQQ")
+SYMBOL_RECORD = struct.Struct("<IIIIIBqQ")
+RELOCATION_RECORD = struct.Struct("<IIIQq")
+IMAGE_RECORD = struct.Struct("<IQII")
+INDEX = struct.Struct("<I")
+
+# magic, version, flags, #objects, symbol index offset and size,
+# string table offset and size
+ARCHIVE_HEADER = struct.Struct("<8sHHIQQQQ")
+ARCHIVE_ENTRY = struct.Struct("<QQ")
+SYMBOL_INDEX_ENTRY = struct.Struct("<II")
+
+NO_STRING = 0xFFFFFFFF
+DATA_ALIGNMENT = 8
+
+
+class BinaryFormatError(Exception):
+    """ Raised when a binary object or archive is malformed """
+
+    pass
+
+
+def is_binary_object(data):
+    """ Test if the given data is a binary object file """
+    return bytes(data[: len(OBJECT_MAGIC)]) == OBJECT_MAGIC
+
+
+def is_binary_archive(data):
+    """ Test if the given data is a binary archive """
+    return bytes(data[: len(ARCHIVE_MAGIC)]) == ARCHIVE_MAGIC
+
+
+def is_binary_file(f):
+    """Test if the given file like object is opened in binary mode."""
+    if isinstance(f, (io.RawIOBase, io.BufferedIOBase)):
+        return True
+    elif isinstance(f, io.TextIOBase):
+        return False
+    else:
+        return "b" in getattr(f, "mode", "")
+
+
+def read_buffer(f):
+    """Get the contents of a filename or a file as a buffer.
+
+    Binary files are returned as a memoryview, so that slicing does not
+    copy the data. Text files are returned as string.
+    """
+    if isinstance(f, str):
+        with open(f, "rb") as f2:
+            return memoryview(f2.read())
+
+    if isinstance(f, io.TextIOWrapper) and _at_start(f):
+        # A real file opened in text mode, it might contain binary data:
+        return memoryview(f.buffer.read())
+
+    if is_binary_file(f):
+        return memoryview(f.read())
+    else:
+        return f.read()
+
+
+def _at_start(f):
+    try:
+        return f.tell() == 0
+    except OSError:
+        return False
+
+
+class StringTable:
+    """ Table with zero terminated strings """
+
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = {}
+
+    def add(self, text):
+        """ Add a string, and return its offset """
+        if text is None:
+            return NO_STRING
+
+        if text not in self.offsets:
+            self.offsets[text] = len(self.data)
+            self.data += text.encode("utf8") + bytes([0])
+        return self.offsets[text]
+
+
+def _align(value, alignment=DATA_ALIGNMENT):
+    return (value + alignment - 1) // alignment * alignment
+
+
+def serialize_object(obj):
+    """ Pack the object file into the binary format """
+    strings = StringTable()
+    section_index = {s.name: i for i, s in enumerate(obj.sections)}
+    symbols = [
+        (
+            symbol.id,
+            strings.add(symbol.name),
+            strings.add(symbol.binding),
+            strings.add(symbol.typ),
+            strings.add(symbol.section),
+            int(symbol.defined),
+            symbol.value if symbol.defined else 0,
+            symbol.size,
+        )
+        for symbol in obj.symbols
+    ]
+    relocations = [
+        (
+            strings.add(reloc.reloc_type),
+            reloc.symbol_id,
+            strings.add(reloc.section),
+            reloc.offset,
+            reloc.addend,
+        )
+        for reloc in obj.relocations
+    ]
+    images = []
+    image_sections = []
+    for image in obj.images:
+        images.append(
+            (
+                strings.add(image.name),
+                image.address,
+                len(image_sections),
+                len(image.sections),
+            )
+        )
+        image_sections.extend(section_index[s.name] for s in image.sections)
+    arch = strings.add(obj.arch.make_id_str())
+    section_names = [strings.add(s.name) for s in obj.sections]
+
+    if obj.debug_info:
+        debug_data = json.dumps(
+            debuginfo.serialize(obj.debug_info), sort_keys=True
+        ).encode("utf8")
+    else:
+        debug_data = bytes()
+
+    # Determine layout:
+    offset = OBJECT_HEADER.size
+    offset += SECTION_RECORD.size * len(obj.sections)
+    offset += SYMBOL_RECORD.size * len(symbols)
+    offset += RELOCATION_RECORD.size * len(relocations)
+    offset += IMAGE_RECORD.size * len(images)
+    offset += INDEX.size * len(image_sections)
+    strtab_offset = offset
+    offset += len(strings.data)
+    debug_offset = offset
+    offset += len(debug_data)
+    data_offsets = []
+    for section in obj.sections:
+        offset = _align(offset)
+        data_offsets.append(offset)
+        offset += section.size
+
+    # Pack all parts:
+    entry_symbol_id = obj.entry_symbol_id
+    if entry_symbol_id is None:
+        entry_symbol_id = -1
+    output = bytearray(
+        OBJECT_HEADER.pack(
+            OBJECT_MAGIC,
+            VERSION,
+            0,
+            arch,
+            len(obj.sections),
+            len(symbols),
+            len(relocations),
+            len(images),
+            entry_symbol_id,
+            strtab_offset,
+            len(strings.data),
+            debug_offset,
+            len(debug_data),
+        )
+    )
+    for section, name, data_offset in zip(
+        obj.sections, section_names, data_offsets
+    ):
+        output += SECTION_RECORD.pack(
+            name, section.address, section.alignment, data_offset, section.size
+        )
+    for symbol in symbols:
+        output += SYMBOL_RECORD.pack(*symbol)
+    for relocation in relocations:
+        output += RELOCATION_RECORD.pack(*relocation)
+    for image in images:
+        output += IMAGE_RECORD.pack(*image)
+    for index in image_sections:
+        output += INDEX.pack(index)
+    output += strings.data
+    output += debug_data
+    for section, data_offset in zip(obj.sections, data_offsets):
+        output += bytes(data_offset - len(output))
+        output += section.data
+    return bytes(output)
+
+
+def deserialize_object(buffer, offset=0):
+    """Unpack an object file from the buffer at the given offset.
+
+    The data of the sections is loaded lazily from the buffer.
+    """
+    from ..api import get_arch
+
+    buffer = memoryview(buffer)
+    header = OBJECT_HEADER.unpack_from(buffer, offset)
+    (
+        magic,
+        version,
+        _,
+        arch,
+        n_sections,
+        n_symbols,
+        n_relocations,
+        n_images,
+        entry_symbol_id,
+        strtab_offset,
+        strtab_size,
+        debug_offset,
+        debug_size,
+    ) = header
+    if magic != OBJECT_MAGIC:
+        raise BinaryFormatError("Not a binary object file")
+    if version != VERSION:
+        raise BinaryFormatError(
+            "Unsupported object file version {}".format(version)
+        )
+
+    strtab_begin = offset + strtab_offset
+    strtab = bytes(buffer[strtab_begin : strtab_begin + strtab_size])
+
+    def get_string(index):
+        if index == NO_STRING:
+            return None
+        end = strtab.index(0, index)
+        return strtab[index:end].decode("utf8")
+
+    obj = ObjectFile(get_arch(get_string(arch)))
+    if entry_symbol_id >= 0:
+        obj.entry_symbol_id = entry_symbol_id
+
+    position = offset + OBJECT_HEADER.size
+    for _ in range(n_sections):
+        (
+            name,
+            address,
+            alignment,
+            data_offset,
+            size,
+        ) = SECTION_RECORD.unpack_from(buffer, position)
+        position += SECTION_RECORD.size
+        section = Section(get_string(name))
+        section.address = address
+        section.alignment = alignment
+        begin = offset + data_offset
+        section.set_lazy_data(buffer[begin : begin + size])
+        obj.add_section(section)
+
+    for _ in range(n_symbols):
+        (
+            symbol_id,
+            name,
+            binding,
+            typ,
+            section,
+            defined,
+            value,
+            size,
+        ) = SYMBOL_RECORD.unpack_from(buffer, position)
+        position += SYMBOL_RECORD.size
+        obj.add_symbol(
+            symbol_id,
+            get_string(name),
+            get_string(binding),
+            value if defined else None,
+            get_string(section),
+            get_string(typ),
+            size,
+        )
+
+    for _ in range(n_relocations):
+        (
+            typ,
+            symbol_id,
+            section,
+            reloc_offset,
+            addend,
+        ) = RELOCATION_RECORD.unpack_from(buffer, position)
+        position += RELOCATION_RECORD.size
+        obj.add_relocation(
+            RelocationEntry(
+                get_string(typ),
+                symbol_id,
+                get_string(section),
+                reloc_offset,
+                addend,
+            )
+        )
+
+    images = []
+    for _ in range(n_images):
+        images.append(IMAGE_RECORD.unpack_from(buffer, position))
+        position += IMAGE_RECORD.size
+    indices_position = position
+    for name, address, first, count in images:
+        image = Image(get_string(name), address)
+        for i in range(first, first + count):
+            (index,) = INDEX.unpack_from(buffer, indices_position + i * 4)
+            image.add_section(obj.sections[index])
+        obj.add_image(image)
+
+    if debug_size:
+        begin = offset + debug_offset
+        debug_data = bytes(buffer[begin : begin + debug_size])
+        obj.debug_info = debuginfo.deserialize(
+            json.loads(debug_data.decode("utf8"))
+        )
+    return obj
+
+
+def serialize_archive(objs, symbol_index):
+    """Pack a series of object files into a binary archive.
+
+    The symbol index maps symbol names to the index of the object
+    defining the symbol.
+    """
+    blobs = [serialize_object(obj) for obj in objs]
+
+    # Pack the symbol index:
+    strings = StringTable()
+    entries = bytearray()
+    for name, index in sorted(symbol_index.items()):
+        entries += SYMBOL_INDEX_ENTRY.pack(strings.add(name), index)
+
+    index_offset = ARCHIVE_HEADER.size + ARCHIVE_ENTRY.size * len(blobs)
+    strtab_offset = index_offset + len(entries)
+    offset = _align(strtab_offset + len(strings.data))
+    output = bytearray(
+        ARCHIVE_HEADER.pack(
+            ARCHIVE_MAGIC,
+            VERSION,
+            0,
+            len(blobs),
+            index_offset,
+            len(symbol_index),
+            strtab_offset,
+            len(strings.data),
+        )
+    )
+    offsets = []
+    for blob in blobs:
+        offsets.append(offset)
+        output += ARCHIVE_ENTRY.pack(offset, len(blob))
+        offset = _align(offset + len(blob))
+    output += entries
+    output += strings.data
+    for blob, offset in zip(blobs, offsets):
+        output += bytes(offset - len(output))
+        output += blob
+    return bytes(output)
+
+
+def read_archive_table(buffer):
+    """Read the object offsets and the symbol index of a binary archive.
+
+    Returns a list of object offsets, and a dictionary mapping symbol
+    names to object indices.
+    """
+    buffer = memoryview(buffer)
+    (
+        magic,
+        version,
+        _,
+        n_objects,
+        index_offset,
+        n_symbols,
+        strtab_offset,
+        strtab_size,
+    ) = ARCHIVE_HEADER.unpack_from(buffer, 0)
+    if magic != ARCHIVE_MAGIC:
+        raise BinaryFormatError("Not a binary archive")
+    if version != VERSION:
+        raise BinaryFormatError(
+            "Unsupported archive version {}".format(version)
+        )
+
+    offsets = []
+    position = ARCHIVE_HEADER.size
+    for _ in range(n_objects):
+        offset, _ = ARCHIVE_ENTRY.unpack_from(buffer, position)
+        position += ARCHIVE_ENTRY.size
+        offsets.append(offset)
+
+    strtab = bytes(buffer[strtab_offset : strtab_offset + strtab_size])
+    symbol_index = {}
+    index_end = index_offset + n_symbols * SYMBOL_INDEX_ENTRY.size
+    for name, index in SYMBOL_INDEX_ENTRY.iter_unpack(
+        buffer[index_offset:index_end]
+    ):
+        end = strtab.index(0, name)
+        symbol_index[strtab[name:end].decode("utf8")] = index
+    return offsets, symbol_index
+
+
+def deserialize_archive(buffer):
+    """ Unpack all object files from a binary archive """
+    offsets, _ = read_archive_table(buffer)
+    return [deserialize_object(buffer, offset) for offset in offsets]
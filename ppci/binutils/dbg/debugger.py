@@ -6,6 +6,7 @@ Start the debug server for your target and connect to it using the
 debugger interface.
 """
 
+import bisect
 import logging
 import struct
 import operator
@@ -60,6 +61,10 @@ class Debugger:
         self.events = driver.events
         self.variable_map = {}
         self.addr_map = {}
+        self.addresses = []
+        self.function_begins = []
+        self.function_ranges = []
+        self.location_map = {}
 
     def __repr__(self):
         return "Debugger for {} using {}".format(self.arch, self.driver)
@@ -85,12 +90,7 @@ class Debugger:
 
     def get_possible_breakpoints(self, filename):
         """ Return the rows in the file for which breakpoints can be set """
-        options = set()
-        if self.debug_info:
-            for loc in self.debug_info.locations:
-                if loc.loc.filename == filename:
-                    options.add(loc.loc.row)
-        return options
+        return {row for name, row in self.location_map if name == filename}
 
     def set_breakpoint(self, filename, row):
         """ Set a breakpoint """
@@ -155,10 +155,24 @@ class Debugger:
         self.obj = obj
         self.variable_map = {v.name: v for v in self.debug_info.variables}
         self.addr_map = {}
+        self.location_map = {}
         for loc in self.debug_info.locations:
             addr = self.calc_address(loc.address)
             self.addr_map[addr] = loc
+            self.location_map.setdefault((loc.loc.filename, loc.loc.row), addr)
             self.logger.debug("%s at 0x%x", loc, addr)
+        self.addresses = sorted(self.addr_map)
+
+        # Sort the address ranges of the functions:
+        function_ranges = []
+        for function in self.debug_info.functions:
+            begin = self.calc_address(function.begin)
+            end = self.calc_address(function.end)
+            if begin < end:
+                function_ranges.append((begin, end, function))
+        function_ranges.sort(key=lambda r: r[0])
+        self.function_begins = [r[0] for r in function_ranges]
+        self.function_ranges = function_ranges
 
     def validate_memory(self, obj):
         """ Validate memory given an object file """
@@ -188,8 +202,13 @@ class Debugger:
     def find_pc(self):
         """ Given the current program counter (pc) determine the source """
         pc = self.get_pc()
-        # if pc in self.addr_map:
-        minkey = min(self.addr_map.keys(), key=lambda k: abs(k - pc))
+
+        # Take the closest address, which is either the address before or
+        # the address after the program counter:
+        addresses = self.addresses
+        index = bisect.bisect_left(addresses, pc)
+        candidates = addresses[max(index - 1, 0) : index + 1]
+        minkey = min(candidates, key=lambda k: abs(k - pc))
         debug = self.addr_map[minkey]
         self.logger.info(
             "Found program counter at %s with delta %i" % (debug, minkey - pc)
@@ -201,12 +220,11 @@ class Debugger:
     def current_function(self):
         """ Determine the PC and then determine which function we are in """
         pc = self.get_pc()
-        if self.debug_info:
-            for function in self.debug_info.functions:
-                begin = self.calc_address(function.begin)
-                end = self.calc_address(function.end)
-                if pc in range(begin, end):
-                    return function
+        index = bisect.bisect_right(self.function_begins, pc) - 1
+        if index >= 0:
+            begin, end, function = self.function_ranges[index]
+            if pc < end:
+                return function
 
     def local_vars(self):
         """ Return map of local variable names """
@@ -217,11 +235,9 @@ class Debugger:
 
     def find_address(self, filename, row):
         """ Given a filename and a row, determine the address """
-        if self.debug_info:
-            for debug in self.debug_info.locations:
-                loc = debug.loc
-                if loc.filename == filename and loc.row == row:
-                    return self.calc_address(debug.address)
+        address = self.location_map.get((filename, row))
+        if address is not None:
+            return address
         self.logger.warning("Could not find address for %s:%i", filename, row)
 
     # Registers:
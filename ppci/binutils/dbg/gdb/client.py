@@ -69,9 +69,15 @@ class GdbDebugDriver(DebugDriver):
     sending and receiving of bytes. The protocol must be able to
     work using sockets and threads, serial port and threads and asyncio
     sockets.
+
+    To reduce the amount of round trips to the target, registers are read
+    all at once, and memory is read in blocks of cache_block_size bytes
+    which are cached while the target is stopped. Adjacent blocks are
+    read with a single packet.
     """
 
     logger = logging.getLogger("gdbclient")
+    cache_block_size = 64
 
     def __init__(self, arch, transport, pcresval=0, swbrkpt=False):
         super().__init__()
@@ -80,6 +86,9 @@ class GdbDebugDriver(DebugDriver):
         self.status = DebugState.RUNNING
         self.pcresval = pcresval
         self._register_value_cache = {}  # Cached map of register values
+        self._memory_cache = {}  # Map of block address to block data
+        self._binary_writes = True  # Use the X packet to write memory
+        self.max_packet_size = 0x400
         self.swbrkpt = swbrkpt
         self.stopreason = INTERRUPT
 
@@ -97,8 +106,33 @@ class GdbDebugDriver(DebugDriver):
         self._message_handler = Thread(target=self._handle_stop_queue)
         self._message_handler.start()
         self.transport.connect()
+        self._negotiate_features()
         # self.send('?')
 
+    def _negotiate_features(self):
+        """Query the features of the server.
+
+        Use the packet size of the server, and stop acknowledging packets
+        when the server supports it, since the transport is reliable.
+        """
+        res = self._send_command("qSupported")
+        features = {}
+        for feature in res.split(";"):
+            if "=" in feature:
+                name, value = feature.split("=", 1)
+                features[name] = value
+            elif feature.endswith(("+", "-")):
+                features[feature[:-1]] = feature[-1]
+
+        if "PacketSize" in features:
+            self.max_packet_size = int(features["PacketSize"], 16)
+
+        if features.get("QStartNoAckMode") == "+":
+            res = self._send_command("QStartNoAckMode")
+            if res == "OK":
+                self.logger.debug("Disabled acknowledgement of packets")
+                self._rsp.no_ack_mode = True
+
     def disconnect(self):
         """ Disconnect the client """
         self.transport.disconnect()
@@ -120,8 +154,8 @@ class GdbDebugDriver(DebugDriver):
         else:
             self.logger.warning("Already running!")
 
-        self._send_message("c")
         self._start()
+        self._send_message("c")
 
     def restart(self):
         """ restart the device """
@@ -135,8 +169,8 @@ class GdbDebugDriver(DebugDriver):
         """ Single step the device """
         if self.status == DebugState.STOPPED:
             self._prepare_continue()
-            self._send_message("s")
             self._start()
+            self._send_message("s")
         else:
             self.logger.warning("Cannot step, still running!")
 
@@ -144,8 +178,8 @@ class GdbDebugDriver(DebugDriver):
         """ Single step `count` times """
         if self.status == DebugState.STOPPED:
             self._prepare_continue()
-            self._send_message("n %x" % count)
             self._start()
+            self._send_message("n %x" % count)
         else:
             self.logger.warning("Cannot step, still running!")
 
@@ -169,11 +203,20 @@ class GdbDebugDriver(DebugDriver):
         self.transport.send(bytes([0x03]))
 
     def _start(self):
-        """ Update state to started """
+        """Update state to started.
+
+        This is done before the target is continued, since the target can
+        stop before the continue command is acknowledged.
+        """
         self.status = DebugState.RUNNING
-        self._register_value_cache.clear()
+        self._invalidate_cache()
         self.events.on_start()
 
+    def _invalidate_cache(self):
+        """ Forget the cached registers and memory contents """
+        self._register_value_cache.clear()
+        self._memory_cache.clear()
+
     def _stop(self):
         self.status = DebugState.STOPPED
         self.events.on_stop()
@@ -198,13 +241,13 @@ class GdbDebugDriver(DebugDriver):
                 if is_hex(name):
                     # We are dealing with a register value here!
                     reg_num = int(name, 16)
-                    # self.logger.error('%s', reg_num)
-                    if reg_num == self.arch.gdb_registers.index(
-                        self.arch.gdb_pc
-                    ):
-                        # TODO: fill a cache of registers
-                        data = bytes.fromhex(rest[3:-1])
-                        (self.pcstopval,) = struct.unpack("<I", data)
+                    if reg_num < len(self.arch.gdb_registers):
+                        register = self.arch.gdb_registers[reg_num]
+                        data = bytes.fromhex(value)
+                        value = self._unpack_register(register, data)
+                        self._register_value_cache[register] = value
+                        if register is self.arch.gdb_pc:
+                            self.pcstopval = value
 
         if code & (BRKPOINT | INTERRUPT) != 0:
             self.logger.debug("Target stopped..")
@@ -287,12 +330,18 @@ class GdbDebugDriver(DebugDriver):
             res = self._send_command("G %s" % data)
             if res == "OK":
                 self.logger.debug("Register written")
+                for register in self.arch.gdb_registers:
+                    self._register_value_cache[register] = regvalues[register]
             else:
                 self.logger.warning("Registers writing failed: %s", res)
 
     def _get_register(self, register):
         """ Get a single register """
         if self.status == DebugState.STOPPED:
+            if register not in self._register_value_cache:
+                # Fetch all registers with a single packet:
+                self._get_general_registers()
+
             if register in self._register_value_cache:
                 value = self._register_value_cache[register]
             else:
@@ -312,13 +361,15 @@ class GdbDebugDriver(DebugDriver):
         """ Set a single register """
         if self.status == DebugState.STOPPED:
             idx = self.arch.gdb_registers.index(register)
-            value = self._pack_register(register, value)
-            value = binascii.b2a_hex(value).decode("ascii")
-            res = self._send_command("P %x=%s" % (idx, value))
+            data = self._pack_register(register, value)
+            data = binascii.b2a_hex(data).decode("ascii")
+            res = self._send_command("P %x=%s" % (idx, data))
             if res == "OK":
                 self.logger.debug("Register written")
+                self._register_value_cache[register] = value
             else:
                 self.logger.warning("Register write failed: %s", res)
+                self._register_value_cache.pop(register, None)
 
     def _unpack_register(self, register, data):
         """ Fetch a register from some data """
@@ -379,28 +430,107 @@ class GdbDebugDriver(DebugDriver):
             self.logger.warning("Cannot clear breakpoint, target not stopped!")
 
     def read_mem(self, address: int, size: int):
-        """ Read memory from address """
+        """Read memory from address.
+
+        The memory is read in whole blocks, which are cached until the
+        target continues. Missing blocks next to each other are read
+        with a single packet.
+        """
         if self.status == DebugState.STOPPED:
-            res = self._send_command("m %x,%x" % (address, size))
-            ret = binascii.a2b_hex(res.encode("ascii"))
-            return ret
+            block_size = self.cache_block_size
+            first = address - address % block_size
+            blocks = range(first, address + size, block_size)
+            missing = [b for b in blocks if b not in self._memory_cache]
+            max_count = max(self.max_read_size // block_size, 1)
+
+            # Read runs of adjacent missing blocks:
+            while missing:
+                start = missing[0]
+                count = 1
+                while (
+                    count < len(missing)
+                    and count < max_count
+                    and missing[count] == start + count * block_size
+                ):
+                    count += 1
+                missing = missing[count:]
+                data = self._read_memory(start, count * block_size)
+                if data is None:
+                    # The blocks may be partially inaccessible:
+                    return self._read_memory(address, size) or bytes()
+                for offset in range(0, len(data), block_size):
+                    block = data[offset : offset + block_size]
+                    self._memory_cache[start + offset] = block
+
+            data = b"".join(self._memory_cache[b] for b in blocks)
+            offset = address - first
+            return data[offset : offset + size]
         else:
             self.logger.warning("Cannot read memory, target not stopped!")
             return bytes()
 
+    @property
+    def max_read_size(self):
+        """ The amount of bytes which fit in the response to a read """
+        # The data is hex encoded, and framed by 4 characters:
+        return (self.max_packet_size - 4) // 2
+
+    def _read_memory(self, address: int, size: int):
+        """ Read memory with the `m` command, returns None on an error """
+        res = self._send_command("m %x,%x" % (address, size))
+        if res.startswith("E") or len(res) != 2 * size:
+            self.logger.warning(
+                "Cannot read %s bytes at 0x%x: %s", size, address, res
+            )
+            return
+        return binascii.a2b_hex(res.encode("ascii"))
+
     def write_mem(self, address: int, data):
-        """ Write memory """
+        """Write memory.
+
+        The data is send in binary form with the `X` command, or as hex
+        with the `M` command when the target does not support `X`.
+        """
         if self.status == DebugState.STOPPED:
             length = len(data)
-            data = binascii.b2a_hex(data).decode("ascii")
-            res = self._send_command("M %x,%x:%s" % (address, length, data))
+            if self._binary_writes:
+                res = self._send_command(
+                    "X %x,%x:%s" % (address, length, data.decode("latin-1"))
+                )
+                if res == "":
+                    self.logger.debug("Binary writes are not supported")
+                    self._binary_writes = False
+
+            if not self._binary_writes:
+                hexdata = binascii.b2a_hex(data).decode("ascii")
+                res = self._send_command(
+                    "M %x,%x:%s" % (address, length, hexdata)
+                )
+
             if res == "OK":
                 self.logger.debug("Memory written")
+                self._update_memory_cache(address, data)
             else:
                 self.logger.warning("Memory write failed: %s", res)
+                self._memory_cache.clear()
         else:
             self.logger.warning("Cannot write memory, target not stopped!")
 
+    def _update_memory_cache(self, address: int, data):
+        """ Update the cached blocks with written data """
+        block_size = self.cache_block_size
+        end = address + len(data)
+        first = address - address % block_size
+        for block_address in range(first, end, block_size):
+            if block_address in self._memory_cache:
+                block = bytearray(self._memory_cache[block_address])
+                begin = max(address, block_address)
+                stop = min(end, block_address + block_size)
+                block[begin - block_address : stop - block_address] = data[
+                    begin - address : stop - address
+                ]
+                self._memory_cache[block_address] = bytes(block)
+
     def _handle_message(self, message):
         # Filter stop packets:
         if message.startswith(("T", "S")):
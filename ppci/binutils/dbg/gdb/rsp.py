@@ -1,6 +1,10 @@
 """ Implement the RSP protocol which is used in gdb.
 
-A packet is send, and then it is acknowledged by a '+'.
+A packet is send, and then it is acknowledged by a '+'. When the no
+acknowledgement mode is started, packets are not acknowledged anymore.
+
+Packet data is handled as text, where each character is a byte, so
+binary data can be send as latin-1 text.
 
 """
 
@@ -26,6 +30,7 @@ class RspHandler:
         self._ack_queue = Queue(maxsize=1)
         self._lock = Lock()
         self.on_message = None
+        self.no_ack_mode = False
 
     def sendpkt(self, data, retries=10):
         """ sends data via the RSP protocol to the device """
@@ -33,6 +38,8 @@ class RspHandler:
             wire_data = self.rsp_pack(data)
             self.logger.debug("--> %s", wire_data)
             self.send(wire_data)
+            if self.no_ack_mode:
+                return
             res = self._ack_queue.get(timeout=0.5)
             while res != "+":
                 self.logger.warning("discards %s", res)
@@ -47,7 +54,7 @@ class RspHandler:
         """ Send ascii data to target """
         if self.verbose:
             self.logger.debug("--> %s", msg)
-        self.transport.send(msg.encode("ascii"))
+        self.transport.send(msg.encode("latin-1"))
 
     def _process_byte(self, byte):
         msg = self._packet_decoder.send(byte)
@@ -68,9 +75,11 @@ class RspHandler:
                 res = self.rsp_unpack(pkt)
             except ValueError as ex:
                 self.logger.warning("Bad packet %s", ex)
-                self.send("-")
+                if not self.no_ack_mode:
+                    self.send("-")
             else:
-                self.send("+")
+                if not self.no_ack_mode:
+                    self.send("+")
                 self.on_message(res)
         else:
             self.logger.warning("discards %s", pkt)
@@ -60,13 +60,13 @@ class TCP(ThreadedTransport):
     def __str__(self):
         return "Tcp localhost:{}".format(self._port)
 
-    def rx_avail(self):
-        readable, _, _ = select.select([self.sock], [], [], 0)
+    def rx_avail(self, timeout=0):
+        readable, _, _ = select.select([self.sock], [], [], timeout)
         return readable
 
     def recv(self):
-        """ Receive a single byte """
-        return self.sock.recv(1)
+        """ Receive the available bytes """
+        return self.sock.recv(4096)
 
     def send(self, data):
         """ Send data """
@@ -77,12 +77,13 @@ class TCP(ThreadedTransport):
         self.logger.info("Receiver thread started")
         try:
             while self._running:
-                readable = self.rx_avail()
+                readable = self.rx_avail(timeout=0.1)
                 if readable:
                     data = self.recv()
                     if data:
                         if self.on_byte:
-                            self.on_byte(data)
+                            for byte in data:
+                                self.on_byte(bytes([byte]))
                     else:  # No data means socket closed.
                         break
         # except Exception as ex:
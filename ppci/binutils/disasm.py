@@ -1,6 +1,35 @@
-""" Contains disassembler stuff. """
+""" Contains disassembler stuff.
 
+Instructions are decoded with a decision table, which is generated from the
+fixed bit patterns of the instructions in an isa. This avoids trying to
+decode each instruction of the isa in turn.
+
+For each instruction, all combinations of its constructor operands are
+enumerated into variants. A variant has a fixed size, and a mask and value
+over the bits fixed by its patterns. The variants of a single size are
+arranged into a decision tree. Each node of the tree selects a set of bits,
+and looks up the variants which agree on the value of those bits.
+Only the few variants left at a leaf are decoded, and the decoded
+instruction is verified by encoding it again.
+"""
+
+import itertools
+import logging
+from collections import defaultdict
 from ..arch.data_instructions import DByte
+from ..arch.encoding import Constructor, FixedPattern, VariablePattern
+from ..arch.encoding import Instruction, Operand, Transform
+from ..arch.registers import Register
+from ..arch.token import TokenSequence
+from ..utils.bitfun import to_signed
+
+logger = logging.getLogger("disasm")
+
+
+class DecodeError(Exception):
+    """ Raised when bits or an instruction variant cannot be decoded """
+
+    pass
 
 
 class Disassembler:
@@ -8,33 +37,398 @@ class Disassembler:
 
     def __init__(self, arch):
         self.arch = arch
-        for instruction in arch.isa.instructions:
-            # print(instruction, instruction.patterns)
-            # for nl in instruction.non_leaves:
-            #    print('  ', nl.patterns)
-            pass
+        self.decoder = get_decoder(arch.isa)
 
     def disasm(self, data, outs, address=0):
         """ Disassemble data into an instruction stream """
-        # TODO: implement this!
-
-        # The trial and error method, will be slow as a snail:
-        # for instruction in self.arch.isa.instructions:
-        #    for size in instruction.sizes():
-        #        part = data[:size]
-        #        try:
-        #            print(instruction, part, size)
-        #            i = instruction.decode(part)
-        #            print(i)
-        #        except ValueError:
-        #            pass
-
-        # For now, all is bytes!
-        for byte in data:
-            ins = DByte(byte)
-            ins.address = address
-            outs.emit(ins)
-            address += len(ins.encode())
-
-    def take_one(self):
-        pass
+        offset = 0
+        while offset < len(data):
+            ins, size = self.take_one(data, offset)
+            if ins is None:
+                # Emit the bytes of the smallest instruction as data:
+                size = min(self.decoder.min_size, len(data) - offset)
+                for byte in data[offset : offset + size]:
+                    ins = DByte(byte)
+                    ins.address = address + offset
+                    outs.emit(ins)
+                    offset += 1
+            else:
+                ins.address = address + offset
+                outs.emit(ins)
+                offset += size
+
+    def take_one(self, data, offset=0):
+        """Decode a single instruction from data at the given offset.
+
+        Returns a tuple with the instruction and its size in bytes. The
+        instruction is None when the data cannot be decoded.
+        """
+        return self.decoder.decode(data, offset)
+
+
+_decoders = {}
+
+
+def get_decoder(isa):
+    """ Get the, possibly cached, instruction decoder for the given isa """
+    key = tuple(isa.instructions)
+    if key not in _decoders:
+        _decoders[key] = InstructionDecoder(isa.instructions)
+    return _decoders[key]
+
+
+class InstructionDecoder:
+    """ Decodes binary data into instructions using decision trees """
+
+    logger = logging.getLogger("disasm")
+
+    def __init__(self, instructions):
+        variants = []
+        for instruction in instructions:
+            variants.extend(make_variants(instruction))
+
+        by_size = defaultdict(list)
+        for variant in variants:
+            by_size[variant.size].append(variant)
+        self.sizes = sorted(by_size)
+        self.min_size = self.sizes[0] if self.sizes else 1
+        self.trees = [
+            (size, build_tree(by_size[size], 0)) for size in self.sizes
+        ]
+        self.logger.debug(
+            "Created decoder for %s variants of %s instructions",
+            len(variants),
+            len(instructions),
+        )
+
+    def candidates(self, data, offset=0):
+        """ Get the variants whose fixed bits match the data """
+        candidates = []
+        for size, node in self.trees:
+            if offset + size > len(data):
+                break
+            word = int.from_bytes(data[offset : offset + size], "little")
+            while isinstance(node, DecisionNode):
+                node = node.branches.get(word & node.mask, node.default)
+            for variant in node:
+                if word & variant.mask == variant.value:
+                    candidates.append(variant)
+
+        # Prefer the most specific encoding:
+        candidates.sort(key=lambda v: v.rank)
+        return candidates
+
+    def decode(self, data, offset=0):
+        """Decode the instruction at the given offset.
+
+        Returns a tuple with the instruction and its size, or (None, 0)
+        if no instruction matches the data.
+        """
+        for variant in self.candidates(data, offset):
+            piece = data[offset : offset + variant.size]
+            instruction = variant.decode(piece)
+            if instruction is not None:
+                return instruction, variant.size
+        return None, 0
+
+
+class DecisionNode:
+    """ Inner node of a decision tree, branching on the masked bits """
+
+    __slots__ = ("mask", "branches", "default")
+
+    def __init__(self, mask, branches, default):
+        self.mask = mask
+        self.branches = branches
+        self.default = default
+
+
+def build_tree(variants, tested):
+    """Arrange the variants into a decision tree.
+
+    Branch on the bits which are fixed by all variants, but not yet
+    tested. If there are no such bits, branch on the bits fixed by the
+    majority of variants, and put the other variants in all branches
+    they agree with. Leaves are lists of variants, most specific first.
+    """
+    if len(variants) > 1:
+        common = ~tested
+        for variant in variants:
+            common &= variant.mask
+
+        if common:
+            mask = common
+        else:
+            # Take the bits fixed by at least half of the variants:
+            counts = defaultdict(int)
+            for variant in variants:
+                bits = variant.mask & ~tested
+                while bits:
+                    bit = bits & -bits
+                    counts[bit] += 1
+                    bits ^= bit
+            mask = 0
+            for bit, count in counts.items():
+                if 2 * count >= len(variants):
+                    mask |= bit
+
+        full = [v for v in variants if v.mask & mask == mask]
+        if mask and full:
+            partial = [v for v in variants if v.mask & mask != mask]
+            groups = defaultdict(list)
+            for variant in full:
+                groups[variant.value & mask].append(variant)
+            for key, group in groups.items():
+                for variant in partial:
+                    if key & variant.mask == variant.value & mask:
+                        group.append(variant)
+            tested |= mask
+            branches = {
+                key: build_tree(group, tested)
+                for key, group in groups.items()
+            }
+            return DecisionNode(mask, branches, build_tree(partial, tested))
+
+    return sorted(variants, key=lambda v: v.rank)
+
+
+class Node:
+    """ A constructor with a chosen option for each constructor operand """
+
+    def __init__(self, constructor, children):
+        self.constructor = constructor
+        self.children = children
+        self.patterns = constructor.dict_to_patterns(constructor.patterns)
+
+    def non_leaves(self):
+        """ Iterate over all nodes, in the order of the encoder """
+        yield self
+        for _, child in self.children:
+            yield from child.non_leaves()
+
+
+class Variant:
+    """ An instruction with a fixed encoding size and fixed bits """
+
+    def __init__(self, root):
+        self.root = root
+        self.instruction = root.constructor
+        nodes = list(root.non_leaves())
+        token_types = []
+        for node in nodes:
+            token_types.extend(getattr(node.constructor, "tokens", ()))
+        precodes = [t for t in token_types if t.Info.precode]
+        others = [t for t in token_types if not t.Info.precode]
+        self.token_types = precodes + others
+        self.size = sum(t.Info.size for t in self.token_types) // 8
+
+        # Determine mask and value of the fixed bits, and how to
+        # extract the variable bits:
+        mask_tokens = self.new_tokens()
+        value_tokens = self.new_tokens()
+        variable_tokens = self.new_tokens()
+        self.unchecked = []
+        self.readers = {}
+        self.exact = True
+        for node in nodes:
+            readers = self.readers[node] = []
+            for pattern in node.patterns:
+                field = find_field(self.token_types, pattern.field)
+                if field is None:
+                    self.exact = False
+                    ones = None
+                else:
+                    ones = (1 << field._bitsize) - 1
+
+                if isinstance(pattern, FixedPattern):
+                    if ones is None:
+                        self.unchecked.append(pattern)
+                    else:
+                        mask_tokens.set_field(pattern.field, ones)
+                        value_tokens.set_field(pattern.field, pattern.value)
+                elif isinstance(pattern, VariablePattern):
+                    readers.append(make_reader(pattern, field))
+                    if ones is not None:
+                        variable_tokens.set_field(pattern.field, ones)
+                    if not isinstance(pattern.prop, Operand):
+                        self.exact = False
+                else:  # pragma: no cover
+                    raise DecodeError("Cannot decode {}".format(pattern))
+
+            if has_custom_encoding(node.constructor):
+                self.exact = False
+
+        self.mask = int.from_bytes(mask_tokens.encode(), "little")
+        self.value = int.from_bytes(value_tokens.encode(), "little")
+        self.value &= self.mask
+        self.rank = (-bin(self.mask).count("1"), -self.size)
+
+        # When all bits are either fixed, or stored in an operand, the
+        # decoded instruction encodes into the same bits:
+        variable = int.from_bytes(variable_tokens.encode(), "little")
+        if (self.mask | variable) != (1 << (8 * self.size)) - 1:
+            self.exact = False
+
+    def __repr__(self):
+        return "Variant({}, size={}, mask={:x}, value={:x})".format(
+            self.instruction.__name__, self.size, self.mask, self.value
+        )
+
+    def new_tokens(self):
+        return TokenSequence([t() for t in self.token_types])
+
+    def is_decodable(self):
+        """ Check if all operands can be recovered from the bits """
+        for node in self.root.non_leaves():
+            recoverable = {
+                prop.source
+                for _, prop, _, _ in self.readers[node]
+                if can_invert(prop)
+            }
+            recoverable.update(operand for operand, _ in node.children)
+            syntax = node.constructor.syntax
+            if not syntax:
+                return False
+            for operand in syntax.formal_arguments:
+                if operand not in recoverable:
+                    return False
+        return True
+
+    def create(self, node, tokens):
+        """ Create the constructor from the bits in the tokens """
+        values = {}
+        for field, prop, bits, convert in self.readers[node]:
+            value = tokens.get_field(field)
+            if bits:
+                value = to_signed(value, bits)
+            try:
+                values[prop.source] = convert(value)
+            except KeyError:
+                # There is no register with this number:
+                raise DecodeError("Invalid value {}".format(value))
+        for operand, child in node.children:
+            values[operand] = self.create(child, tokens)
+        args = [values[a] for a in node.constructor.syntax.formal_arguments]
+        return node.constructor(*args)
+
+    def decode(self, data):
+        """ Decode data into an instruction, or None if it does not fit """
+        tokens = self.new_tokens()
+        tokens.fill(data)
+        for pattern in self.unchecked:
+            if tokens.get_field(pattern.field) != pattern.value:
+                return None
+
+        try:
+            instruction = self.create(self.root, tokens)
+        except DecodeError:
+            return None
+
+        if self.exact:
+            return instruction
+
+        # Only accept instructions which encode into the same data:
+        if instruction.encode() != data:
+            return None
+        return instruction
+
+
+def make_variants(instruction):
+    """ Create all decodable variants of the given instruction class """
+    if not getattr(instruction, "tokens", None) or not instruction.syntax:
+        return []
+
+    variants = []
+    for root in make_nodes(instruction):
+        try:
+            variant = Variant(root)
+        except DecodeError as ex:
+            logger.debug("Skipping variant of %s: %s", instruction, ex)
+            continue
+        if variant.mask and variant.is_decodable():
+            variants.append(variant)
+    return variants
+
+
+def make_nodes(constructor):
+    """ Enumerate all option choices for the constructor operands """
+    if not constructor.syntax:
+        return
+    operands = [
+        operand
+        for operand in constructor.syntax.formal_arguments
+        if operand.is_constructor
+    ]
+    options = []
+    for operand in operands:
+        if isinstance(operand._cls, tuple):
+            classes = operand._cls
+        else:
+            classes = (operand._cls,)
+        nodes = []
+        for cls in classes:
+            if isinstance(cls, type) and issubclass(cls, Constructor):
+                nodes.extend(make_nodes(cls))
+        options.append(nodes)
+
+    for choice in itertools.product(*options):
+        children = list(zip(operands, choice))
+        yield Node(constructor, children)
+
+
+def make_reader(pattern, field):
+    """Determine how to get an operand value from a field.
+
+    Returns a tuple with the field name, the operand, the number of bits
+    to sign extend and a function to convert the bits into the value.
+    """
+    prop = pattern.prop
+
+    # Sign extend signed fields of integer operands:
+    signed = field is not None and field._signed
+    if signed and prop.source._cls is int:
+        bits = field._bitsize
+    else:
+        bits = 0
+
+    if isinstance(prop, Operand) and is_register(prop._cls):
+        registers = prop._cls.all_registers()
+        convert = {r.num: r for r in registers}.__getitem__
+    else:
+        convert = prop.from_value
+    return pattern.field, prop, bits, convert
+
+
+def has_custom_encoding(constructor):
+    """ Check if a constructor sets bits other than by its patterns """
+    if constructor.set_user_patterns is not Constructor.set_user_patterns:
+        return True
+    if issubclass(constructor, Instruction):
+        return constructor.encode is not Instruction.encode
+    return False
+
+
+def is_register(cls):
+    return isinstance(cls, type) and issubclass(cls, Register)
+
+
+def find_field(token_types, field):
+    """ Find the bit field of the first token type which has the field """
+    for token_type in token_types:
+        if hasattr(token_type, field):
+            prop = getattr(token_type, field)
+            if hasattr(prop, "_bitsize"):
+                return prop
+            return None
+
+
+def can_invert(prop):
+    """ Test if the value of an operand can be recovered from its bits """
+    if isinstance(prop, Transform):
+        if type(prop).backwards is Transform.backwards:
+            return False
+        return can_invert(prop._wrapped)
+    assert isinstance(prop, Operand)
+    if prop._value_map:
+        return False
+    return prop._cls is int or is_register(prop._cls)
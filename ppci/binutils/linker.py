@@ -1,7 +1,7 @@
 """ Linker utility. """
 
 import logging
-from collections import defaultdict
+from collections import defaultdict, deque
 from .objectfile import ObjectFile, Image, get_object, RelocationEntry
 from ..common import CompilerError
 from .layout import Layout, Section, SectionData, SymbolDefinition, Align
@@ -383,30 +383,37 @@ class Linker:
         """Try to fetch extra code from libraries to resolve symbols.
 
         Note that this can be a rabbit hole, since libraries can have undefined
-        symbols as well.
+        symbols as well. Undefined symbols are placed on a worklist, and are
+        looked up in the symbol index of the libraries. When an object is
+        pulled in, its undefined symbols are added to the worklist.
         """
-        undefined_symbols = self.get_undefined_symbols()
-        if not undefined_symbols:
+        worklist = deque(self.get_undefined_symbols())
+        if not worklist:
             self.logger.debug(
                 "No undefined symbols, no need to check libraries"
             )
             return
 
-        # Keep adding objects while we have undefined symbols.
-        reloop = True
-        while reloop:
-            reloop = False
+        while worklist:
+            name = worklist.popleft()
+            if self.dst.get_symbol(name).defined:
+                continue
+
             for library in libraries:
-                self.logger.debug("scanning library for symbols %s", library)
-                for obj in library:
-                    has_sym = any(map(obj.has_symbol, undefined_symbols))
-                    if has_sym:
-                        self.logger.debug(
-                            "Using object file %s from library", obj
-                        )
-                        self.inject_object(obj, False)
-                        undefined_symbols = self.get_undefined_symbols()
-                        reloop = True
+                obj = library.find_symbol(name)
+                if obj is not None:
+                    break
+            else:
+                self.logger.debug("%s not found in libraries", name)
+                continue
+
+            self.logger.debug(
+                "Using object file %s from library for %s", obj, name
+            )
+            self.inject_object(obj, False)
+            for undefined_name in obj.get_undefined_symbols():
+                if self.dst.get_symbol(undefined_name).undefined:
+                    worklist.append(undefined_name)
 
     def get_undefined_symbols(self):
         """Get a list of currently undefined symbols."""
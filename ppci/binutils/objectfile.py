@@ -23,11 +23,18 @@ from . import debuginfo
 
 
 def get_object(obj):
-    """ Try hard to load an object """
+    """Try hard to load an object.
+
+    The object can be given as object, filename or file like object,
+    and can be stored in json or binary format.
+    """
     if not isinstance(obj, ObjectFile):
-        f = get_file(obj)
-        obj = ObjectFile.load(f)
-        f.close()
+        if isinstance(obj, str):
+            obj = ObjectFile.load(obj)
+        else:
+            f = get_file(obj)
+            obj = ObjectFile.load(f)
+            f.close()
     return obj
 
 
@@ -123,7 +130,28 @@ class Section:
         self.name = name
         self.address = 0
         self.alignment = 4
-        self.data = bytearray()
+        self._data = bytearray()
+        self._lazy_data = None
+
+    @property
+    def data(self):
+        """ The data of this section, loaded on first use """
+        if self._lazy_data is not None:
+            self._data = bytearray(self._lazy_data)
+            self._lazy_data = None
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._data = data
+        self._lazy_data = None
+
+    def set_lazy_data(self, buffer):
+        """Use the contents of buffer as data for this section.
+
+        The buffer is only copied when the data is used.
+        """
+        self._lazy_data = buffer
 
     def add_data(self, data):
         """ Append data to the end of this section """
@@ -131,7 +159,9 @@ class Section:
 
     @property
     def size(self):
-        return len(self.data)
+        if self._lazy_data is not None:
+            return len(self._lazy_data)
+        return len(self._data)
 
     def __repr__(self):
         return "SECTION {} size=0x{:x} address=0x{:x}".format(
@@ -368,14 +398,34 @@ class ObjectFile:
         return serialize(self)
 
     def save(self, output_file):
-        """ Save object file to a file like object """
-        json.dump(self.serialize(), output_file, indent=2, sort_keys=True)
-        print(file=output_file)
+        """Save object file to a file like object.
+
+        When the file is opened in binary mode, the compact binary format
+        is used. Otherwise json is written.
+        """
+        from . import binary_format
+
+        if binary_format.is_binary_file(output_file):
+            output_file.write(binary_format.serialize_object(self))
+        else:
+            json.dump(self.serialize(), output_file, indent=2, sort_keys=True)
+            print(file=output_file)
 
     @staticmethod
     def load(input_file):
-        """ Load object file from file """
-        return deserialize(json.load(input_file))
+        """Load object file from a file or filename.
+
+        Both the json and the binary format are detected.
+        """
+        from . import binary_format
+
+        data = binary_format.read_buffer(input_file)
+        if isinstance(data, str):
+            return deserialize(json.loads(data))
+        elif binary_format.is_binary_object(data):
+            return binary_format.deserialize_object(data)
+        else:
+            return deserialize(json.loads(bytes(data).decode("utf8")))
 
 
 def print_object(obj):
@@ -23,6 +23,12 @@ create_parser.add_argument(
 create_parser.add_argument(
     "obj", type=argparse.FileType("r"), nargs="*", help="the object to link"
 )
+create_parser.add_argument(
+    "--binary",
+    action="store_true",
+    default=False,
+    help="Save the archive in the compact binary format",
+)
 display_parser = subparsers.add_parser(
     "display", help="display contents of an archive."
 )
@@ -38,7 +44,10 @@ def archive(args=None):
         if args.command == "create":
             objects = [get_object(obj) for obj in args.obj]
             lib = api.archive(objects)
-            lib.save(args.archive)
+            if args.binary:
+                lib.save(args.archive.buffer)
+            else:
+                lib.save(args.archive)
         elif args.command == "display":
             lib = get_archive(args.archive)
             for obj in lib:
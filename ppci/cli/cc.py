@@ -6,12 +6,14 @@ computer architectures.
 
 
 import argparse
+import os
 from .base import base_parser, march_parser
 from .compile_base import compile_parser, do_compile
 from .base import LogSetup, get_arch_from_args
 from .. import api
 from ..lang.c import create_ast, CAstPrinter
 from ..lang.c.options import COptions, coptions_parser
+from ..lang.c.preprocessor import CPreProcessor, IncludeCache
 
 
 parser = argparse.ArgumentParser(
@@ -60,9 +62,11 @@ def cc(args=None):
                 for src in args.sources:
                     api.preprocess(src, output, coptions)
         elif args.M:  # Emit a makefile dep line.
-            dependencies = []
-            for filename in dependencies:
-                print(filename)
+            # Share include lookups among all sources:
+            include_cache = IncludeCache()
+            with open(args.output, "w") as output:
+                for src in args.sources:
+                    emit_dependencies(src, output, coptions, include_cache)
         elif args.ast:
             with open(args.output, "w") as output:
                 printer = CAstPrinter(file=output)
@@ -85,5 +89,17 @@ def cc(args=None):
 
             do_compile(ir_modules, march, log_setup.reporter, log_setup.args)
 
+
+def emit_dependencies(src, output, coptions, include_cache):
+    """ Write a makefile rule listing the headers included by src """
+    filename = src.name if hasattr(src, "name") else "a.c"
+    preprocessor = CPreProcessor(coptions, include_cache=include_cache)
+    for _ in preprocessor.process_file(src, filename=filename):
+        pass
+    target = os.path.splitext(os.path.basename(filename))[0] + ".o"
+    parts = [filename] + preprocessor.dependencies
+    print("{}: {}".format(target, " \\\n  ".join(parts)), file=output)
+
+
 if __name__ == "__main__":
     cc()
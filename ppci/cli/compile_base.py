@@ -5,6 +5,7 @@
 import argparse
 import logging
 from .. import api, irutils
+from ..codegen.codegen import REGISTER_ALLOCATORS
 from ..binutils.outstream import TextOutputStream
 from .base import out_parser
 from ..wasm import ir_to_wasm
@@ -39,6 +40,19 @@ compile_parser.add_argument(
 compile_parser.add_argument(
     "-O", help="optimize code", default="0", choices=api.OPT_LEVELS
 )
+compile_parser.add_argument(
+    "--jobs",
+    "-j",
+    help="amount of processes to use for code generation",
+    type=int,
+    default=None,
+)
+compile_parser.add_argument(
+    "--regalloc",
+    help="register allocator to use",
+    default="auto",
+    choices=REGISTER_ALLOCATORS,
+)
 compile_parser.add_argument(
     "--instrument-functions",
     help="Instrument given functions",
@@ -70,7 +84,13 @@ def do_compile(ir_modules, march, reporter, args):
         with open(args.output, "w") as output:
             stream = TextOutputStream(printer=march.asm_printer, f=output)
             for ir_module in ir_modules:
-                api.ir_to_stream(ir_module, march, stream, reporter=reporter)
+                api.ir_to_stream(
+                    ir_module,
+                    march,
+                    stream,
+                    reporter=reporter,
+                    regalloc=args.regalloc,
+                )
     elif args.wasm:  # Output web-assembly code
         assert len(ir_modules) == 1
         ir_module = ir_modules[0]
@@ -82,7 +102,12 @@ def do_compile(ir_modules, march, reporter, args):
             api.ir_to_python(ir_modules, output, reporter=reporter)
     else:  # Full object output
         obj = api.ir_to_object(
-            ir_modules, march, reporter=reporter, debug=args.g
+            ir_modules,
+            march,
+            reporter=reporter,
+            debug=args.g,
+            jobs=args.jobs,
+            regalloc=args.regalloc,
         )
         with open(args.output, "w") as output:
             obj.save(output)
@@ -62,6 +62,7 @@ import argparse
 from ppci.lang.common import Token, SourceLocation
 from ppci.lang.tools import baselex, yacc
 from ppci.utils.tree import Tree
+from ppci.codegen.treematcher import State
 
 # Generate parser on the fly:
 spec_file = path.join(path.dirname(path.abspath(__file__)), "burg.grammar")
@@ -263,6 +264,211 @@ class BurgError(Exception):
     pass
 
 
+class BurgCompiler:
+    """Compile the rules of a burg system into a python matcher.
+
+    Instead of searching the rules for each tree node during labeling,
+    python code is generated with a labeling function per terminal. This
+    function tests the rules of that terminal in order, with the tree
+    patterns unrolled into plain comparisons.
+
+    The chain rules which apply after a non terminal was derived are
+    determined in advance, in the same order as they would be visited
+    by walking the chain rules recursively.
+    """
+
+    def __init__(self, system):
+        self.system = system
+        self.lines = []
+
+    def emit(self, level, text=""):
+        self.lines.append("    " * level + text)
+
+    def generate(self):
+        """ Generate python code implementing the matcher """
+        self.lines = []
+        non_terminals = sorted(self.system.non_terminals)
+        self.nt_index = {nt: i for i, nt in enumerate(non_terminals)}
+        for nt in non_terminals:
+            self.gen_mark_function(nt)
+
+        terminals = sorted(self.system.terminals)
+        for nr, terminal in enumerate(terminals):
+            self.gen_label_function(nr, terminal)
+
+        self.emit(0, "labelers = {")
+        for nr, terminal in enumerate(terminals):
+            self.emit(1, '"{}": label_{},'.format(terminal, nr))
+        self.emit(0, "}")
+        self.emit(0)
+
+        self.emit(0, "kid_functions = {")
+        for rule in self.system.rules:
+            kids = self.kid_paths(rule.tree, "t")
+            kids = ", ".join(kids)
+            self.emit(1, "{}: lambda t: [{}],".format(rule.nr, kids))
+        self.emit(0, "}")
+        self.emit(0)
+
+        self.emit(0, "nts_map = {")
+        for rule in self.system.rules:
+            nts = self.system.get_nts(rule.tree)
+            self.emit(1, "{}: {},".format(rule.nr, nts))
+        self.emit(0, "}")
+        return "\n".join(self.lines) + "\n"
+
+    def chain_closure(self, non_term):
+        """Determine the chain rules applied after deriving a non terminal.
+
+        Returns a list of tuples with the derived non terminal, the
+        additional cost and the chain rule number.
+        """
+        closure = []
+        marked = set()
+
+        def visit(nt, cost):
+            for rule in self.system.chain_rules_for_nt(nt):
+                if rule not in marked:
+                    marked.add(rule)
+                    closure.append((rule.non_term, cost + rule.cost, rule.nr))
+                    visit(rule.non_term, cost + rule.cost)
+
+        visit(non_term, 0)
+        return closure
+
+    def gen_mark_function(self, nt):
+        """ Generate function which records a derivation of nt """
+        self.emit(0, "def mark_{}(labels, c, nr):".format(self.nt_index[nt]))
+        self.emit(1, "# {}".format(nt))
+        self.gen_set_cost(nt, "c", "nr")
+        for chain_nt, cost, nr in self.chain_closure(nt):
+            self.emit(1, "# Chain rule {}: {} -> {}".format(nr, chain_nt, nt))
+            self.gen_set_cost(chain_nt, "c + {}".format(cost), nr)
+        self.emit(0)
+
+    def gen_set_cost(self, nt, cost, nr):
+        self.emit(1, 'x = labels.get("{}")'.format(nt))
+        self.emit(1, "if x is None or x[0] > {}:".format(cost))
+        self.emit(2, 'labels["{}"] = ({}, {})'.format(nt, cost, nr))
+
+    def gen_label_function(self, nr, terminal):
+        """ Generate labeling function for trees with the given root """
+        self.emit(0, "def label_{}(tree):".format(nr))
+        self.emit(1, "# {}".format(terminal))
+        self.emit(1, "state = tree.state = State()")
+        rules = self.system.get_rules_for_root(terminal)
+        if rules:
+            self.emit(1, "labels = state.labels")
+        for rule in rules:
+            self.emit(1, "# {}: {}".format(rule.nr, rule))
+            level = 1
+            tests = self.tree_tests(rule.tree, "tree")
+            if tests:
+                self.emit(level, "if {}:".format(" and ".join(tests)))
+                level += 1
+
+            kids = self.kid_paths(rule.tree, "tree")
+            nts = self.system.get_nts(rule.tree)
+            conditions = []
+            costs = []
+            for i, (kid, nt) in enumerate(zip(kids, nts)):
+                self.emit(level, "k{} = {}.state.labels".format(i, kid))
+                conditions.append('"{}" in k{}'.format(nt, i))
+                costs.append('k{}["{}"][0]'.format(i, nt))
+            if rule.acceptance:
+                conditions.append("A{}(tree)".format(rule.nr))
+            if conditions:
+                self.emit(level, "if {}:".format(" and ".join(conditions)))
+                level += 1
+            costs.append(str(rule.cost))
+            self.emit(
+                level,
+                "mark_{}(labels, {}, {})".format(
+                    self.nt_index[rule.non_term], " + ".join(costs), rule.nr
+                ),
+            )
+        self.emit(0)
+
+    def tree_tests(self, tree, prefix):
+        """ Generate the tests of terminals below the root of a pattern """
+        tests = []
+        for i, child in enumerate(tree.children):
+            if child.name in self.system.terminals:
+                path = "{}.children[{}]".format(prefix, i)
+                tests.append('{}.name == "{}"'.format(path, child.name))
+                tests.extend(self.tree_tests(child, path))
+        return tests
+
+    def kid_paths(self, tree, prefix):
+        """ Get the expressions of the kids of a pattern """
+        if tree.name in self.system.non_terminals:
+            return [prefix]
+
+        kids = []
+        for i, child in enumerate(tree.children):
+            path = "{}.children[{}]".format(prefix, i)
+            kids.extend(self.kid_paths(child, path))
+        return kids
+
+
+class CompiledMatcher:
+    """ Labels trees using code generated by the burg compiler """
+
+    def __init__(self, system):
+        namespace = {"State": State}
+        for rule in system.rules:
+            if rule.acceptance:
+                namespace["A{}".format(rule.nr)] = rule.acceptance
+        source = BurgCompiler(system).generate()
+        exec(compile(source, "<burg matcher>", "exec"), namespace)
+        self.labelers = namespace["labelers"]
+        self.kid_functions = namespace["kid_functions"]
+        self.nts_map = namespace["nts_map"]
+
+    def label(self, tree):
+        """ Label all nodes in the tree bottom up """
+        for child in tree.children:
+            self.label(child)
+        labeler = self.labelers.get(tree.name)
+        if labeler is None:
+            raise BurgError("{} not defined".format(tree.name))
+        labeler(tree)
+
+    def kids(self, tree, rule):
+        """ Determine the kid trees for a rule """
+        return self.kid_functions[rule](tree)
+
+    def nts(self, rule):
+        """ Get the open ends of this rules pattern """
+        return self.nts_map[rule]
+
+
+_matchers = {}
+
+
+def tree_key(tree):
+    return (tree.name,) + tuple(map(tree_key, tree.children))
+
+
+def compile_matcher(system):
+    """Create a matcher for the rules of the given burg system.
+
+    Matchers are cached, so that the code is generated only once for
+    each set of rules, for example once per architecture.
+    """
+    key = (
+        tuple(sorted(system.terminals)),
+        tuple(sorted(system.non_terminals)),
+        tuple(
+            (rule.non_term, tree_key(rule.tree), rule.cost, rule.acceptance)
+            for rule in system.rules
+        ),
+    )
+    if key not in _matchers:
+        _matchers[key] = CompiledMatcher(system)
+    return _matchers[key]
+
+
 class BurgParser(burg_parser.Parser):
     """ Derived from automatically generated parser """
 
@@ -4,6 +4,7 @@ The architecture is provided when the generator is created.
 """
 
 import logging
+import multiprocessing
 from .. import ir
 from ..irutils import Verifier, split_block
 from ..arch.arch import Architecture
@@ -11,6 +12,8 @@ from ..arch.generic_instructions import Label, Comment, Global, DebugData
 from ..arch.generic_instructions import RegisterUseDef, VirtualInstruction
 from ..arch.generic_instructions import InlineAssembly, SetSymbolType
 from ..arch.generic_instructions import ArtificialInstruction, Alignment
+from ..arch.generic_instructions import SectionInstruction
+from ..arch.generic_instructions import EncodedInstruction
 from ..arch.encoding import Instruction
 from ..arch.data_instructions import DZero, DByte
 from ..arch import data_instructions
@@ -21,18 +24,39 @@ from .irdag import SelectionGraphBuilder
 from .instructionselector import InstructionSelector1
 from .instructionscheduler import InstructionScheduler
 from .registerallocator import GraphColoringRegisterAllocator
+from .registerallocator import LinearScanRegisterAllocator
 from .peephole import PeepHoleStream
 
 
+REGISTER_ALLOCATORS = ("auto", "coloring", "linear")
+
+
 class CodeGenerator:
-    """ Machine code generator """
+    """Machine code generator
+
+    Args:
+        arch: the architecture to generate code for.
+        reporter: the report generator to log to.
+        optimize_for: the goal of instruction selection, for example
+            'size' or 'speed'.
+        regalloc: the register allocator to use. This can be 'coloring'
+            for the graph coloring allocator, 'linear' for the faster
+            linear scan allocator, or 'auto' to use graph coloring,
+            except for functions larger than `linear_scan_threshold`
+            instructions.
+    """
 
     logger = logging.getLogger("codegen")
+    linear_scan_threshold = 5000
 
-    def __init__(self, arch, reporter, optimize_for="size"):
+    def __init__(self, arch, reporter, optimize_for="size", regalloc="auto"):
         assert isinstance(arch, Architecture), arch
+        if regalloc not in REGISTER_ALLOCATORS:
+            raise ValueError("Unknown register allocator {}".format(regalloc))
         self.arch = arch
         self.reporter = reporter
+        self.optimize_for = optimize_for
+        self.regalloc = regalloc
         self.verifier = Verifier()
         self.sgraph_builder = SelectionGraphBuilder(arch)
         weights_map = {
@@ -49,9 +73,24 @@ class CodeGenerator:
         self.register_allocator = GraphColoringRegisterAllocator(
             arch, self.instruction_selector, reporter
         )
+        self.linear_scan_allocator = LinearScanRegisterAllocator(
+            arch, self.instruction_selector, reporter
+        )
 
-    def generate(self, ircode: ir.Module, output_stream, debug=False):
-        """ Generate machine code from ir-code into output stream """
+    def generate(
+        self, ircode: ir.Module, output_stream, debug=False, jobs=None
+    ):
+        """Generate machine code from ir-code into output stream
+
+        Args:
+            ircode: the ir-module to generate code for.
+            output_stream: the stream to emit the instructions into.
+            debug: when True, emit debug information.
+            jobs: the amount of worker processes to generate functions
+                with. The functions are emitted as encoded instructions,
+                so this requires a binary output stream. The binary
+                output is identical to a serial build.
+        """
         assert isinstance(ircode, ir.Module)
         if ircode.debug_db:
             self.debug_db = ircode.debug_db
@@ -78,8 +117,11 @@ class CodeGenerator:
         # Munch program into a bunch of frames. One frame per function.
         # Each frame has a flat list of abstract instructions.
         output_stream.select_section("code")
-        for function in ircode.functions:
-            self.generate_function(function, output_stream, debug=debug)
+        if jobs and jobs > 1 and self._can_generate_parallel(ircode, debug):
+            self.generate_functions_parallel(ircode, output_stream, jobs)
+        else:
+            for function in ircode.functions:
+                self.generate_function(function, output_stream, debug=debug)
 
         # Output debug type data:
         if debug:
@@ -172,7 +214,7 @@ class CodeGenerator:
         self.reporter.dump_frame(frame)
 
         # Do register allocation:
-        self.register_allocator.alloc_frame(frame)
+        self.get_register_allocator(frame).alloc_frame(frame)
 
         # TODO: Peep-hole here?
         # frame.instructions = [i for i in frame.instructions]
@@ -202,6 +244,112 @@ class CodeGenerator:
 
         self.reporter.dump_instructions(instruction_list, self.arch)
 
+    def get_register_allocator(self, frame):
+        """ Select the register allocator to use for a frame """
+        if self.regalloc == "linear":
+            return self.linear_scan_allocator
+        elif (
+            self.regalloc == "auto"
+            and len(frame.instructions) > self.linear_scan_threshold
+        ):
+            self.logger.debug(
+                "Using linear scan allocation for %s instructions",
+                len(frame.instructions),
+            )
+            return self.linear_scan_allocator
+        else:
+            return self.register_allocator
+
+    def _can_generate_parallel(self, ircode, debug):
+        """ Check if functions can be generated in several processes """
+        if len(ircode.functions) < 2:
+            return False
+
+        if debug:
+            # The debug database is shared between all functions.
+            self.logger.info("Not generating in parallel with debug info")
+            return False
+
+        if "fork" not in multiprocessing.get_all_start_methods():
+            self.logger.info("Not generating in parallel, fork unavailable")
+            return False
+
+        # Inline assembly uses the shared assembler, which may number
+        # literals across functions:
+        for function in ircode.functions:
+            for instruction in function.get_instructions():
+                if isinstance(instruction, ir.InlineAsm):
+                    self.logger.info(
+                        "Not generating in parallel, inline assembly used"
+                    )
+                    return False
+        return True
+
+    def generate_functions_parallel(self, ircode, output_stream, jobs):
+        """Generate code for all functions using a pool of processes.
+
+        Each worker produces the instruction list for a single function.
+        These lists are emitted in order of the functions in the module,
+        so the output equals the output of a serial build.
+        """
+        functions = ircode.functions
+        processes = min(jobs, len(functions))
+        self.logger.info(
+            "Generating %s functions using %s processes",
+            len(functions),
+            processes,
+        )
+        self.reporter.message(
+            "Generated {} functions in {} processes".format(
+                len(functions), processes
+            )
+        )
+
+        # Forked workers inherit the ir-module, so only the function
+        # index is transferred to the worker:
+        context = multiprocessing.get_context("fork")
+        with context.Pool(
+            processes,
+            initializer=_init_worker,
+            initargs=(
+                self.arch,
+                functions,
+                self.optimize_for,
+                self.regalloc,
+            ),
+        ) as pool:
+            jobs_results = pool.imap(
+                _generate_function_job, range(len(functions))
+            )
+            for records in jobs_results:
+                for record in records:
+                    output_stream.emit(self._unpack_instruction(record))
+
+    def _unpack_instruction(self, record):
+        """ Re-create an instruction packed by a worker process """
+        kind = record[0]
+        if kind == "section":
+            return SectionInstruction(record[1])
+        elif kind == "global":
+            return Global(record[1])
+        elif kind == "type":
+            return SetSymbolType(record[1], record[2])
+        elif kind == "align":
+            return Alignment(record[1])
+        elif kind == "label":
+            return Label(record[1])
+        elif kind == "comment":
+            return Comment(record[1])
+        else:
+            assert kind == "data"
+            _, data, symbols, relocs = record
+            relocation_map = self.arch.isa.relocation_map
+            relocations = [
+                relocation_map[name](symbol, offset=offset, addend=addend)
+                for name, symbol, offset, addend in relocs
+            ]
+            return EncodedInstruction(data, symbols, relocations)
+
     def select_and_schedule(self, ir_function, frame):
         """ Perform instruction selection and scheduling """
         self.logger.debug("Selecting instructions")
@@ -278,7 +426,7 @@ class CodeGenerator:
             output_stream.emit(dd)
 
         # Check if we know what variables are live
-        for tmp in frame.ig.temp_map:
+        for tmp in frame.cfg.registers:
             if self.debug_db.contains(tmp):
                 self.debug_db.get(tmp)
                 # print(tmp, di)
@@ -318,3 +466,64 @@ class CodeGenerator:
 
         if value.binding == ir.Binding.GLOBAL:
             output_stream.emit(Global(value.name))
+
+
+# Per process state of code generation workers:
+_worker_state = None
+
+
+def _init_worker(arch, functions, optimize_for, regalloc):
+    """ Prepare a worker process for code generation """
+    from ..utils.reporting import DummyReportGenerator
+
+    global _worker_state
+    code_generator = CodeGenerator(
+        arch,
+        DummyReportGenerator(),
+        optimize_for=optimize_for,
+        regalloc=regalloc,
+    )
+    code_generator.debug_db = DebugDb()
+    _worker_state = (code_generator, functions)
+
+
+def _generate_function_job(index):
+    """ Generate a single function and return it as picklable records """
+    code_generator, functions = _worker_state
+    instructions = []
+    code_generator.generate_function(
+        functions[index], FunctionOutputStream(instructions.append)
+    )
+    return [_pack_instruction(instruction) for instruction in instructions]
+
+
+def _pack_instruction(instruction):
+    """Turn an emitted instruction into a picklable record.
+
+    Instruction classes are often created dynamically, so they cannot
+    be pickled. Transfer the encoded form instead.
+    """
+    if isinstance(instruction, SectionInstruction):
+        return ("section", instruction.name)
+    elif isinstance(instruction, Global):
+        return ("global", instruction.name)
+    elif isinstance(instruction, SetSymbolType):
+        return ("type", instruction.name, instruction.typ)
+    elif isinstance(instruction, Alignment):
+        return ("align", instruction.align)
+    elif isinstance(instruction, Label):
+        return ("label", instruction.name)
+    elif isinstance(instruction, Comment):
+        return ("comment", instruction.comment)
+    else:
+        assert not isinstance(instruction, DebugData)
+        relocations = [
+            (reloc.name, reloc.symbol_name, reloc.offset, reloc.addend)
+            for reloc in instruction.relocations()
+        ]
+        return (
+            "data",
+            instruction.encode(),
+            instruction.symbols(),
+            relocations,
+        )
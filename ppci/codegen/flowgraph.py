@@ -1,6 +1,16 @@
+""" Flow graph of machine instructions, used for liveness analysis.
+
+Liveness is determined with bit vectors. The registers of a function are
+numbered densely, so that a set of registers can be represented by a python
+integer, in which bit n is set when the register with number n is present.
+Unions and differences of such sets are a single operation on integers.
+"""
+
 import logging
-from collections import defaultdict
-from ..graph.digraph import DiGraph, DiNode, dfs
+from collections import deque
+from collections.abc import Set
+from itertools import chain
+from ..graph.digraph import DiGraph, DiNode
 
 
 class FlowGraphNode(DiNode):
@@ -14,19 +24,25 @@ class FlowGraphNode(DiNode):
         self.live_in = set()
         self.live_out = set()
         self.instructions = []
+        self.uses = []
+        self.defs = []
 
         # Start with the instruction itself..
         self.add_instruction(ins)
 
     def add_instruction(self, ins):
         """ Bundle the instruction into the current node. """
-        ins.gen = set(ins.used_registers)
-        ins.kill = set(ins.defined_registers)
+        uses = ins.used_registers
+        defs = ins.defined_registers
+        ins.gen = set(uses)
+        ins.kill = set(defs)
         self.instructions.append(ins)
+        self.uses.append(uses)
+        self.defs.append(defs)
 
         # Combine gen and kill effects of the node and the new instruction:
-        self.gen = self.gen | (ins.gen - self.kill)
-        self.kill = self.kill | ins.kill
+        self.gen |= ins.gen - self.kill
+        self.kill |= ins.kill
 
     def __repr__(self):
         r = "CFG-node({})".format(len(self.instructions))
@@ -44,6 +60,46 @@ class FlowGraphNode(DiNode):
         return r
 
 
+class LiveSet(Set):
+    """A read only set of registers, stored as a bit vector.
+
+    The bits refer to the register numbering of a flow graph.
+    """
+
+    __slots__ = ("bits", "flowgraph")
+
+    def __init__(self, bits, flowgraph):
+        self.bits = bits
+        self.flowgraph = flowgraph
+
+    @classmethod
+    def _from_iterable(cls, it):
+        return set(it)
+
+    def __contains__(self, register):
+        number = self.flowgraph.register_numbers.get(register)
+        return number is not None and bool(self.bits >> number & 1)
+
+    def __iter__(self):
+        registers = self.flowgraph.registers
+        for number in iter_bits(self.bits):
+            yield registers[number]
+
+    def __len__(self):
+        return bin(self.bits).count("1")
+
+    def __repr__(self):
+        return repr(set(self))
+
+
+def iter_bits(bits):
+    """ Iterate over the numbers of the bits set in an integer """
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
 class FlowGraph(DiGraph):
     """ A directed graph containing nodes with linear lists of instructions """
 
@@ -52,7 +108,9 @@ class FlowGraph(DiGraph):
         super().__init__()
         self.logger = logging.getLogger("flowgraph")
         self._map = {}
-        self._live_ranges = defaultdict(list)
+        self.register_numbers = {}
+        self.registers = []
+        self.roots = []
 
         # TODO: make this very tricky part of code better readable!!!
 
@@ -102,7 +160,59 @@ class FlowGraph(DiGraph):
             self.add_node(node)
         return self._map[ins]
 
-    # def live_range(
+    def number_registers(self):
+        """Number all registers in order of appearance.
+
+        The numbering determines the bits of the live sets.
+        """
+        numbers = self.register_numbers
+        for node in self:
+            for ins, uses, defs in zip(
+                node.instructions, node.uses, node.defs
+            ):
+                for register in chain(uses, defs, ins.clobbers):
+                    if register not in numbers:
+                        numbers[register] = len(numbers)
+        self.registers = list(numbers)
+
+    def mask(self, registers):
+        """ Get the bit vector for the given registers """
+        numbers = self.register_numbers
+        bits = 0
+        for register in registers:
+            bits |= 1 << numbers[register]
+        return bits
+
+    def postorder(self):
+        """Determine a postorder of the nodes.
+
+        Nodes are visited depth first, starting from each node which
+        was not yet visited, in node order. These starting nodes are
+        recorded as roots.
+        """
+        order = []
+        visited = set()
+        self.roots = []
+        for root in self:
+            if root in visited:
+                continue
+            self.roots.append(root)
+            visited.add(root)
+            stack = [(root, iter(root.successors))]
+            while stack:
+                node, successors = stack[-1]
+                for successor in successors:
+                    if successor not in visited:
+                        visited.add(successor)
+                        stack.append(
+                            (successor, iter(successor.successors))
+                        )
+                        break
+                else:
+                    stack.pop()
+                    order.append(node)
+        return order
+
     def calculate_liveness(self):
         """ Calculate liveness in CFG: """
         ###
@@ -110,54 +220,62 @@ class FlowGraph(DiGraph):
         #  in[n] = use[n] UNION (out[n] - def[n])
         #  out[n] = for s in n.succ in union in[s]
         ###
-        for node in self:
-            node.live_in = set()
-            node.live_out = set()
-
-        # Sort flowgraph nodes by backward depth first search:
-        # TODO: cfg_nodes = [x[1] for x in dfs(self.nodes[0], reverse=True)]
-        cfg_nodes = list(self.nodes)
-
-        # Dataflow fixed point iteration over the nodes in the CFG:
-        n_iterations = 0
-        change = True
-        while change:
-            change = False
-            for node in cfg_nodes:
-                _in = node.live_in
-                _out = node.live_out
-                node.live_in = node.gen | (node.live_out - node.kill)
-                if node.successors:
-                    node.live_out = set.union(
-                        *(s.live_in for s in node.successors)
-                    )
-                else:
-                    node.live_out = set()
+        self.number_registers()
+        mask = self.mask
+        gen = {node: mask(node.gen) for node in self}
+        kill = {node: mask(node.kill) for node in self}
+        live_in = {node: 0 for node in self}
+        live_out = {node: 0 for node in self}
 
-                # Record for change:
-                change = (
-                    change or (_in != node.live_in) or (_out != node.live_out)
-                )
-            n_iterations += 1
+        # Liveness flows backwards, so visit successors before their
+        # predecessors, which is the case in postorder:
+        worklist = deque(self.postorder())
+        pending = set(worklist)
+        n_visits = 0
+        while worklist:
+            node = worklist.popleft()
+            pending.remove(node)
+            n_visits += 1
+            out = 0
+            for successor in node.successors:
+                out |= live_in[successor]
+            live_out[node] = out
+            _in = gen[node] | (out & ~kill[node])
+            if _in != live_in[node]:
+                live_in[node] = _in
+                for predecessor in node.predecessors:
+                    if predecessor not in pending:
+                        pending.add(predecessor)
+                        worklist.append(predecessor)
 
         # In one pass fix all instructions:
         for node in self:
             assert len(node.instructions) > 0
-            ins2 = node.instructions[-1]
-            ins2.live_out = node.live_out  # Propagate into last instruction
-            ins2.live_in = ins2.gen | (ins2.live_out - ins2.kill)
-            if len(node.instructions) > 1:
-                for ins in reversed(node.instructions[:-1]):
-                    ins1 = ins
-
-                    ins1.live_out = ins2.live_in
-                    ins1.live_in = ins1.gen | (ins1.live_out - ins1.kill)
-
-                    for vreg in ins2.live_in & ins1.live_out:
-                        self._live_ranges[vreg].append((ins1, ins2))
-
-                    ins2 = ins1
+            node.live_in = LiveSet(live_in[node], self)
+            node.live_out = LiveSet(live_out[node], self)
+            live = live_out[node]
+            for ins in reversed(node.instructions):
+                ins.live_out = LiveSet(live, self)
+                live = mask(ins.gen) | (live & ~mask(ins.kill))
+                ins.live_in = LiveSet(live, self)
 
         self.logger.debug(
-            "Iterations: %s,  nodes: %s", n_iterations, len(self)
+            "Node visits: %s, nodes: %s, registers: %s",
+            n_visits,
+            len(self),
+            len(self.registers),
         )
+
+    def live_ranges(self, vreg):
+        """Determine the live range of a register.
+
+        Returns pairs of subsequent instructions, between which the
+        register is live.
+        """
+        number = self.register_numbers[vreg]
+        ranges = []
+        for node in self:
+            for ins1, ins2 in zip(node.instructions, node.instructions[1:]):
+                if ins1.live_out.bits >> number & 1:
+                    ranges.append((ins1, ins2))
+        return ranges
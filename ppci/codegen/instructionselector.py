@@ -57,10 +57,9 @@ Memory move operations:
 import abc
 import logging
 from ..utils.tree import Tree
-from .treematcher import State
 from .. import ir
 from ..arch.encoding import Instruction
-from .burg import BurgSystem
+from .burg import BurgSystem, compile_matcher
 from .irdag import FunctionInfo, prepare_function_info
 from .dagsplit import DagSplitter
 from ..arch.generic_instructions import RegisterUseDef, InlineAssembly
@@ -153,10 +152,21 @@ class InstructionContext(ContextInterface):
 
 
 class TreeSelector:
-    """ Tree matcher that can match a tree and generate instructions """
+    """Tree matcher that can match a tree and generate instructions.
+
+    The rules of the burg system are compiled into a matcher on first use.
+    The compiled matcher is shared by all selectors for the same rules.
+    """
 
     def __init__(self, sys):
         self.sys = sys
+        self._matcher = None
+
+    @property
+    def matcher(self):
+        if self._matcher is None:
+            self._matcher = compile_matcher(self.sys)
+        return self._matcher
 
     def gen(self, context, tree):
         """Generate code for a given tree. The tree will be tiled with
@@ -170,42 +180,7 @@ class TreeSelector:
 
     def burm_label(self, tree):
         """ Label all nodes in the tree bottom up """
-        for child_tree in tree.children:
-            self.burm_label(child_tree)
-
-        # Now the child nodes have been labeled, assign a state to the tree:
-        tree.state = State()
-
-        # Check all rules for matching with this subtree and
-        # check if a state can be determined
-        for rule in self.sys.get_rules_for_root(tree.name):
-            if self.sys.tree_terminal_equal(tree, rule.tree):
-                nts = self.nts(rule.nr)
-                kids = self.kids(tree, rule.nr)
-
-                # Check for acceptance:
-                if rule.acceptance:
-                    accept = rule.acceptance(tree)
-                else:
-                    accept = True
-
-                if (
-                    all(x.state.has_goal(y) for x, y in zip(kids, nts))
-                    and accept
-                ):
-                    cost = sum(x.state.get_cost(y) for x, y in zip(kids, nts))
-                    marked_rules = set()
-                    self.mark_tree(tree, rule, cost, marked_rules)
-
-    def mark_tree(self, tree, rule, cost, marked_rules):
-        cost = cost + rule.cost
-        tree.state.set_cost(rule.non_term, cost, rule.nr)
-        marked_rules.add(rule)
-
-        # Also set cost for chain rules here:
-        for cr in self.sys.chain_rules_for_nt(rule.non_term):
-            if cr not in marked_rules:
-                self.mark_tree(tree, cr, cost, marked_rules)
+        self.matcher.label(tree)
 
     def apply_rules(self, context, tree, goal):
         """ Apply all selected instructions to the tree """
@@ -225,13 +200,11 @@ class TreeSelector:
 
     def kids(self, tree, rule):
         """ Determine the kid trees for a rule """
-        template_tree = self.sys.get_rule(rule).tree
-        return self.sys.get_kids(tree, template_tree)
+        return self.matcher.kids(tree, rule)
 
     def nts(self, rule):
         """ Get the open ends of this rules pattern """
-        template_tree = self.sys.get_rule(rule).tree
-        return self.sys.get_nts(template_tree)
+        return self.matcher.nts(rule)
 
 
 class InstructionSelector1:
@@ -10,6 +10,8 @@ from collections import defaultdict
 from ..graph.graph import Node
 from ..graph.maskable_graph import MaskableGraph
 from ..arch.registers import Register
+from ..utils.collections import OrderedSet
+from .flowgraph import iter_bits
 
 
 class InterferenceGraphNode(Node):
@@ -17,8 +19,8 @@ class InterferenceGraphNode(Node):
 
     def __init__(self, graph, vreg):
         super().__init__(graph)
-        self.temps = {vreg}
-        self.moves = set()
+        self.temps = OrderedSet([vreg])
+        self.moves = OrderedSet()
         self.reg = vreg if vreg.is_colored else None
         self.reg_class = type(vreg)
 
@@ -50,34 +52,74 @@ class InterferenceGraph(MaskableGraph):
         return self._use_map[tmp]
 
     def calculate_interference(self, flowgraph):
-        """ Construct interference graph """
+        """Construct interference graph.
+
+        Two registers interfere when they are both live after an
+        instruction, or when one of them is defined by it. Instead of
+        connecting all registers live after each instruction, a defined
+        register is connected to the registers live after its definition.
+        A pair of registers which is live at the same time, is live after
+        the definition of one of them, unless both are live since the
+        start of the flow graph. For this reason, all live registers are
+        connected at the first instruction of the flow graph roots.
+
+        The interfering registers are collected as bit vectors, using the
+        register numbering of the flow graph.
+        """
+        registers = flowgraph.registers
+        mask = flowgraph.mask
+        interferences = [0] * len(registers)
+        first_instructions = {node.instructions[0] for node in flowgraph.roots}
+
+        # Create nodes in order of appearance, so that the graph is the
+        # same on each run:
+        seen = 0
         for n in flowgraph:
             for ins in n.instructions:
-                # ins.live_out |= ins.
-                for tmp in ins.live_in:
-                    self.get_node(tmp)
+                live_in = ins.live_in.bits
+                new = live_in & ~seen
+                if new:
+                    seen |= new
+                    for number in iter_bits(new):
+                        self.get_node(registers[number])
 
                 # Live out and zero length defined variables:
-                live_and_def = ins.live_out | ins.kill
-
-                # Add interfering edges:
-                for tmp in live_and_def:
-                    n1 = self.get_node(tmp)
-                    for tmp2 in live_and_def - {tmp}:
-                        n2 = self.get_node(tmp2)
-                        self.add_edge(n1, n2)
+                kill = mask(ins.kill)
+                live_and_def = ins.live_out.bits | kill
+                if live_and_def:
+                    new = live_and_def & ~seen
+                    if new:
+                        seen |= new
+                        for number in iter_bits(new):
+                            self.get_node(registers[number])
+
+                    if ins in first_instructions:
+                        kill = live_and_def
+                    for number in iter_bits(kill):
+                        interferences[number] |= live_and_def
 
                     # Add clobbered interfering edges:
                     for tmp2 in ins.clobbers:
-                        n2 = self.get_node(tmp2)
-                        self.add_edge(n1, n2)
+                        self.get_node(tmp2)
+                        number = flowgraph.register_numbers[tmp2]
+                        interferences[number] |= live_and_def
 
-                # Generate usage info:
-                for reg in ins.defined_registers:
+            # Generate usage info:
+            for ins, uses, defs in zip(n.instructions, n.uses, n.defs):
+                for reg in defs:
                     self._def_map[reg].append(ins)
-                for reg in ins.used_registers:
+                for reg in uses:
                     self._use_map[reg].append(ins)
 
+        # Add interfering edges:
+        temp_map = self.temp_map
+        for number, bits in enumerate(interferences):
+            bits &= ~(1 << number)
+            if bits:
+                n1 = temp_map[registers[number]]
+                for number2 in iter_bits(bits):
+                    self.add_edge(n1, temp_map[registers[number2]])
+
     def has_node(self, tmp):
         """ Check if there exists a node for this temp register """
         assert isinstance(tmp, Register)
@@ -108,7 +150,7 @@ class InterferenceGraph(MaskableGraph):
         """ Combine n and m into n and return n """
         # Copy associated moves and temporaries into n:
         n.temps |= m.temps
-        n.moves.update(m.moves)
+        n.moves |= m.moves
 
         # Update local temp map:
         for tmp in m.temps:
@@ -106,6 +106,21 @@ classes that possibly interfere.
 [Runeson2003]_
 [Smith2004]_
 
+**Linear scan**
+
+Linear scan register allocation does not build an interference graph.
+Instead, the instructions are numbered, and each virtual register gets
+a live interval, which spans all positions where the register is live.
+The intervals are visited in order of their start, and each interval is
+assigned a register which is free during the whole interval. When no
+register is free, the interval which ends last is spilled.
+
+This is much faster than graph coloring, but results in more spills and
+moves. It is intended for cases where compilation speed matters more than
+code quality, such as just in time compilation.
+
+[Poletto1999]_
+
 
 **Implementations**
 
@@ -113,9 +128,12 @@ The following class can be used to perform register allocation.
 
 """
 
+import bisect
+import heapq
 import logging
+from collections import defaultdict
 from functools import lru_cache
-from .flowgraph import FlowGraph
+from .flowgraph import FlowGraph, iter_bits
 from .interferencegraph import InterferenceGraph
 from ..arch.arch import Architecture, Frame
 from ..arch.registers import Register
@@ -190,9 +208,6 @@ class MiniGen:
         return offset_tree
 
 
-# TODO: implement linear scan allocator and other allocators!
-
-
 class GraphColoringRegisterAllocator:
     """Target independent register allocator.
 
@@ -309,6 +324,7 @@ class GraphColoringRegisterAllocator:
         )
 
         cfg.calculate_liveness()
+        self.frame.cfg = cfg
         self.frame.ig = InterferenceGraph()
         self.frame.ig.calculate_interference(cfg)
         self.logger.debug(
@@ -826,3 +842,295 @@ class GraphColoringRegisterAllocator:
             & self.frozenMoves
             == set()
         )
+
+
+class LinearScanRegisterAllocator:
+    """Target independent linear scan register allocator.
+
+    Each virtual register is given an interval of positions in the
+    instruction list. Instruction i has position 2i for the registers
+    it reads, and position 2i+1 for the registers it writes or which are
+    live after it. Physical registers are tracked at the exact positions
+    where they are used, since they are often live only shortly, for
+    example around a call.
+
+    Spilled registers are rewritten into loads and stores of fresh
+    virtual registers, after which the allocation is repeated.
+    """
+
+    logger = logging.getLogger("regalloc")
+    max_spill_rounds = 30
+
+    def __init__(self, arch: Architecture, instruction_selector, reporter):
+        assert isinstance(arch, Architecture), arch
+        self.arch = arch
+        self.spill_gen = MiniGen(arch, instruction_selector)
+        self.reporter = reporter
+        self.alias = arch.info.alias
+        self.cls_regs = {}
+        for reg_class in self.arch.info.register_classes:
+            self.cls_regs[reg_class.typ] = list(reg_class.registers)
+
+    def alloc_frame(self, frame: Frame):
+        """Do register allocation for a single frame.
+
+        Args:
+            frame: The frame to perform register allocation on.
+        """
+        spill_rounds = 0
+        while True:
+            cfg = FlowGraph(frame.instructions)
+            cfg.calculate_liveness()
+            intervals = self.build_intervals(frame, cfg)
+            assignment, spilled = self.scan(cfg, intervals)
+            if not spilled:
+                break
+
+            spill_rounds += 1
+            self.logger.debug(
+                "Spilling round %s, %s registers", spill_rounds, len(spilled)
+            )
+            if spill_rounds > self.max_spill_rounds:
+                raise RuntimeError(
+                    "Give up: more than {} spill rounds done!".format(
+                        self.max_spill_rounds
+                    )
+                )
+            self.rewrite_program(frame, spilled)
+
+        frame.cfg = cfg
+        self.apply_colors(frame, cfg, assignment)
+        self.remove_redundant_moves(frame)
+
+    def build_intervals(self, frame, cfg):
+        """Determine the live intervals of the virtual registers.
+
+        Returns a list of tuples with start, end and register number,
+        sorted by start position. The positions at which physical
+        registers are in use are stored in the blocked map.
+        """
+        registers = cfg.registers
+        mask = cfg.mask
+        fixed = 0
+        for number, register in enumerate(registers):
+            if register.is_colored:
+                fixed |= 1 << number
+
+        start = {}
+        end = {}
+
+        def extend(number, position):
+            if number in start:
+                if position < start[number]:
+                    start[number] = position
+                elif position > end[number]:
+                    end[number] = position
+            else:
+                start[number] = end[number] = position
+
+        positions = {ins: i for i, ins in enumerate(frame.instructions)}
+        points = defaultdict(list)
+        self.hints = defaultdict(list)
+        for node in cfg:
+            first = 2 * positions[node.instructions[0]]
+            last = 2 * positions[node.instructions[-1]] + 1
+            for number in iter_bits(node.live_in.bits & ~fixed):
+                extend(number, first)
+            for number in iter_bits(node.live_out.bits & ~fixed):
+                extend(number, last)
+
+            # Walk backwards, tracking physical registers exactly:
+            live = node.live_out.bits & fixed
+            for ins, uses, defs in reversed(
+                list(zip(node.instructions, node.uses, node.defs))
+            ):
+                position = 2 * positions[ins]
+                gen = mask(uses)
+                kill = mask(defs)
+                for number in iter_bits(gen & ~fixed):
+                    extend(number, position)
+                for number in iter_bits(kill & ~fixed):
+                    extend(number, position + 1)
+
+                out = live | ((kill | mask(ins.clobbers)) & fixed)
+                for number in iter_bits(out):
+                    points[number].append(position + 1)
+                live = (gen & fixed) | (live & ~kill)
+                for number in iter_bits(live):
+                    points[number].append(position)
+
+                if ins.ismove:
+                    dst = cfg.register_numbers[defs[0]]
+                    src = cfg.register_numbers[uses[0]]
+                    self.hints[dst].append(src)
+                    self.hints[src].append(dst)
+
+        # Determine for each allocatable register where it is blocked:
+        self.blocked = defaultdict(list)
+        for number, register_points in points.items():
+            register = registers[number]
+            for register2 in self.alias.get(register, (register,)):
+                self.blocked[register2].extend(register_points)
+        for register_points in self.blocked.values():
+            register_points.sort()
+
+        return sorted((start[n], end[n], n) for n in start)
+
+    def is_blocked(self, register, start, end):
+        """ Check if a physical register is in use between start and end """
+        points = self.blocked.get(register)
+        if points:
+            index = bisect.bisect_left(points, start)
+            return index < len(points) and points[index] <= end
+        return False
+
+    def scan(self, cfg, intervals):
+        """Assign registers to the intervals.
+
+        Returns a map from register number to the assigned register,
+        and a list of spilled registers.
+        """
+        registers = cfg.registers
+        assignment = {}
+        spilled = []
+        active = {}  # Map from number to end of intervals with a register
+        expiry = []  # Heap with end and number of active intervals
+        occupied = defaultdict(int)
+        starts = {number: start for start, _, number in intervals}
+
+        def assign(number, register, end):
+            assignment[number] = register
+            active[number] = end
+            heapq.heappush(expiry, (end, number))
+            for register2 in self.alias.get(register, (register,)):
+                occupied[register2] += 1
+
+        def release(number):
+            register = assignment[number]
+            del active[number]
+            for register2 in self.alias.get(register, (register,)):
+                occupied[register2] -= 1
+
+        for start, end, number in intervals:
+            # Expire intervals which ended:
+            while expiry and expiry[0][0] < start:
+                _, number2 = heapq.heappop(expiry)
+                if number2 in active:
+                    release(number2)
+
+            class_registers = self.cls_regs[type(registers[number])]
+            candidates = []
+            for hint in self.hints.get(number, ()):
+                if registers[hint].is_colored:
+                    candidates.append(registers[hint])
+                elif hint in assignment:
+                    candidates.append(assignment[hint])
+            candidates.extend(class_registers)
+
+            for register in candidates:
+                if (
+                    not occupied[register]
+                    and register in class_registers
+                    and not self.is_blocked(register, start, end)
+                ):
+                    assign(number, register, end)
+                    break
+            else:
+                # Take the register whose holders all end last, unless
+                # the current interval ends later. Intervals within a
+                # single instruction do not get shorter when spilled,
+                # so they are never spilled.
+                best = None
+                best_end = end if end - start > 1 else -1
+                for register in class_registers:
+                    if self.is_blocked(register, start, end):
+                        continue
+                    aliases = self.alias.get(register, (register,))
+                    holders = [
+                        number2
+                        for number2 in active
+                        if assignment[number2] in aliases
+                    ]
+                    if any(active[n] - starts[n] <= 1 for n in holders):
+                        continue
+                    holders_end = min(active[n] for n in holders)
+                    if holders_end > best_end:
+                        best = register, holders
+                        best_end = holders_end
+
+                if best is None:
+                    spilled.append(number)
+                else:
+                    register, holders = best
+                    for number2 in holders:
+                        release(number2)
+                        del assignment[number2]
+                        spilled.append(number2)
+                    assign(number, register, end)
+
+        spilled = [registers[number] for number in spilled]
+        return assignment, spilled
+
+    def rewrite_program(self, frame, spilled):
+        """Place the spilled registers on the stack.
+
+        Each instruction using a spilled register gets a fresh virtual
+        register, which is loaded before and stored after the instruction.
+        """
+        slots = {}
+        for vreg in spilled:
+            size = type(vreg).bitsize // 8
+            slots[vreg] = frame.alloc(size, size)
+            self.logger.debug("Placing %s on stack at %s", vreg, slots[vreg])
+
+        instructions = []
+        for instruction in frame.instructions:
+            registers = [
+                register
+                for register in OrderedSet(
+                    instruction.used_registers
+                    + instruction.defined_registers
+                )
+                if register in slots
+            ]
+            if not registers:
+                instructions.append(instruction)
+                continue
+
+            loads = []
+            stores = []
+            for tmp in registers:
+                slot = slots[tmp]
+                vreg2 = frame.new_reg(type(tmp))
+                instruction.replace_register(tmp, vreg2)
+                if instruction.reads_register(vreg2):
+                    loads.extend(self.spill_gen.gen_load(frame, vreg2, slot))
+                if instruction.writes_register(vreg2):
+                    stores.extend(
+                        self.spill_gen.gen_store(frame, vreg2, slot)
+                    )
+            instructions.extend(loads)
+            instructions.append(instruction)
+            instructions.extend(stores)
+        frame.instructions = instructions
+
+    def apply_colors(self, frame, cfg, assignment):
+        """ Assign the registers to the virtual registers """
+        for register in cfg.registers:
+            if register.is_colored:
+                frame.used_regs.add(register.get_real())
+        for number, register in assignment.items():
+            cfg.registers[number].set_color(register.color)
+            frame.used_regs.add(register.get_real())
+
+    def remove_redundant_moves(self, frame):
+        """ Remove moves between registers which got the same register """
+        instructions = []
+        for instruction in frame.instructions:
+            if instruction.ismove:
+                src = instruction.used_registers[0]
+                dst = instruction.defined_registers[0]
+                if type(src) is type(dst) and src.color == dst.color:
+                    continue
+            instructions.append(instruction)
+        frame.instructions = instructions
@@ -7,20 +7,96 @@ from .. import ir
 
 
 class CallGraph(DiGraph):
-    pass
+    """ A graph with an edge from each subroutine to the routines it calls """
+
+    def __init__(self):
+        super().__init__()
+        self.node_map = {}
+
+    def get_node(self, routine):
+        """ Get the node of the given subroutine """
+        return self.node_map[routine]
+
+    def strongly_connected_components(self):
+        """Get the groups of routines which call each other.
+
+        The components are sorted bottom-up, so that a component comes
+        after the components it calls. This is Tarjan's algorithm.
+        """
+        index = {}
+        lowlink = {}
+        stack = []
+        on_stack = set()
+        components = []
+        for root in self.nodes:
+            if root in index:
+                continue
+
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            worklist = [(root, iter(root.successors))]
+            while worklist:
+                node, successors = worklist[-1]
+                for successor in successors:
+                    if successor not in index:
+                        index[successor] = lowlink[successor] = len(index)
+                        stack.append(successor)
+                        on_stack.add(successor)
+                        worklist.append(
+                            (successor, iter(successor.successors))
+                        )
+                        break
+                    elif successor in on_stack:
+                        lowlink[node] = min(lowlink[node], index[successor])
+                else:
+                    worklist.pop()
+                    if worklist:
+                        parent = worklist[-1][0]
+                        lowlink[parent] = min(lowlink[parent], lowlink[node])
+
+                    if lowlink[node] == index[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.remove(member)
+                            component.append(member)
+                            if member is node:
+                                break
+                        components.append(component)
+        return components
+
+
+class CallGraphNode(DiNode):
+    """ A subroutine in the call graph """
+
+    def __init__(self, graph, routine):
+        super().__init__(graph)
+        self.routine = routine
+
+    def __repr__(self):
+        return "CallGraphNode({})".format(self.routine.name)
+
+    @property
+    def is_recursive(self):
+        """ Test if this routine calls itself """
+        return self in self.successors
 
 
 def mod_to_call_graph(ir_module) -> CallGraph:
-    """ Create a call graph for an ir-module """
+    """Create a call graph for an ir-module.
+
+    Calls via a function pointer are not part of the call graph.
+    """
     cg = CallGraph()
 
     # Create call graph nodes:
-    node_map = {}
+    node_map = cg.node_map
     for routine in ir_module.functions:
-        node_map[routine] = DiNode(cg)
+        node_map[routine] = CallGraphNode(cg, routine)
     for routine in ir_module.externals:
         if isinstance(routine, ir.ExternalSubRoutine):
-            node_map[routine] = DiNode(cg)
+            node_map[routine] = CallGraphNode(cg, routine)
 
     # Add call graph edges:
     for routine in ir_module.functions:
@@ -28,7 +104,8 @@ def mod_to_call_graph(ir_module) -> CallGraph:
         for instruction in routine.get_instructions():
             if isinstance(instruction, (ir.FunctionCall, ir.ProcedureCall)):
                 routine2 = instruction.callee
-                n2 = node_map[routine2]
-                cg.add_edge(n1, n2)
+                if routine2 in node_map:
+                    n2 = node_map[routine2]
+                    cg.add_edge(n1, n2)
 
     return cg
@@ -305,27 +305,34 @@ class ControlFlowGraph(DiGraph):
                     self._reach[node] = new_reach
 
     def calculate_loops(self):
-        """ Calculate loops by use of the dominator info """
-        if self._reach is None:
-            self.calculate_reach()
+        """Calculate the natural loops by use of the dominator info.
 
-        loops = []
+        A back edge is an edge to a node which dominates the source of the
+        edge. The loop consists of the header and all nodes which can reach
+        a back edge to the header without passing through the header.
+        Back edges to the same header give a single loop.
+        """
+        latches = {}
         for node in self.nodes:
             for header in self.successors(node):
                 if header.dominates(node):
                     # Back edge!
-                    # Determine the other nodes in the loop:
-                    loop_nodes = [
-                        ln
-                        for ln in self._reach[header]
-                        if (
-                            header.dominates(ln)
-                            and ln.can_reach(header)
-                            and ln is not header
-                        )
-                    ]
-                    loop = Loop(header=header, rest=loop_nodes)
-                    loops.append(loop)
+                    latches.setdefault(header, []).append(node)
+
+        loops = []
+        for header, header_latches in latches.items():
+            # Walk backwards from the back edges to the header:
+            loop_nodes = {header}
+            worklist = list(header_latches)
+            while worklist:
+                node = worklist.pop()
+                # Skip nodes which cannot be reached from the entry:
+                if node not in loop_nodes and node in self.tree_map:
+                    loop_nodes.add(node)
+                    worklist.extend(self.predecessors(node))
+            loop_nodes.remove(header)
+            loop = Loop(header=header, rest=list(loop_nodes))
+            loops.append(loop)
         return loops
 
     def calculate_dominance_frontier(self):
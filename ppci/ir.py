@@ -447,7 +447,8 @@ class SubRoutine(GlobalValue):
         for block in unreachable:
             # Important! Loop over successors first, since last instruction
             # determines the successors:
-            for successor in block.successors:
+            # A conditional jump can have the same block as both targets:
+            for successor in set(block.successors):
                 self.logger.debug("updating successor %s", successor)
                 for phi in successor.phis:
                     self.logger.debug("updating phi %s", phi)
@@ -708,6 +709,8 @@ class Instruction:
         self._var_map = {}
         self.block = None
         self.uses = OrderedSet()
+        # A value can be used several times, for example in 'a + a':
+        self._use_counts = {}
 
     @property
     def function(self):
@@ -718,17 +721,31 @@ class Instruction:
         """ Add v to the list of values used by this instruction """
         if not isinstance(value, Value):
             raise TypeError("Expected Value, but got {}".format(value))
-        self.uses.add(value)
-        value.add_user(self)
+        if value in self._use_counts:
+            self._use_counts[value] += 1
+        else:
+            self._use_counts[value] = 1
+            self.uses.add(value)
+            value.add_user(self)
 
     def del_use(self, v):
+        """ Remove a single usage of v by this instruction """
         assert isinstance(v, Value)
-        self.uses.remove(v)
-        v.del_user(self)
+        self._use_counts[v] -= 1
+        if not self._use_counts[v]:
+            del self._use_counts[v]
+            self.uses.remove(v)
+            v.del_user(self)
+
+    def _del_all_uses(self):
+        """ Remove all usages of all values by this instruction """
+        for use in list(self.uses):
+            del self._use_counts[use]
+            self.uses.remove(use)
+            use.del_user(self)
 
     def delete(self):
-        for use in list(self.uses):
-            self.del_use(use)
+        self._del_all_uses()
         if self.uses:
             uses = ", ".join(map(str, self.uses))
             raise ValueError(
@@ -750,8 +767,7 @@ class Instruction:
                 self.add_use(new)
 
     def remove_from_block(self):
-        for use in list(self.uses):
-            self.del_use(use)
+        self._del_all_uses()
         self.block.remove_instruction(self)
 
     @property
@@ -893,11 +909,11 @@ class FunctionCall(LocalValue):
 
     def replace_use(self, old, new):
         super().replace_use(old, new)
-        if old in self.arguments:
-            idx = self.arguments.index(old)
-            self.del_use(old)
-            self.arguments[idx] = new
-            self.add_use(new)
+        for idx, argument in enumerate(self.arguments):
+            if argument is old:
+                self.del_use(old)
+                self.arguments[idx] = new
+                self.add_use(new)
 
     def __str__(self):
         args = ", ".join(arg.name for arg in self.arguments)
@@ -928,11 +944,11 @@ class ProcedureCall(Instruction):
 
     def replace_use(self, old, new):
         super().replace_use(old, new)
-        if old in self.arguments:
-            idx = self.arguments.index(old)
-            self.del_use(old)
-            self.arguments[idx] = new
-            self.add_use(new)
+        for idx, argument in enumerate(self.arguments):
+            if argument is old:
+                self.del_use(old)
+                self.arguments[idx] = new
+                self.add_use(new)
 
     def __str__(self):
         args = ", ".join(arg.name for arg in self.arguments)
@@ -1231,11 +1247,11 @@ class InlineAsm(Instruction):
 
     def replace_use(self, old, new):
         super().replace_use(old, new)
-        if old in self.input_values:
-            idx = self.input_values.index(old)
-            self.del_use(old)
-            self.input_values[idx] = new
-            self.add_use(new)
+        for idx, value in enumerate(self.input_values):
+            if value is old:
+                self.del_use(old)
+                self.input_values[idx] = new
+                self.add_use(new)
 
     def __str__(self):
         return 'asm ({})'.format(self.template)
@@ -1326,9 +1342,10 @@ class JumpBase(FinalInstruction):
 
     def delete(self):
         """ Clear references """
-        while self._block_map:
-            _, block = self._block_map.popitem()
+        for block in set(self._block_map.values()):
             block.references.remove(self)
+        self._block_map.clear()
+        super().delete()
 
     @property
     def targets(self):
@@ -5,12 +5,14 @@ from .verify import verify_module, Verifier
 from .writer import Writer, print_module
 from .reader import Reader, read_module
 from .builder import Builder, split_block
+from .clone import clone_instruction
 from .link import ir_link
 from .io import to_json, from_json
 from .instrument import add_tracer
 
 __all__ = [
     "Builder",
+    "clone_instruction",
     "ir_link",
     "print_module",
     "read_module",
@@ -0,0 +1,115 @@
+""" Create copies of ir-code instructions.
+"""
+
+from .. import ir
+
+
+def clone_instruction(instruction, value_map=None, block_map=None):
+    """Create a copy of an instruction.
+
+    The values used by the instruction are replaced by their entry in
+    value_map, and jump targets and phi inputs by their entry in block_map.
+    Values and blocks without an entry are used as is. The copy is not
+    added to a block.
+    """
+    value_map = {} if value_map is None else value_map
+    block_map = {} if block_map is None else block_map
+
+    def value(v):
+        return value_map.get(v, v)
+
+    def block(b):
+        return block_map.get(b, b)
+
+    if isinstance(instruction, ir.Const):
+        return ir.Const(instruction.value, instruction.name, instruction.ty)
+    elif isinstance(instruction, ir.Binop):
+        return ir.Binop(
+            value(instruction.a),
+            instruction.operation,
+            value(instruction.b),
+            instruction.name,
+            instruction.ty,
+        )
+    elif isinstance(instruction, ir.Unop):
+        return ir.Unop(
+            instruction.operation,
+            value(instruction.a),
+            instruction.name,
+            instruction.ty,
+        )
+    elif isinstance(instruction, ir.Cast):
+        return ir.Cast(
+            value(instruction.src), instruction.name, instruction.ty
+        )
+    elif isinstance(instruction, ir.AddressOf):
+        return ir.AddressOf(value(instruction.src), instruction.name)
+    elif isinstance(instruction, ir.Undefined):
+        return ir.Undefined(instruction.name, instruction.ty)
+    elif isinstance(instruction, ir.LiteralData):
+        return ir.LiteralData(instruction.data, instruction.name)
+    elif isinstance(instruction, ir.Alloc):
+        return ir.Alloc(
+            instruction.name, instruction.amount, instruction.alignment
+        )
+    elif isinstance(instruction, ir.Load):
+        return ir.Load(
+            value(instruction.address),
+            instruction.name,
+            instruction.ty,
+            volatile=instruction.volatile,
+        )
+    elif isinstance(instruction, ir.Store):
+        return ir.Store(
+            value(instruction.value),
+            value(instruction.address),
+            volatile=instruction.volatile,
+        )
+    elif isinstance(instruction, ir.CopyBlob):
+        return ir.CopyBlob(
+            value(instruction.dst), value(instruction.src), instruction.amount
+        )
+    elif isinstance(instruction, ir.FunctionCall):
+        return ir.FunctionCall(
+            value(instruction.callee),
+            [value(a) for a in instruction.arguments],
+            instruction.name,
+            instruction.ty,
+        )
+    elif isinstance(instruction, ir.ProcedureCall):
+        return ir.ProcedureCall(
+            value(instruction.callee),
+            [value(a) for a in instruction.arguments],
+        )
+    elif isinstance(instruction, ir.InlineAsm):
+        new_instruction = ir.InlineAsm(
+            instruction.template, instruction.clobbers
+        )
+        for input_value in instruction.input_values:
+            new_instruction.add_input_variable(value(input_value))
+        for output_value in instruction.output_values:
+            new_instruction.add_output_variable(value(output_value))
+        return new_instruction
+    elif isinstance(instruction, ir.Phi):
+        new_instruction = ir.Phi(instruction.name, instruction.ty)
+        for incoming, incoming_value in instruction.inputs.items():
+            new_instruction.set_incoming(
+                block(incoming), value(incoming_value)
+            )
+        return new_instruction
+    elif isinstance(instruction, ir.Exit):
+        return ir.Exit()
+    elif isinstance(instruction, ir.Return):
+        return ir.Return(value(instruction.result))
+    elif isinstance(instruction, ir.Jump):
+        return ir.Jump(block(instruction.target))
+    elif isinstance(instruction, ir.CJump):
+        return ir.CJump(
+            value(instruction.a),
+            instruction.cond,
+            value(instruction.b),
+            block(instruction.lab_yes),
+            block(instruction.lab_no),
+        )
+    else:  # pragma: no cover
+        raise NotImplementedError(str(instruction))
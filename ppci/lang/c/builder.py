@@ -20,6 +20,12 @@ class CBuilder:
         self.cgen = None
 
     def build(self, src: io.TextIOBase, filename: str, reporter=None):
+        preprocessor = CPreProcessor(self.coptions)
+        tokens = preprocessor.process_file(src, filename)
+        return self.build_tokens(tokens, filename, reporter=reporter)
+
+    def build_tokens(self, tokens, filename: str, reporter=None):
+        """ Build ir-code from an already preprocessed stream of tokens """
         if reporter:
             reporter.heading(2, "C builder")
             reporter.message(
@@ -29,7 +35,7 @@ class CBuilder:
         self.logger.info("Starting C compilation (%s)", cdialect)
 
         context = CContext(self.coptions, self.arch_info)
-        compile_unit = _parse(src, filename, context)
+        compile_unit = _parse_tokens(tokens, context)
 
         if reporter:
             f = io.StringIO()
@@ -66,6 +72,10 @@ def create_ast(src, arch_info, filename="<snippet>", coptions=None):
 def _parse(src, filename, context):
     preprocessor = CPreProcessor(context.coptions)
     tokens = preprocessor.process_file(src, filename)
+    return _parse_tokens(tokens, context)
+
+
+def _parse_tokens(tokens, context):
     semantics = CSemantics(context)
     parser = CParser(context.coptions, semantics)
     tokens = prepare_for_parsing(tokens, parser.keywords)
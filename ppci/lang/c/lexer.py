@@ -1,11 +1,13 @@
 """ C Language lexer """
 
+import bisect
 import logging
-import io
+import re
 
 from ..common import SourceLocation
+from ...common import CompilerError
 from .token import CToken
-from ..tools.handlexer import HandLexerBase, Char
+from ..tools.handlexer import Char
 
 
 class SourceFile:
@@ -86,350 +88,290 @@ def lex_text(text, coptions):
     return list(lexer.lex_text(text))
 
 
-class CLexer(HandLexerBase):
-    """ Lexer used for the preprocessor """
+class CLexer:
+    """Lexer used for the preprocessor.
+
+    The whole source text is scanned with regular expressions. Trigraphs
+    and continued lines are replaced in the text before scanning. The
+    locations of the tokens are calculated from the offsets of the lines
+    in the original text.
+    """
 
     logger = logging.getLogger("clexer")
-    lower_letters = "abcdefghijklmnopqrstuvwxyz"
-    upper_letters = lower_letters.upper()
-    binary_numbers = "01"
-    octal_numbers = binary_numbers + "234567"
-    numbers = octal_numbers + "89"
-    hex_numbers = numbers + "abcdefABCDEF"
+
+    exponent = r"(?:[eEpP][+-]?[0-9]*)?"
+    int_suffix = r"(?:[uU][lL]{0,2}|[lL](?:[uU][lL]?|[lL][uU]?)?)?"
+    token_spec = [
+        ("WS", r"[ \t]+"),
+        ("BOL", r"\n"),
+        ("CHAR", r"L?'"),
+        ("ID", r"[A-Za-z_][A-Za-z0-9_]*"),
+        ("STRING", r'"'),
+        ("LINECOMMENT", r"//"),
+        ("BLOCKCOMMENT", r"/\*"),
+        ("NUMBER", r"0[xX][0-9a-fA-F]*" + int_suffix),
+        ("NUMBER", r"0[bB][01]*" + int_suffix),
+        ("FLOAT", r"0\.[0-9]*" + exponent),
+        ("NUMBER", r"0[0-7]*" + int_suffix),
+        ("FLOAT", r"[0-9]+\.[0-9]*" + exponent),
+        ("FLOAT", r"[0-9]+[eEpP][0-9]*" + exponent),
+        ("NUMBER", r"[0-9]+" + int_suffix),
+        ("PUNCTUATION", r"\.\.\."),
+        ("FLOAT", r"\.[0-9]+" + exponent),
+        (
+            "PUNCTUATION",
+            r"<=|<<=?|<|>=|>>=|>>|>|==|=|!=|!|\|\||\|=|\||&&|&=|&|##|#|"
+            r"\+\+|\+=|\+|--|-=|->|-|\*=|\*|%=|%|\^=|\^|~=|~|/=|/|\.|"
+            r"[;{}()\[\],?:\\]",
+        ),
+        ("FORMFEED", r"\f"),
+    ]
+    token_regex = re.compile(
+        "|".join(
+            "(?P<{}{}>{})".format(name, index, regex)
+            for index, (name, regex) in enumerate(token_spec)
+        )
+    )
+    token_types = {
+        "{}{}".format(name, index): name
+        for index, (name, _) in enumerate(token_spec)
+    }
+    trigraph_regex = re.compile(r"\?\?[=()<>\-!/']")
+    trigraph_map = {
+        "=": "#",
+        "(": "[",
+        ")": "]",
+        "<": "{",
+        ">": "}",
+        "-": "~",
+        "!": "|",
+        "/": "\\",
+        "'": "^",
+    }
+    backslash_regex = re.compile(r"\\[\s\S]?")
+    block_comment_end_regex = re.compile(r"\*/")
+    string_regex = re.compile(
+        r'(?:[^"\\]|\\(?:[\'"?\\abfnrtve]|[0-7]{1,3}|x[0-9a-fA-F]{0,2}|'
+        r'[uU][0-9a-fA-F]{0,4}))*"'
+    )
+    escape_regex = re.compile(
+        r'[\'"?\\abfnrtve]|[0-7]{1,3}|x[0-9a-fA-F]{0,2}|[uU][0-9a-fA-F]{0,4}'
+    )
 
     def __init__(self, coptions):
-        super().__init__()
         self.coptions = coptions
 
     def lex(self, src, source_file):
         """ Read a source and generate a series of tokens """
         self.logger.debug("Lexing %s", source_file.filename)
-
-        characters = create_characters(src, source_file)
-        if self.coptions["trigraphs"]:
-            characters = trigraph_filter(characters)
-        characters = continued_lines_filter(characters)
-        # print('=== lex ')
-        # print(s)
-        # print('=== end lex ')
-
-        # s = '\n'.join(r)
-        return self.tokenize(characters)
+        text = src.read() if hasattr(src, "read") else "".join(src)
+        return self.tokenize(text, source_file, True)
 
     def lex_text(self, txt):
         """ Create tokens from the given text """
-        f = io.StringIO(txt)
         filename = None
         source_file = SourceFile(filename)
-        characters = characters = create_characters(f, source_file)
-        return self.tokenize(characters)
-
-    def tokenize(self, characters):
-        """ Generate tokens from characters """
+        return self.tokenize(txt, source_file, False)
+
+    def tokenize(self, text, source_file, filter_text):
+        """Generate tokens from the given text.
+
+        When filter_text is True, trigraphs and continued lines are
+        replaced before the text is scanned.
+        """
+        if "\t" in text:
+            text = text.expandtabs()
+        self.source_file = source_file
+        self.line_starts = [0]
+        self.line_starts.extend(m.end() for m in re.finditer("\n", text))
+        self.row_index = 0
+        self.offset_maps = []
+
+        if filter_text:
+            if self.coptions["trigraphs"] and "??" in text:
+                text = self.replace(
+                    text,
+                    self.trigraph_regex,
+                    lambda m: self.trigraph_map[m.group(0)[2]],
+                )
+            if "\\" in text:
+                text = self.replace(
+                    text,
+                    self.backslash_regex,
+                    self.replace_backslash,
+                )
+        self.text = text
+        return self.generate_tokens()
+
+    def replace(self, text, regex, replacement):
+        """Replace matches of regex in the text.
+
+        The replacement function gives the new text of a match, or None to
+        keep the match. The offsets of the replaced text are recorded, so
+        that locations refer to the original text.
+        """
+        parts = []
+        starts = [0]
+        deltas = [0]
+        position = 0
+        length = 0
+        for match in regex.finditer(text):
+            new = replacement(match)
+            if new is None:
+                continue
+            start, end = match.span()
+            parts.append(text[position:start])
+            length += start - position
+            starts.append(length)
+            deltas.append(start - length)
+            parts.append(new)
+            length += len(new)
+            position = end
+            starts.append(length)
+            deltas.append(end - length)
+
+        if not parts:
+            return text
+        parts.append(text[position:])
+        self.offset_maps.insert(0, (starts, deltas))
+        return "".join(parts)
+
+    @staticmethod
+    def replace_backslash(match):
+        """ Remove backslashes at the end of a line """
+        if match.group(0) in ("\\", "\\\n", "\\\r"):
+            return ""
+
+    def get_location(self, position):
+        """ Create a source location for the given offset in the text """
+        for starts, deltas in self.offset_maps:
+            position += deltas[bisect.bisect_right(starts, position) - 1]
+
+        # Determine the row, and keep the row of the source file in sync:
+        line_starts = self.line_starts
+        row_index = (
+            bisect.bisect_right(line_starts, position, lo=self.row_index) - 1
+        )
+        if row_index > self.row_index:
+            self.source_file.row += row_index - self.row_index
+            self.row_index = row_index
+        col = position - line_starts[row_index] + 1
+        return SourceLocation(
+            self.source_file.filename, self.source_file.row, col, 1
+        )
+
+    def error(self, message, position):
+        """ Raise an error at the character at the given position """
+        if position < len(self.text):
+            loc = self.get_location(position)
+        else:
+            loc = None
+        raise CompilerError(message, loc)
+
+    def generate_tokens(self):
+        """ Scan the text, and generate tokens """
+        text = self.text
+        match_token = self.token_regex.match
+        token_types = self.token_types
+        position = 0
+        end = len(text)
         space = ""
         first = True
-        token = None
-        for token in super().tokenize(characters, self.lex_c):
-            if token.typ == "BOL":
+        last_position = None
+        while position < end:
+            mo = match_token(text, position)
+            if mo is None:
+                self.error(
+                    "Unexpected character {!r}".format(text[position]),
+                    position,
+                )
+
+            typ = token_types[mo.lastgroup]
+            start = position
+            position = mo.end()
+            if typ == "WS":
+                space += mo.group()
+                last_position = start
+                continue
+            elif typ == "BOL":
                 if first:
                     # Yield an extra start of line
-                    yield CToken("BOL", "", "", first, token.loc)
+                    loc = self.get_location(start)
+                    yield CToken("BOL", "", "", first, loc)
                 first = True
                 space = ""
-            elif token.typ == "WS":
-                space += token.val
-            else:
-                yield CToken(token.typ, token.val, space, first, token.loc)
-                space = ""
-                first = False
+                last_position = start
+                continue
+            elif typ == "FORMFEED":
+                continue
+            elif typ == "LINECOMMENT":
+                if self.coptions["std"] == "c89":
+                    self.error(
+                        "C++ style comments are not allowed in C90", position
+                    )
+                newline = text.find("\n", position)
+                position = end if newline < 0 else newline
+                continue
+            elif typ == "BLOCKCOMMENT":
+                mo = self.block_comment_end_regex.search(text, position)
+                if mo is None:
+                    self.error("Expected a character, but at end of file", end)
+                position = mo.end()
+                continue
+            elif typ == "CHAR":
+                position = self.scan_char(position)
+            elif typ == "STRING":
+                position = self.scan_string(position)
+            elif typ == "PUNCTUATION":
+                typ = mo.group()
+                if typ == "<<=":
+                    typ = "<<"
+
+            val = text[start:position]
+            yield CToken(typ, val, space, first, self.get_location(start))
+            space = ""
+            first = False
+            last_position = start
 
         # Emit last newline:
-        if first and token:
+        if first and last_position is not None:
             # Yield an extra start of line
-            yield CToken("BOL", "", "", first, token.loc)
-
-    def lex_c(self):
-        """ Root parsing function """
-        r = self.next_char()
-        if r is None:
-            pass
-        elif r.char == "L":
-            # Wide char or identifier
-            if self.accept("'"):
-                return self.lex_char
-            else:
-                return self.lex_identifier
-        elif r.char in self.lower_letters + self.upper_letters + "_":
-            return self.lex_identifier
-        elif r.char in self.numbers:
-            self.backup_char(r)
-            return self.lex_number
-        elif r.char in " \t":
-            return self.lex_whitespace
-        elif r.char in "\n":
-            self.emit("BOL")
-            return self.lex_c
-        elif r.char == "\f":
-            # Skip form feed ^L chr(0xc) character
-            self.ignore()
-            return self.lex_c
-        elif r.char == "/":
-            if self.accept("/"):
-                if self.coptions["std"] == "c89":
-                    self.error("C++ style comments are not allowed in C90")
-                return self.lex_linecomment
-            elif self.accept("*"):
-                return self.lex_blockcomment
-            elif self.accept("="):
-                self.emit("/=")
-                return self.lex_c
-            else:
-                self.emit("/")
-                return self.lex_c
-        elif r.char == '"':
-            return self.lex_string
-        elif r.char == "'":
-            return self.lex_char
-        elif r.char == "<":
-            if self.accept("="):
-                self.emit("<=")
-            elif self.accept("<"):
-                if self.accept("="):
-                    self.emit("<<")
-                else:
-                    self.emit("<<")
-            else:
-                self.emit("<")
-            return self.lex_c
-        elif r.char == ">":
-            if self.accept("="):
-                self.emit(">=")
-            elif self.accept(">"):
-                if self.accept("="):
-                    self.emit(">>=")
-                else:
-                    self.emit(">>")
-            else:
-                self.emit(">")
-            return self.lex_c
-        elif r.char == "=":
-            if self.accept("="):
-                self.emit("==")
-            else:
-                self.emit("=")
-            return self.lex_c
-        elif r.char == "!":
-            if self.accept("="):
-                self.emit("!=")
-            else:
-                self.emit("!")
-            return self.lex_c
-        elif r.char == "|":
-            if self.accept("|"):
-                self.emit("||")
-            elif self.accept("="):
-                self.emit("|=")
-            else:
-                self.emit("|")
-            return self.lex_c
-        elif r.char == "&":
-            if self.accept("&"):
-                self.emit("&&")
-            elif self.accept("="):
-                self.emit("&=")
-            else:
-                self.emit("&")
-            return self.lex_c
-        elif r.char == "#":
-            if self.accept("#"):
-                self.emit("##")
-            else:
-                self.emit("#")
-            return self.lex_c
-        elif r.char == "+":
-            if self.accept("+"):
-                self.emit("++")
-            elif self.accept("="):
-                self.emit("+=")
-            else:
-                self.emit("+")
-            return self.lex_c
-        elif r.char == "-":
-            if self.accept("-"):
-                self.emit("--")
-            elif self.accept("="):
-                self.emit("-=")
-            elif self.accept(">"):
-                self.emit("->")
-            else:
-                self.emit("-")
-            return self.lex_c
-        elif r.char == "*":
-            if self.accept("="):
-                self.emit("*=")
-            else:
-                self.emit("*")
-            return self.lex_c
-        elif r.char == "%":
-            if self.accept("="):
-                self.emit("%=")
-            else:
-                self.emit("%")
-            return self.lex_c
-        elif r.char == "^":
-            if self.accept("="):
-                self.emit("^=")
-            else:
-                self.emit("^")
-            return self.lex_c
-        elif r.char == "~":
-            if self.accept("="):
-                self.emit("~=")
-            else:
-                self.emit("~")
-            return self.lex_c
-        elif r.char == ".":
-            if self.accept_sequence([".", "."]):
-                self.emit("...")
-            elif self.accept(self.numbers):
-                # We got .[0-9]
-                return self.lex_float
-            else:
-                self.emit(".")
-            return self.lex_c
-        elif r.char in ";{}()[],?:":
-            self.emit(r.char)
-            return self.lex_c
-        elif r.char == "\\":
-            self.emit(r.char)
-            return self.lex_c
-        else:  # pragma: no cover
-            raise NotImplementedError(r)
-
-    def lex_identifier(self):
-        id_chars = self.lower_letters + self.upper_letters + self.numbers + "_"
-        self.accept_run(id_chars)
-        self.emit("ID")
-        return self.lex_c
-
-    def lex_number(self):
-        """ Lex a single numeric literal. """
-        if self.accept("0"):
-            # Octal, binary or hex!
-            if self.accept("xX"):
-                number_chars = self.hex_numbers
-                base = 16
-            elif self.accept("bB"):
-                number_chars = self.binary_numbers
-                base = 2
-            elif self.accept("."):
-                return self.lex_float()
-            else:
-                number_chars = self.octal_numbers
-                base = 8
+            yield CToken(
+                "BOL", "", "", first, self.get_location(last_position)
+            )
+
+    def scan_char(self, position):
+        """ Scan a character constant, and return the end of it """
+        text = self.text
+        if position >= len(text):
+            self.error("Expected a character, but at end of file", position)
+        elif text[position] == "\\":
+            position = self.scan_escape_character(position + 1)
         else:
-            number_chars = self.numbers
-            base = 10
-
-        # Accept a series of number characters:
-        self.accept_run(number_chars)
-        if base == 10 and self.accept("."):
-            # For example 12.3
-            return self.lex_float()
-        elif base == 10 and self.accept("eEpP"):
-            # For example 12e7
-            return self.lex_float()
+            position += 1
+
+        if text.startswith("'", position):
+            return position + 1
         else:
-            # Accept some integer suffixes, such as 'L', or 'ull'
-            long_suffixes = 0
-            unsigned_suffixes = 0
-            while long_suffixes < 2 or unsigned_suffixes < 1:
-                if long_suffixes < 2 and self.accept("lL"):
-                    long_suffixes += 1
-                elif unsigned_suffixes < 1 and self.accept("uU"):
-                    unsigned_suffixes += 1
-                else:
-                    break
-
-            self.emit("NUMBER")
-            return self.lex_c
-
-    def lex_float(self):
-        """ Lex floating point number from decimal dot onwards. """
-        self.accept_run(self.numbers)
-        if self.accept("eEpP"):
-            self.accept("+-")
-            self.accept_run(self.numbers)
-
-        self.emit("FLOAT")
-        return self.lex_c
-
-    def lex_whitespace(self):
-        self.accept_run(" \t")
-        self.emit("WS")
-        return self.lex_c
-
-    def lex_linecomment(self):
-        c = self.next_char()
-        while c and c.char != "\n":
-            c = self.next_char()
-        self.backup_char(c)
-        self.ignore()
-        return self.lex_c
-
-    def lex_blockcomment(self):
-        while True:
-            if self.accept("*"):
-                if self.accept("/"):
-                    self.ignore()
-                    # self.emit('WS')
-                    break
+            self.error("Expected '", position)
+
+    def scan_string(self, position):
+        """ Scan a string literal, and return the end of it """
+        mo = self.string_regex.match(self.text, position)
+        if mo:
+            return mo.end()
+
+        # Determine the cause of the error:
+        text = self.text
+        while position < len(text) and text[position] != '"':
+            if text[position] == "\\":
+                position = self.scan_escape_character(position + 1)
             else:
-                self.next_char(eof=False)
-        return self.lex_c
-
-    def lex_string(self):
-        """ Scan for a complete string """
-        c = self.next_char(eof=False)
-        while c.char != '"':
-            if c.char == "\\":
-                self._handle_escape_character()
-            c = self.next_char(eof=False)
-        self.emit("STRING")
-        return self.lex_c
-
-    def lex_char(self):
-        """ Scan for a complete character constant """
-        if self.accept("\\"):
-            self._handle_escape_character()
-        else:
-            # Normal char:
-            self.next_char(eof=False)
-
-        self.expect("'")
-
-        self.emit("CHAR")
-        return self.lex_c
-
-    def _handle_escape_character(self):
-        # Escape char!
-        if self.accept("'\"?\\abfnrtve"):
-            pass
-        elif self.accept(self.octal_numbers):
-            self.accept(self.octal_numbers)
-            self.accept(self.octal_numbers)
-        elif self.accept("x"):
-            self.accept(self.hex_numbers)
-            self.accept(self.hex_numbers)
-        elif self.accept("u"):
-            self.accept(self.hex_numbers)
-            self.accept(self.hex_numbers)
-            self.accept(self.hex_numbers)
-            self.accept(self.hex_numbers)
-        elif self.accept("U"):
-            self.accept(self.hex_numbers)
-            self.accept(self.hex_numbers)
-            self.accept(self.hex_numbers)
-            self.accept(self.hex_numbers)
-        else:
-            self.error("Unexpected escape character")
+                position += 1
+        self.error("Expected a character, but at end of file", position)
+
+    def scan_escape_character(self, position):
+        mo = self.escape_regex.match(self.text, position)
+        if mo is None:
+            self.error("Unexpected escape character", position)
+        return mo.end()
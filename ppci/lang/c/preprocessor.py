@@ -17,9 +17,11 @@ Sourcecode of inspiration:
 import os
 import logging
 import operator
+import pickle
 import time
 
 from ...common import CompilerError
+from ...utils.cache import make_key
 from .lexer import CLexer, CToken, lex_text, SourceFile
 from .utils import cnum, charval, replace_escape_codes, LineInfo
 from .macro import Macro, FunctionMacro
@@ -31,13 +33,22 @@ class CPreProcessor:
 
     logger = logging.getLogger("preprocessor")
 
-    def __init__(self, coptions):
+    def __init__(self, coptions, token_cache=None, include_cache=None):
         self.coptions = coptions
         self.verbose = coptions["verbose"]
         self.macros = {}  # A mapping of macros
         self.files = []  # Stack of included files.
         self.counter = 0  # For the __COUNTER__ macro
         self._int_type = types.BasicType(types.BasicType.INT)
+        if token_cache is None:
+            token_cache = default_token_cache
+        self.token_cache = token_cache
+        if include_cache is None:
+            include_cache = IncludeCache()
+        self.include_cache = include_cache
+        self.dependencies = []  # All files included.
+        self.include_guards = {}  # Map of filename to guard macro name.
+        self.once_files = set()  # Files containing '#pragma once'
 
         self.predefine_builtin_macros()
 
@@ -168,10 +179,14 @@ class CPreProcessor:
 
     def process_file(self, f, filename=None):
         """ Process the given open file into tokens. """
-        self.logger.debug("Processing %s", filename)
         source_file = SourceFile(filename)
         clexer = CLexer(self.coptions)
         tokens = clexer.lex(f, source_file)
+        yield from self.process_source(source_file, tokens)
+
+    def process_source(self, source_file, tokens):
+        """ Process the lexed tokens of the given source file. """
+        self.logger.debug("Processing %s", source_file.filename)
         ex = FileExpander(source_file, tokens)
         self.files.append(ex)
         yield LineInfo(1, source_file.filename)
@@ -202,13 +217,39 @@ class CPreProcessor:
             - loc: the location where this include is included.
             - use_current_dir: If true, look in the directory of
                 the current file.
+            - include_next: If true, continue searching after the
+                directory of the current file.
         """
-        self.logger.debug("Locating %s", filename)
+        current_filename = self.files[-1].source_file.filename
+        if use_current_dir:
+            # In the case of: #include "foo.h"
+            current_dir = os.path.dirname(current_filename)
+        else:
+            current_dir = None
+        origin = current_filename if include_next else None
+        key = (
+            filename,
+            current_dir,
+            origin,
+            tuple(self.coptions.include_directories),
+        )
+        resolved = self.include_cache.resolved
+        if key not in resolved:
+            resolved[key] = self._search_include(
+                filename, loc, current_dir, origin
+            )
+            self.logger.debug("Located %s at %s", filename, resolved[key])
+        return resolved[key]
+
+    def _search_include(self, filename, loc, current_dir, origin):
+        """Search the include directories for the given file.
 
+        When origin is given, the search continues after the directory
+        in which origin is found, as required by #include_next.
+        """
         # Maybe it is an absolute path:
         if os.path.isabs(filename):
             if os.path.exists(filename):
-                self.logger.debug("Absolute path, not searching include paths")
                 return filename
             else:
                 self.error(
@@ -217,20 +258,16 @@ class CPreProcessor:
 
         # Determine search paths:
         search_directories = []
-        if use_current_dir:
-            # In the case of: #include "foo.h"
-            current_dir = os.path.dirname(self.files[-1].source_file.filename)
+        if current_dir is not None:
             search_directories.append(current_dir)
         search_directories.extend(self.coptions.include_directories)
 
-        # self.logger.debug((search_directories)
+        include_next = origin is not None
         for path in search_directories:
-            self.logger.debug("Searching in %s", path)
-            full_path = os.path.join(path, filename)
-            if os.path.exists(full_path):
+            if self.include_cache.exists(path, filename):
+                full_path = os.path.join(path, filename)
                 if include_next:
-                    current_filename = self.files[-1].source_file.filename
-                    if full_path == current_filename:
+                    if full_path == origin:
                         include_next = False
                 else:
                     return full_path
@@ -245,12 +282,33 @@ class CPreProcessor:
         full_path = self.locate_include(
             filename, loc, use_current_dir, include_next
         )
-        self.logger.debug("Including %s", full_path)
+        if full_path not in self.dependencies:
+            self.dependencies.append(full_path)
         source_file = SourceFile(full_path)
-        self.files[-1].dependencies.append(source_file)
-        with open(full_path, "r") as f:
-            for token in self.process_file(f, full_path):
-                yield token
+
+        # Multiple include optimization:
+        path = os.path.normpath(full_path)
+        if path in self.once_files:
+            self.logger.debug("Skipping %s, due to #pragma once", full_path)
+            return
+        guard = self.include_guards.get(path)
+        if guard is not None and self.is_defined(guard):
+            self.logger.debug("Skipping %s, guarded by %s", full_path, guard)
+            return
+
+        self.logger.debug("Including %s", full_path)
+        entry = self.token_cache.get_tokens(full_path, self.coptions)
+        if entry is None:
+            # Files with a #line directive are lexed on the fly, since
+            # the directive changes the location of the following tokens.
+            with open(full_path, "r") as f:
+                yield from self.process_file(f, full_path)
+        else:
+            tokens, guard = entry
+            if guard is not None:
+                self.include_guards[path] = guard
+            tokens = (token.copy() for token in tokens)
+            yield from self.process_source(source_file, tokens)
 
     # Token consume / peeking:
     @property
@@ -946,7 +1004,12 @@ class CPreProcessor:
         """ Process `#pragma` directive. """
         # Pragma's must be handled, or ignored.
         message = self.tokens_to_string(self.eat_line())
-        self.logger.warning("Ignoring pragma: %s", message)
+        if message == "once":
+            filename = self.files[-1].filename
+            if filename is not None:
+                self.once_files.add(os.path.normpath(filename))
+        else:
+            self.logger.warning("Ignoring pragma: %s", message)
         new_line_token = CToken("WS", "", "", True, directive_token.loc)
         yield new_line_token
 
@@ -1129,6 +1192,171 @@ class CPreProcessor:
         return value
 
 
+class TokenCache:
+    """Cache of lexed tokens of header files.
+
+    Entries are keyed on filename, modification time and size of the
+    file, so that a header included by several translation units
+    compiled in the same process is only lexed once. Optionally,
+    entries are also stored in a :class:`ppci.utils.cache.DiskCache`.
+
+    Next to the tokens, the macro guarding the file against multiple
+    inclusion is stored.
+    """
+
+    logger = logging.getLogger("preprocessor")
+
+    def __init__(self, disk_cache=None):
+        self.disk_cache = disk_cache
+        self.entries = {}
+
+    def clear(self):
+        """ Remove all in memory entries """
+        self.entries.clear()
+
+    def get_tokens(self, filename, coptions):
+        """Get the tokens and include guard of the given file.
+
+        Returns None if the tokens cannot be cached.
+        """
+        st = os.stat(filename)
+        stamp = (
+            st.st_mtime_ns,
+            st.st_size,
+            coptions["trigraphs"],
+            coptions["std"],
+        )
+        if filename in self.entries:
+            entry_stamp, entry = self.entries[filename]
+            if entry_stamp == stamp:
+                return entry
+
+        if self.disk_cache is not None:
+            key = make_key("c-tokens", os.path.abspath(filename), stamp)
+            data = self.disk_cache.get(key)
+            if data is None:
+                entry = self.lex_file(filename, coptions)
+                self.disk_cache.put(key, pickle.dumps(entry))
+            else:
+                entry = pickle.loads(data)
+        else:
+            entry = self.lex_file(filename, coptions)
+
+        self.entries[filename] = (stamp, entry)
+        return entry
+
+    def lex_file(self, filename, coptions):
+        """ Lex a file and determine its include guard. """
+        self.logger.debug("Lexing %s for the token cache", filename)
+        clexer = CLexer(coptions)
+        with open(filename, "r") as f:
+            tokens = list(clexer.lex(f, SourceFile(filename)))
+        lines = split_lines(tokens)
+        if any(directive_name(line) == "line" for line in lines):
+            return None
+        return tokens, find_include_guard(lines)
+
+
+default_token_cache = TokenCache()
+
+
+class IncludeCache:
+    """Cache of include file lookups during a build session.
+
+    The contents of each search directory are listed once, instead of
+    testing for the existence of a header in every search directory on
+    each include. Also, the outcome of each include lookup is memoized.
+
+    The cache assumes that no headers are added or removed during
+    its lifetime. Share a single instance between the preprocessors
+    of a build session to reuse lookups among translation units.
+    """
+
+    def __init__(self):
+        self.listings = {}
+        self.resolved = {}
+
+    def clear(self):
+        """ Forget all directory listings and resolved includes """
+        self.listings.clear()
+        self.resolved.clear()
+
+    def exists(self, directory, filename):
+        """ Test if the file exists in the given directory """
+        folder, name = os.path.split(os.path.join(directory, filename))
+        if folder not in self.listings:
+            try:
+                names = os.listdir(folder or ".")
+            except OSError:
+                names = []
+            self.listings[folder] = frozenset(map(os.path.normcase, names))
+        return os.path.normcase(name) in self.listings[folder]
+
+
+def split_lines(tokens):
+    """ Split lexed tokens into lines, leaving out empty lines. """
+    lines = []
+    for token in tokens:
+        if token.typ == "BOL":
+            continue
+        if token.first or not lines:
+            lines.append([token])
+        else:
+            lines[-1].append(token)
+    return lines
+
+
+def directive_name(line):
+    """ Get the name of the directive on the given line, if any. """
+    if len(line) > 1 and line[0].typ == "#" and line[1].typ == "ID":
+        return line[1].val
+    return None
+
+
+def find_include_guard(lines):
+    """Determine the macro guarding a file against multiple inclusion.
+
+    This is the case when the whole file is contained in a
+    ``#ifndef X`` or ``#if !defined(X)`` block. Returns the name of the
+    macro, or None if the file has no such guard.
+    """
+    if len(lines) < 2:
+        return None
+
+    # Check the opening directive:
+    values = [t.val for t in lines[0]]
+    if values[:2] == ["#", "ifndef"] and len(values) == 3:
+        guard = lines[0][2]
+    elif values[:4] == ["#", "if", "!", "defined"] and len(values) == 5:
+        guard = lines[0][4]
+    elif values[:5] == ["#", "if", "!", "defined", "("] and (
+        len(values) == 7 and values[6] == ")"
+    ):
+        guard = lines[0][5]
+    else:
+        return None
+
+    if guard.typ != "ID":
+        return None
+
+    # Check that the final #endif belongs to the opening directive:
+    if [t.val for t in lines[-1]] != ["#", "endif"]:
+        return None
+
+    depth = 0
+    for line in lines[:-1]:
+        directive = directive_name(line)
+        if directive in ["if", "ifdef", "ifndef"]:
+            depth += 1
+        elif directive == "endif":
+            depth -= 1
+            if depth == 0:
+                return None
+        elif directive in ["elif", "else"] and depth == 1:
+            return None
+    return guard.val
+
+
 class FileExpander:
     """Per source or header file an expander class is created
 
@@ -1141,7 +1369,7 @@ class FileExpander:
 
     def __init__(self, source_file, tokens):
         self.source_file = source_file
-        self.dependencies = []  # List of dependent files.
+        self.filename = source_file.filename  # Unaffected by #line
         self.if_stack = []  # If-def stack
         self.token_buffer = []  # Token undo stack
         self.tokens = tokens  # Base context iterator.
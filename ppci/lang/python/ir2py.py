@@ -4,6 +4,7 @@ import math
 import contextlib
 import io
 import logging
+import struct
 import time
 from ... import ir
 from ...graph import relooper
@@ -14,13 +15,29 @@ def literal_label(lit):
     return "{}_{}".format(lit.function.name, lit.name)
 
 
-def ir_to_python(ir_modules, f, reporter=None):
-    """ Convert ir-code to python code """
+def ir_to_python(
+    ir_modules, f, reporter=None, bounds_check=True, memory_model="flat"
+):
+    """Convert ir-code to python code
+
+    Args:
+        ir_modules: the ir-modules to convert.
+        f: the file to write the python code to.
+        reporter: optional reporter.
+        bounds_check: when set, the generated code checks that memory
+            accesses are not below address zero. Accesses beyond the end
+            of memory always raise an error.
+        memory_model: 'flat' for a single memory holding the stack and
+            the heap, or 'split' for separate stack and heap memories,
+            which is slower, but useful for comparison.
+    """
     if reporter:
         f2 = f
         f = io.StringIO()
 
-    generator = IrToPythonCompiler(f, reporter)
+    generator = IrToPythonCompiler(
+        f, reporter, bounds_check=bounds_check, memory_model=memory_model
+    )
     generator.header()
     for ir_module in ir_modules:
         if not isinstance(ir_module, ir.Module):
@@ -38,9 +55,36 @@ class IrToPythonCompiler:
 
     logger = logging.getLogger("ir2py")
 
-    def __init__(self, output_file, reporter):
+    # Loads and stores are done with precompiled structs:
+    memory_types = [
+        (ir.f64, "d"),
+        (ir.f32, "f"),
+        (ir.i64, "q"),
+        (ir.u64, "Q"),
+        (ir.i32, "i"),
+        (ir.u32, "I"),
+        (ir.ptr, "i"),
+        (ir.i16, "h"),
+        (ir.u16, "H"),
+        (ir.i8, "b"),
+        (ir.u8, "B"),
+    ]
+
+    # Size of the stack, which is located below the heap:
+    max_stack_size = 0x100000
+
+    # Start of the heap in the split memory model:
+    split_heap_start = 0x10000000
+
+    def __init__(
+        self, output_file, reporter, bounds_check=True, memory_model="flat"
+    ):
+        if memory_model not in ("flat", "split"):
+            raise ValueError("Invalid memory model {}".format(memory_model))
         self.output_file = output_file
         self.reporter = reporter
+        self.bounds_check = bounds_check
+        self.memory_model = memory_model
         self.stack_size = 0
         self.func_ptr_map = {}
         self._level = 0
@@ -74,17 +118,31 @@ class IrToPythonCompiler:
         self.emit("import struct")
         self.emit("import math")
         self.emit("")
-        self.emit("_irpy_heap = bytearray()")
-        self.emit("_irpy_stack = bytearray()")
-        self.emit("HEAP_START = 0x10000000")
+        if self.memory_model == "split":
+            # Separate stack and heap, addresses from HEAP_START on are
+            # in the heap:
+            self.emit("_irpy_heap = bytearray()")
+            self.emit("_irpy_stack = bytearray()")
+            self.emit("HEAP_START = {}".format(hex(self.split_heap_start)))
+        else:
+            # A single flat memory, with the stack at the bottom, followed
+            # by the heap:
+            self.emit("HEAP_START = {}".format(hex(self.max_stack_size)))
+            self.emit("_irpy_memory = bytearray(HEAP_START)")
+            self.emit("_irpy_heap = _irpy_memory")
+            self.emit("_irpy_sp = 0")
         self.emit("_irpy_func_pointers = list()")
         self.emit("_irpy_externals = {}")
         self.emit("")
 
         self.generate_builtins()
-        self.generate_memory_builtins()
+        if self.memory_model == "split":
+            self.generate_split_memory_builtins()
+        else:
+            self.generate_memory_builtins()
 
-    def generate_memory_builtins(self):
+    def generate_split_memory_builtins(self):
+        """ Generate memory access helpers for separate stack and heap """
         self.emit("def read_mem(address, size):")
         with self.indented():
             self.emit("mem, address = _irpy_get_memory(address)")
@@ -112,37 +170,80 @@ class IrToPythonCompiler:
             self.emit("return len(_irpy_heap) + HEAP_START")
         self.emit("")
 
-        # Generate load functions:
-        foo = [
-            (ir.f64, "d", 8),
-            (ir.f32, "f", 4),
-            (ir.i64, "q", 8),
-            (ir.u64, "Q", 8),
-            (ir.i32, "i", 4),
-            (ir.u32, "I", 4),
-            (ir.ptr, "i", 4),
-            (ir.i16, "h", 2),
-            (ir.u16, "H", 2),
-            (ir.i8, "b", 1),
-            (ir.u8, "B", 1),
-        ]
-
-        for ty, fmt, size in foo:
-            # Generate load helpers:
+        for ty, fmt in self.memory_types:
             self.emit("def load_{}(p):".format(ty.name))
             self.print(
                 1,
                 'return struct.unpack("{0}", read_mem(p, {1}))[0]'.format(
-                    fmt, size
+                    fmt, struct.calcsize(fmt)
                 ),
             )
             self.emit("")
 
-            # Generate store helpers:
             self.emit("def store_{}(v, p):".format(ty.name))
             self.print(1, 'write_mem(p, struct.pack("{0}", v))'.format(fmt))
             self.emit("")
 
+    def generate_memory_builtins(self):
+        """ Generate memory access helpers for the flat memory """
+        self.emit("def read_mem(address, size):")
+        with self.indented():
+            self.emit_bounds_check("address", "size")
+            self.emit("return _irpy_memory[address:address+size]")
+        self.emit("")
+
+        self.emit("def write_mem(address, data):")
+        with self.indented():
+            self.emit("size = len(data)")
+            self.emit_bounds_check("address", "size")
+            self.emit("_irpy_memory[address:address+size] = data")
+        self.emit("")
+
+        self.emit("def _irpy_heap_top():")
+        with self.indented():
+            self.emit("return len(_irpy_memory)")
+        self.emit("")
+
+        for ty, fmt in self.memory_types:
+            self.emit(
+                '_irpy_load_{} = struct.Struct("{}").unpack_from'.format(
+                    ty.name, fmt
+                )
+            )
+            self.emit(
+                '_irpy_store_{} = struct.Struct("{}").pack_into'.format(
+                    ty.name, fmt
+                )
+            )
+        self.emit("")
+
+        # Load and store helpers, for use outside of the generated code:
+        for ty, _ in self.memory_types:
+            self.emit("def load_{}(p):".format(ty.name))
+            self.print(
+                1, "return _irpy_load_{}(_irpy_memory, p)[0]".format(ty.name)
+            )
+            self.emit("")
+
+            self.emit("def store_{}(v, p):".format(ty.name))
+            self.print(1, "_irpy_store_{}(_irpy_memory, p, v)".format(ty.name))
+            self.emit("")
+
+    def emit_bounds_check(self, address, size=None):
+        """Emit a check on an address, if bounds checking is enabled.
+
+        Struct unpack_from and pack_into check the upper bound, but
+        silently wrap negative addresses.
+        """
+        if self.bounds_check:
+            if size is None:
+                self.emit("assert {0} >= 0, hex({0})".format(address))
+            else:
+                self.emit(
+                    "assert 0 <= {0} and {0} + {1} <= len(_irpy_memory),"
+                    " hex({0})".format(address, size)
+                )
+
     def generate_builtins(self):
         # Wrap type helper:
         self.emit("def _irpy_correct(value, bits, signed):")
@@ -191,16 +292,35 @@ class IrToPythonCompiler:
             self.emit("return x >> amount")
         self.emit("")
 
+        if self.memory_model == "split":
+            self.emit("def _irpy_alloca(amount):")
+            with self.indented():
+                self.emit("ptr = len(_irpy_stack)")
+                self.emit("_irpy_stack.extend(bytes(amount))")
+                self.emit("return (ptr, amount)")
+            self.emit("")
+
+            self.emit("def _irpy_free(amount):")
+            self.print(1, "for _ in range(amount):")
+            self.print(2, "_irpy_stack.pop()")
+            self.emit("")
+            return
+
         self.emit("def _irpy_alloca(amount):")
         with self.indented():
-            self.emit("ptr = len(_irpy_stack)")
-            self.emit("_irpy_stack.extend(bytes(amount))")
+            self.emit("global _irpy_sp")
+            self.emit("ptr = _irpy_sp")
+            self.emit("_irpy_sp += amount")
+            self.emit("if _irpy_sp > HEAP_START:")
+            self.print(self._level + 1, 'raise MemoryError("Stack overflow")')
+            self.emit("_irpy_memory[ptr:_irpy_sp] = bytes(amount)")
             self.emit("return (ptr, amount)")
         self.emit("")
 
         self.emit("def _irpy_free(amount):")
-        self.print(1, "for _ in range(amount):")
-        self.print(2, "_irpy_stack.pop()")
+        with self.indented():
+            self.emit("global _irpy_sp")
+            self.emit("_irpy_sp -= amount")
         self.emit("")
 
     def generate(self, ir_mod):
@@ -469,10 +589,17 @@ class IrToPythonCompiler:
                     ins.name, address, ins.ty.size
                 )
             )
-        else:
+        elif self.memory_model == "split":
             self.emit(
                 "{0} = load_{1}({2})".format(ins.name, ins.ty.name, address)
             )
+        else:
+            self.emit_bounds_check(address)
+            self.emit(
+                "{0}, = _irpy_load_{1}(_irpy_memory, {2})".format(
+                    ins.name, ins.ty.name, address
+                )
+            )
 
     def gen_store(self, ins):
         if isinstance(ins.value.ty, ir.BlobDataTyp):
@@ -481,13 +608,21 @@ class IrToPythonCompiler:
                     ins.address.name, ins.value.ty.size, ins.value.name
                 )
             )
-        else:
+        elif self.memory_model == "split":
             v = self.fetch_value(ins.value)
             self.emit(
                 "store_{0}({2}, {1})".format(
                     ins.value.ty.name, ins.address.name, v
                 )
             )
+        else:
+            v = self.fetch_value(ins.value)
+            self.emit_bounds_check(ins.address.name)
+            self.emit(
+                "_irpy_store_{0}(_irpy_memory, {1}, {2})".format(
+                    ins.value.ty.name, ins.address.name, v
+                )
+            )
 
     def gen_const(self, ins):
         if math.isinf(ins.value):
@@ -19,7 +19,9 @@ def load_py(f, imports=None, reporter=None):
         reporter.dump_ir(ir_module)
 
     arch = api.get_current_arch()
-    obj = api.ir_to_object([ir_module], arch, debug=True, reporter=reporter)
+    obj = api.ir_to_object(
+        [ir_module], arch, debug=True, reporter=reporter, regalloc="linear"
+    )
     m2 = load_obj(obj, imports=imports)
     return m2
 
@@ -1,9 +1,15 @@
 from .clean import CleanPass
 from .mem2reg import Mem2RegPromotor
+from .sccp import SCCPPass
 from .cse import CommonSubexpressionEliminationPass
 from .constantfolding import ConstantFolder
+from .gvn import GlobalValueNumberingPass
+from .inline import InliningPass
+from .licm import LoopInvariantCodeMotionPass
 from .load_after_store import LoadAfterStorePass
+from .passmanager import PassManager
 from .transform import RemoveAddZeroPass
+from .unroll import LoopUnrollPass
 from .transform import DeleteUnusedInstructionsPass
 from .transform import ModulePass, FunctionPass, BlockPass, InstructionPass
 
@@ -17,7 +23,13 @@ __all__ = [
     "CommonSubexpressionEliminationPass",
     "ConstantFolder",
     "DeleteUnusedInstructionsPass",
+    "GlobalValueNumberingPass",
+    "InliningPass",
     "LoadAfterStorePass",
+    "LoopInvariantCodeMotionPass",
+    "LoopUnrollPass",
     "Mem2RegPromotor",
+    "PassManager",
     "RemoveAddZeroPass",
+    "SCCPPass",
 ]
@@ -49,6 +49,14 @@ class CleanPass(FunctionPass):
             if block in predecessors:
                 continue
 
+            # Do not remove if a phi would get two values from a block:
+            if any(
+                successor.phis
+                and any(p in successor.predecessors for p in predecessors)
+                for successor in successors
+            ):
+                continue
+
             # Update successor incoming blocks:
             for successor in successors:
                 successor.replace_incoming(block, predecessors)
@@ -0,0 +1,192 @@
+""" Global value numbering.
+
+Redundant computations are removed by walking the dominator tree, and
+keeping a table of the available values in scope. A value computed in a
+block is available in all blocks dominated by this block.
+
+Loads are numbered together with the state of memory. The memory state
+changes on each instruction which might write memory, such as a store or
+a call. A block continues with the memory state of its immediate
+dominator, when no path from the dominator to the block writes memory.
+"""
+
+from .transform import FunctionPass
+from ..graph.domtree import CfgInfo
+from .. import ir
+
+
+class GlobalValueNumberingPass(FunctionPass):
+    """Replace computations by an earlier computation of the same value.
+
+    This is a dominator scoped version of common subexpression elimination.
+    Constants, binary and unary operations, casts and loads are replaced
+    by the same value computed in a dominating block.
+
+    .. code::
+
+        block1:
+          i32 a = x + y
+          i32 b = load p
+          cjmp a < b ? block2 : block3
+        block2:
+          i32 c = y + x
+          i32 d = load p
+
+    transforms into:
+
+    .. code::
+
+        block1:
+          i32 a = x + y
+          i32 b = load p
+          cjmp a < b ? block2 : block3
+        block2:
+          (c is replaced by a, and d by b)
+    """
+
+    commutative = ("+", "*", "&", "|", "^")
+
+    def on_function(self, function):
+        self.cfg_info = CfgInfo(function)
+        self.writes = {}
+        self.version = 0
+        self.table = {}
+        count = 0
+
+        end_versions = {}
+        worklist = [(None, self.cfg_info.cfg.root_tree)]
+        while worklist:
+            item, tree_node = worklist.pop()
+            if tree_node is None:
+                # Leave the scope of a block, item holds its keys:
+                for key in item:
+                    del self.table[key]
+                continue
+
+            if not self.cfg_info.has_block(tree_node.node):
+                continue
+            block = self.cfg_info.get_block(tree_node.node)
+
+            # Item is the immediate dominator of the block:
+            if item is not None and self.is_memory_clean(item, block):
+                version = end_versions[item]
+            else:
+                version = self.new_version()
+
+            keys, version, replaced = self.on_block(block, version)
+            end_versions[block] = version
+            count += replaced
+
+            worklist.append((keys, None))
+            for child in tree_node.children:
+                worklist.append((block, child))
+
+        if count > 0:
+            self.logger.debug(
+                "Replaced %s instructions in %s", count, function.name
+            )
+        self.cfg_info = None
+        self.writes = None
+        self.table = None
+
+    def on_block(self, block, version):
+        """Number the values in the block.
+
+        Returns the keys added to the table, the memory version at the end
+        of the block and the amount of replaced instructions.
+        """
+        keys = []
+        replaced = 0
+        for instruction in list(block):
+            if self.writes_memory(instruction):
+                version = self.new_version()
+                if isinstance(instruction, ir.Store):
+                    if not instruction.volatile:
+                        # Loads after the store get the stored value:
+                        value = instruction.value
+                        key = ("load", instruction.address, value.ty, version)
+                        self.table[key] = value
+                        keys.append(key)
+                continue
+
+            key = self.make_key(instruction, version)
+            if key is None:
+                continue
+
+            if key in self.table:
+                instruction.replace_by(self.table[key])
+                instruction.remove_from_block()
+                replaced += 1
+            else:
+                self.table[key] = instruction
+                keys.append(key)
+        return keys, version, replaced
+
+    def make_key(self, instruction, version):
+        """ Create a key for the value calculated by the instruction """
+        if isinstance(instruction, ir.Const):
+            # Use repr, so that 0.0 and -0.0 are not considered the same:
+            return ("const", repr(instruction.value), instruction.ty)
+        elif isinstance(instruction, ir.Binop):
+            a, b = instruction.a, instruction.b
+            if instruction.operation in self.commutative:
+                operands = frozenset((a, b))
+            else:
+                operands = (a, b)
+            return ("binop", instruction.operation, operands, instruction.ty)
+        elif isinstance(instruction, ir.Unop):
+            return ("unop", instruction.operation, instruction.a)
+        elif isinstance(instruction, ir.Cast):
+            return ("cast", instruction.src, instruction.ty)
+        elif isinstance(instruction, ir.AddressOf):
+            return ("addressof", instruction.src)
+        elif isinstance(instruction, ir.Load):
+            return ("load", instruction.address, instruction.ty, version)
+
+    def new_version(self):
+        self.version += 1
+        return self.version
+
+    @staticmethod
+    def writes_memory(instruction):
+        """ Test if the instruction might change memory """
+        if isinstance(instruction, ir.Load):
+            # Volatile loads must not be reordered with other loads:
+            return instruction.volatile
+        return isinstance(
+            instruction,
+            (
+                ir.Store,
+                ir.FunctionCall,
+                ir.ProcedureCall,
+                ir.CopyBlob,
+                ir.InlineAsm,
+            ),
+        )
+
+    def block_writes_memory(self, block):
+        if block not in self.writes:
+            self.writes[block] = any(map(self.writes_memory, block))
+        return self.writes[block]
+
+    def is_memory_clean(self, dominator, block):
+        """Check if memory is unchanged between dominator and block.
+
+        This is the case when all blocks on the paths from the end of the
+        dominator to the start of block do not write memory.
+        """
+        predecessors = block.predecessors
+        if len(predecessors) == 1 and predecessors[0] is dominator:
+            return True
+
+        visited = {dominator}
+        worklist = list(predecessors)
+        while worklist:
+            predecessor = worklist.pop()
+            if predecessor in visited:
+                continue
+            visited.add(predecessor)
+            if self.block_writes_memory(predecessor):
+                return False
+            worklist.extend(predecessor.predecessors)
+        return True
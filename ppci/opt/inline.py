@@ -1,12 +1,204 @@
+""" Function inlining.
+
+A call is replaced by a copy of the body of the called function. This
+removes the overhead of the call, and allows further optimization of the
+copied code with the arguments of the call.
+"""
+
+from .transform import ModulePass
+from ..graph.callgraph import mod_to_call_graph
+from ..irutils import clone_instruction, split_block
 from .. import ir
 
 
-def inline_function(call: ir.ProcedureCall, function: ir.SubRoutine):
+class InliningPass(ModulePass):
+    """Inline calls to small functions.
+
+    The functions are visited bottom-up in the call graph, so that calls
+    in a function are inlined before the function itself is inlined.
+    Recursive calls are never inlined.
+
+    The cost of inlining a function is its amount of instructions, minus
+    the instructions needed for the call. A call is inlined when this cost
+    is at most max_cost. A local function which is called only once is
+    inlined when it has at most max_single_size instructions, since the
+    function is removed afterwards. No more calls are inlined into a
+    function with more than max_caller_size instructions.
+
+    Local functions which are no longer used after inlining are removed.
+    """
+
+    def __init__(
+        self, max_cost=16, max_single_size=200, max_caller_size=2000
+    ):
+        super().__init__()
+        self.max_cost = max_cost
+        self.max_single_size = max_single_size
+        self.max_caller_size = max_caller_size
+
+    def run(self, ir_module):
+        functions = set(ir_module.functions)
+        self.referenced = referenced_names(ir_module)
+        call_graph = mod_to_call_graph(ir_module)
+        components = call_graph.strongly_connected_components()
+        recursive = set()
+        for component in components:
+            if len(component) > 1 or component[0].is_recursive:
+                recursive.update(node.routine for node in component)
+
+        count = 0
+        for component in components:
+            for node in component:
+                caller = node.routine
+                if caller not in functions:
+                    continue
+
+                size = caller.num_instructions()
+                for call in list(caller.get_out_calls()):
+                    callee = call.callee
+                    if size > self.max_caller_size:
+                        break
+                    if callee in recursive or callee not in functions:
+                        continue
+                    if self.should_inline(call, callee):
+                        size += callee.num_instructions()
+                        inline_function(call, callee)
+                        count += 1
+
+        if count > 0:
+            self.logger.debug(
+                "Inlined %s calls in %s", count, ir_module.name
+            )
+        self.remove_unused(ir_module)
+        self.referenced = None
+
+    def remove_unused(self, ir_module):
+        """ Remove local functions which are not used anymore """
+        change = True
+        while change:
+            change = False
+            for function in list(ir_module.functions):
+                if self.is_removable(function):
+                    self.logger.debug("Removing function %s", function.name)
+                    ir_module.functions.remove(function)
+                    for instruction in function.get_instructions():
+                        instruction.delete()
+                    change = True
+
+    def should_inline(self, call, callee):
+        """ Decide whether to inline the call using the cost model """
+        if not can_inline(call, callee):
+            return False
+
+        size = callee.num_instructions()
+        if self.is_removable(callee, uses=1):
+            if size <= self.max_single_size:
+                return True
+
+        cost = size - (len(call.arguments) + 1)
+        return cost <= self.max_cost
+
+    def is_removable(self, function, uses=0):
+        """Test if a function is not used besides the given amount of uses.
+
+        Only local functions can be removed, which are not referenced
+        in the data of variables.
+        """
+        return (
+            function.binding == ir.Binding.LOCAL
+            and function.use_count == uses
+            and function.name not in self.referenced
+        )
+
+
+def referenced_names(ir_module):
+    """ Get the names of the values referenced by variable data """
+    names = set()
+    for variable in ir_module.variables:
+        for part in variable.value or ():
+            if isinstance(part, tuple):
+                names.add(part[1])
+    return names
+
+
+def can_inline(call, function):
+    """ Test if the call can be replaced by the function """
+    if isinstance(call, ir.FunctionCall) != function.is_function:
+        return False
+
+    if len(call.arguments) != len(function.arguments):
+        return False
+
+    if call.function is function or function.entry.predecessors:
+        return False
+
+    returns = False
+    for instruction in function.get_instructions():
+        if isinstance(instruction, ir.InlineAsm):
+            # Labels in the assembly code would be duplicated:
+            return False
+        elif isinstance(instruction, (ir.Return, ir.Exit)):
+            returns = True
+    return returns
+
+
+def inline_function(call, function):
     """ Replace the call instruction with the function implementation """
-    dst_function = call.function
+    caller = call.function
+    call_block, continuation = split_block(
+        call.block,
+        pos=call.position,
+        newname="{}_after_{}".format(call.block.name, function.name),
+    )
+
+    # Create the blocks first, since jumps and phis refer to them. Block
+    # names are used as labels, so they are prefixed with the caller name:
+    block_map = {}
+    for block in function:
+        block_copy = ir.Block("{}_{}".format(caller.name, block.name))
+        caller.add_block(block_copy)
+        block_map[block] = block_copy
+
+    # Copy the instructions. Values used before they are defined, as phi
+    # inputs, are replaced when all copies are made:
+    value_map = dict(zip(function.arguments, call.arguments))
+    copies = []
+    returns = []
     for block in function:
-        block_copy = block.copy
-        dst_function.add_block(block_copy)
+        block_copy = block_map[block]
+        for instruction in block:
+            if isinstance(instruction, (ir.Return, ir.Exit)):
+                if isinstance(instruction, ir.Return):
+                    returns.append((block_copy, instruction.result))
+                block_copy.add_instruction(ir.Jump(continuation))
+                continue
+
+            copy = clone_instruction(instruction, value_map, block_map)
+            value_map[instruction] = copy
+            copies.append(copy)
+            if isinstance(instruction, ir.Alloc):
+                # Keep the stack allocations at the entry of the caller:
+                caller.entry.insert_instruction(copy)
+            else:
+                block_copy.add_instruction(copy)
+
+    for copy in copies:
+        for value in list(copy.uses):
+            if value in value_map:
+                copy.replace_use(value, value_map[value])
+
+    # The call result is the returned value:
+    if isinstance(call, ir.FunctionCall):
+        returns = [(b, value_map.get(v, v)) for b, v in returns]
+        if len(returns) == 1:
+            result = returns[0][1]
+        else:
+            result = ir.Phi(call.name, call.ty)
+            for block, value in returns:
+                result.set_incoming(block, value)
+            continuation.insert_instruction(result)
+        call.replace_by(result)
+    call.remove_from_block()
 
-    for value, parameter in zip(call.arguments, function.arguments):
-        block
+    # Jump into the copy instead of to the call:
+    call_block.change_target(continuation, block_map[function.entry])
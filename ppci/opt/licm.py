@@ -0,0 +1,194 @@
+""" Loop invariant code motion.
+
+Computations in a loop which give the same value in each iteration are
+moved to the preheader of the loop, so that they are executed only once.
+Inner loops are handled first, so that values can be moved out of
+several loops.
+"""
+
+from .transform import FunctionPass
+from .gvn import GlobalValueNumberingPass
+from .loops import find_loops
+from ..graph.domtree import CfgInfo
+from .. import ir
+
+
+class LoopInvariantCodeMotionPass(FunctionPass):
+    """Move loop invariant computations out of loops.
+
+    Binary and unary operations, casts and loads are moved to the
+    preheader of the loop when their operands are defined outside of the
+    loop. A preheader is created when the loop has none.
+
+    Operations which might trap, such as divisions and loads, are only
+    moved when they are executed in each iteration. Loads are only moved
+    when no instruction in the loop can write the loaded memory.
+
+    .. code::
+
+        block1:
+          jmp block2
+        block2:
+          i32 i = phi block1: zero, block2: j
+          i32 a = x * y
+          i32 j = i + a
+          cjmp j < n ? block2 : block3
+
+    transforms into:
+
+    .. code::
+
+        block1:
+          i32 a = x * y
+          jmp block2
+        block2:
+          i32 i = phi block1: zero, block2: j
+          i32 j = i + a
+          cjmp j < n ? block2 : block3
+    """
+
+    def on_function(self, function):
+        self.cfg_info = CfgInfo(function)
+        self.preheaders = {}
+        count = 0
+        for loop in find_loops(self.cfg_info):
+            count += self.on_loop(loop)
+        if count > 0:
+            self.logger.debug(
+                "Moved %s instructions out of loops in %s",
+                count,
+                function.name,
+            )
+        self.cfg_info = None
+        self.preheaders = None
+
+    def on_loop(self, loop):
+        """ Move the invariant instructions of the loop to its preheader """
+        invariants = self.find_invariants(loop)
+        if not invariants:
+            return 0
+
+        preheader = loop.make_preheader()
+        if preheader is None:
+            return 0
+        self.preheaders[preheader] = loop.header
+
+        # Invariants are found in an order which respects their operands:
+        jump = preheader.last_instruction
+        for instruction in invariants:
+            instruction.block.remove_instruction(instruction)
+            preheader.insert_instruction(instruction, before_instruction=jump)
+        return len(invariants)
+
+    def find_invariants(self, loop):
+        """ Find the instructions which can be moved out of the loop """
+        blocks = [block for block in loop.header.function if block in loop]
+        instructions = [i for block in blocks for i in block]
+        stores = [i for i in instructions if isinstance(i, ir.Store)]
+        clobbered = any(
+            GlobalValueNumberingPass.writes_memory(i)
+            and not isinstance(i, ir.Store)
+            for i in instructions
+        )
+        stored_objects = {memory_object(store.address) for store in stores}
+
+        # Blocks which are executed in each iteration dominate all blocks
+        # which leave the loop or jump back to the header:
+        ends = [self.get_node(b) for b in loop.exits + loop.latches]
+        guaranteed = [
+            block
+            for block in blocks
+            if all(self.get_node(block).dominates(end) for end in ends)
+        ]
+        invariants = []
+        invariant_set = set()
+
+        def is_invariant(value):
+            block = getattr(value, "block", None)
+            return block not in loop or value in invariant_set
+
+        change = True
+        while change:
+            change = False
+            for instruction in instructions:
+                if instruction in invariant_set:
+                    continue
+
+                if isinstance(instruction, ir.Binop):
+                    operands = (instruction.a, instruction.b)
+                    if may_trap(instruction):
+                        if instruction.block not in guaranteed:
+                            continue
+                elif isinstance(instruction, ir.Unop):
+                    operands = (instruction.a,)
+                elif isinstance(instruction, ir.Cast):
+                    operands = (instruction.src,)
+                elif isinstance(instruction, ir.Load):
+                    if instruction.volatile or clobbered:
+                        continue
+                    address = instruction.address
+                    if stores and (
+                        None in stored_objects
+                        or memory_object(address) in stored_objects
+                        or memory_object(address) is None
+                    ):
+                        # A store in the loop might write the loaded memory
+                        continue
+                    if instruction.block not in guaranteed:
+                        continue
+                    operands = (address,)
+                else:
+                    continue
+
+                if all(map(is_invariant, operands)):
+                    invariants.append(instruction)
+                    invariant_set.add(instruction)
+                    change = True
+        return invariants
+
+    def get_node(self, block):
+        # Preheaders are created after the dominator info was calculated.
+        # Their dominance is the same as the dominance of their header:
+        while block in self.preheaders:
+            block = self.preheaders[block]
+        return self.cfg_info.get_node(block)
+
+
+def may_trap(instruction):
+    """ Test if a binary operation might trap, such as division by zero """
+    if instruction.operation in ("/", "%"):
+        if isinstance(instruction.ty, ir.FloatingPointTyp):
+            return False
+        divisor = instruction.b
+        return not isinstance(divisor, ir.Const) or divisor.value in (0, -1)
+    return False
+
+
+def memory_object(address):
+    """Determine the global variable or local allocation an address is in.
+
+    The address can have an offset added to it. Returns None when
+    the object cannot be determined.
+    """
+    while isinstance(address, ir.Binop) and address.operation in ("+", "-"):
+        if is_offset(address.b):
+            address = address.a
+        elif address.operation == "+" and is_offset(address.a):
+            address = address.b
+        else:
+            return
+    if isinstance(address, ir.AddressOf):
+        return address.src
+    elif isinstance(address, ir.Variable):
+        return address
+
+
+def is_offset(value):
+    """ Test if a value is an integer converted to a pointer offset """
+    if isinstance(value, ir.Const):
+        return True
+    elif isinstance(value, ir.Cast):
+        return value.src.ty.is_integer
+    elif isinstance(value, ir.Binop) and value.operation in ("*", "<<"):
+        return is_offset(value.a) and is_offset(value.b)
+    return False
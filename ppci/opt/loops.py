@@ -0,0 +1,142 @@
+""" Loop analysis.
+
+A back edge is an edge from a block to a block which dominates it. The
+dominating block is the header of a natural loop. The loop consists of
+the header and all blocks which can reach the back edge without passing
+through the header. Natural loops are either nested or disjoint.
+
+The loops are calculated by the control flow graph, this module adds the
+blocks of the function and preheaders to them.
+"""
+
+from .. import ir
+
+
+class Loop:
+    """ A natural loop in a function """
+
+    def __init__(self, header, blocks, latches):
+        self.header = header
+        self.blocks = blocks
+        self.latches = latches
+        self.parent = None
+        self.children = []
+
+    def __repr__(self):
+        return "Loop(header={}, blocks={})".format(
+            self.header.name, len(self.blocks)
+        )
+
+    def __contains__(self, block):
+        return block in self.blocks
+
+    @property
+    def exits(self):
+        """ Blocks in the loop with a successor outside of the loop """
+        return [
+            block
+            for block in self.blocks
+            if any(s not in self.blocks for s in block.successors)
+        ]
+
+    @property
+    def entries(self):
+        """ Blocks outside of the loop which jump to the header """
+        return [p for p in self.header.predecessors if p not in self.blocks]
+
+    @property
+    def preheader(self):
+        """The block before the loop.
+
+        The preheader is the only block outside of the loop which jumps to
+        the header, and it only jumps to the header. None if there is no
+        such block.
+        """
+        entries = self.entries
+        if len(entries) == 1:
+            (preheader,) = entries
+            if isinstance(preheader.last_instruction, ir.Jump):
+                return preheader
+
+    def make_preheader(self):
+        """Get the preheader, and create it if the loop has none.
+
+        Returns None if the loop cannot be entered.
+        """
+        preheader = self.preheader
+        if preheader is not None:
+            return preheader
+
+        entries = self.entries
+        if not entries:
+            return
+
+        header = self.header
+        preheader = ir.Block("{}_preheader".format(header.name))
+        header.function.add_block(preheader)
+
+        # Values entering the loop are merged in the preheader:
+        for phi in header.phis:
+            values = [phi.get_value(entry) for entry in entries]
+            if len(set(values)) == 1:
+                value = values[0]
+            else:
+                value = ir.Phi(phi.name, phi.ty)
+                for entry, incoming in zip(entries, values):
+                    value.set_incoming(entry, incoming)
+                preheader.add_instruction(value)
+            for entry in entries:
+                phi.del_incoming(entry)
+            phi.set_incoming(preheader, value)
+
+        preheader.add_instruction(ir.Jump(header))
+        for entry in entries:
+            entry.change_target(header, preheader)
+
+        # The preheader is part of all loops around this loop:
+        loop = self.parent
+        while loop is not None:
+            loop.blocks.add(preheader)
+            loop = loop.parent
+        return preheader
+
+
+def find_loops(cfg_info):
+    """Find the natural loops in a function.
+
+    The loops are calculated by the control flow graph. The loops are
+    sorted innermost first, and the parent and children of nested loops
+    are set.
+    """
+    function = cfg_info.function
+    order = {block: index for index, block in enumerate(function)}
+    loops = []
+    for cfg_loop in cfg_info.cfg.calculate_loops():
+        header = cfg_loop.header
+        if not cfg_info.has_block(header):
+            continue
+        nodes = [header] + cfg_loop.rest
+        blocks = {
+            cfg_info.get_block(node)
+            for node in nodes
+            if cfg_info.has_block(node)
+        }
+        latches = sorted(
+            (
+                cfg_info.get_block(node)
+                for node in nodes
+                if header in node.successors and cfg_info.has_block(node)
+            ),
+            key=order.get,
+        )
+        loops.append(Loop(cfg_info.get_block(header), blocks, latches))
+
+    # Sort on size, so that inner loops come before loops around them:
+    loops.sort(key=lambda loop: (len(loop.blocks), order[loop.header]))
+    for index, loop in enumerate(loops):
+        for outer in loops[index + 1 :]:
+            if loop.header in outer.blocks:
+                loop.parent = outer
+                outer.children.append(loop)
+                break
+    return loops
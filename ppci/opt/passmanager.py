@@ -0,0 +1,226 @@
+""" Run a pipeline of optimization passes.
+
+The pass manager contains the passes for each optimization level. Cheap
+passes are grouped, and a group is repeated while it changes the code.
+The time spent in each pass and the amount of instructions each pass
+removes or adds are recorded, so that they can be reported.
+"""
+
+import logging
+import time
+from .transform import ModulePass
+from .transform import DeleteUnusedInstructionsPass, RemoveAddZeroPass
+from .clean import CleanPass
+from .cjmp import CJumpPass
+from .constantfolding import ConstantFolder
+from .cse import CommonSubexpressionEliminationPass
+from .gvn import GlobalValueNumberingPass
+from .inline import InliningPass
+from .licm import LoopInvariantCodeMotionPass
+from .load_after_store import LoadAfterStorePass
+from .mem2reg import Mem2RegPromotor
+from .sccp import SCCPPass
+from .tailcall import TailCallOptimization
+from .unroll import LoopUnrollPass
+from .. import ir
+
+
+class PassManager:
+    """Run optimization passes over a module and keep statistics.
+
+    The pipeline consists of passes, which run once, and groups of passes,
+    which are repeated until they no longer change the module, with a
+    maximum of max_rounds rounds.
+    """
+
+    logger = logging.getLogger("passmanager")
+
+    def __init__(self):
+        self.pipeline = []
+        self.statistics = {}
+
+    @classmethod
+    def from_level(cls, level):
+        """ Create a pass manager for the given optimization level """
+        level = str(level)
+        pass_manager = cls()
+        if level == "0":
+            # No optimization at all:
+            pass
+
+        elif level == "1":
+            # Only cheap, block local passes:
+            pass_manager.add_fixpoint(
+                [
+                    Mem2RegPromotor(),
+                    RemoveAddZeroPass(),
+                    ConstantFolder(),
+                    CommonSubexpressionEliminationPass(),
+                    TailCallOptimization(),
+                    LoadAfterStorePass(),
+                    DeleteUnusedInstructionsPass(),
+                    CleanPass(),
+                ],
+                max_rounds=3,
+            )
+
+        elif level in ("2", "3"):
+            # Inline calls first, so that the inlined code is optimized
+            # with the code around the call:
+            pass_manager.add_pass(Mem2RegPromotor())
+            pass_manager.add_pass(
+                InliningPass(max_cost=16 if level == "2" else 48)
+            )
+            pass_manager.add_fixpoint(
+                [
+                    Mem2RegPromotor(),
+                    RemoveAddZeroPass(),
+                    ConstantFolder(),
+                    GlobalValueNumberingPass(),
+                    TailCallOptimization(),
+                    LoadAfterStorePass(),
+                    DeleteUnusedInstructionsPass(),
+                    SCCPPass(),
+                    LoopInvariantCodeMotionPass(),
+                    CleanPass(),
+                ]
+            )
+
+            if level == "3":
+                # Unroll loops when their bounds are known, and optimize
+                # the copies:
+                pass_manager.add_pass(LoopUnrollPass())
+                pass_manager.add_fixpoint(
+                    [
+                        ConstantFolder(),
+                        GlobalValueNumberingPass(),
+                        LoadAfterStorePass(),
+                        DeleteUnusedInstructionsPass(),
+                        SCCPPass(),
+                        CleanPass(),
+                    ]
+                )
+                pass_manager.add_pass(CJumpPass())
+
+        elif level == "s":
+            # No passes which increase the size of the code:
+            pass_manager.add_pass(Mem2RegPromotor())
+            pass_manager.add_pass(InliningPass(max_cost=0))
+            pass_manager.add_fixpoint(
+                [
+                    Mem2RegPromotor(),
+                    RemoveAddZeroPass(),
+                    ConstantFolder(),
+                    CommonSubexpressionEliminationPass(),
+                    TailCallOptimization(),
+                    LoadAfterStorePass(),
+                    DeleteUnusedInstructionsPass(),
+                    SCCPPass(),
+                    CleanPass(),
+                ]
+            )
+
+        else:
+            raise ValueError("Invalid optimization level {}".format(level))
+        return pass_manager
+
+    def add_pass(self, opt_pass: ModulePass):
+        """ Add a pass which is run once """
+        self.pipeline.append(([opt_pass], 1))
+
+    def add_fixpoint(self, passes, max_rounds=5):
+        """ Add passes which are repeated while they change the module """
+        self.pipeline.append((list(passes), max_rounds))
+
+    def run(self, ir_module: ir.Module):
+        """ Run the pipeline over the given module """
+        for passes, max_rounds in self.pipeline:
+            if max_rounds == 1:
+                for opt_pass in passes:
+                    self.run_pass(opt_pass, ir_module)
+                continue
+
+            signature = module_signature(ir_module)
+            for rounds in range(1, max_rounds + 1):
+                for opt_pass in passes:
+                    self.run_pass(opt_pass, ir_module)
+                new_signature = module_signature(ir_module)
+                if new_signature == signature:
+                    break
+                signature = new_signature
+            self.logger.debug("Ran %s passes %s times", len(passes), rounds)
+
+    def run_pass(self, opt_pass: ModulePass, ir_module: ir.Module):
+        """ Run a single pass, and record its time and effect on the size """
+        size = module_size(ir_module)
+        start_time = time.perf_counter()
+        opt_pass.run(ir_module)
+        elapsed = time.perf_counter() - start_time
+        delta = module_size(ir_module) - size
+
+        name = repr(opt_pass)
+        if name not in self.statistics:
+            self.statistics[name] = PassStatistics(name)
+        self.statistics[name].add_run(elapsed, delta)
+
+    def report(self, reporter):
+        """ Write the statistics of the passes to the given reporter """
+        reporter.heading(3, "Optimization passes")
+        lines = [
+            "{:<36} {:>5} {:>10} {:>12}".format(
+                "pass", "runs", "time (ms)", "instructions"
+            )
+        ]
+        for stat in self.statistics.values():
+            lines.append(
+                "{:<36} {:>5} {:>10.2f} {:>+12}".format(
+                    stat.name, stat.runs, stat.time * 1000, stat.delta
+                )
+            )
+        total = sum(stat.time for stat in self.statistics.values())
+        lines.append(
+            "{:<36} {:>5} {:>10.2f}".format("total", "", total * 1000)
+        )
+        reporter.dump_raw_text("\n".join(lines))
+
+
+class PassStatistics:
+    """ The accumulated runs of a single optimization pass """
+
+    def __init__(self, name):
+        self.name = name
+        self.runs = 0
+        self.time = 0.0
+        self.delta = 0
+
+    def __repr__(self):
+        return "PassStatistics({}, runs={}, time={:.3f}, delta={})".format(
+            self.name, self.runs, self.time, self.delta
+        )
+
+    def add_run(self, elapsed, delta):
+        self.runs += 1
+        self.time += elapsed
+        self.delta += delta
+
+
+def module_size(ir_module):
+    """ Get the amount of instructions in the module """
+    return sum(f.num_instructions() for f in ir_module.functions)
+
+
+def module_signature(ir_module):
+    """Get a value which changes when the code in the module changes.
+
+    The signature is made of the text of the instructions, which contains
+    their opcode, type, name, the names of the values they use and the
+    blocks they refer to. This also detects instructions which are
+    modified in place.
+    """
+    signature = []
+    for function in ir_module.functions:
+        signature.append(function.name)
+        for block in function:
+            signature.append(block.name)
+            signature.extend(map(str, block))
+    return tuple(signature)
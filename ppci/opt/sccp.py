@@ -0,0 +1,333 @@
+""" Sparse conditional constant propagation.
+
+Each value in a function is assigned a lattice value, which is either
+unknown (top), a constant, or not constant (bottom). Starting from the
+entry block, only blocks which can actually be reached are evaluated.
+A conditional jump with constant operands makes only one of its targets
+reachable. This way, constants flow through phi nodes and branches.
+
+See also: Constant propagation with conditional branches, by Wegman and
+Zadeck, 1991.
+"""
+
+import operator
+from .transform import FunctionPass
+from .constantfolding import cast, correct
+from .. import ir
+
+
+TOP = object()  # The value is not known yet
+BOTTOM = object()  # The value is not constant
+
+
+def divide(a, b):
+    """ Integer division which truncates towards zero, like in C """
+    quotient = abs(a) // abs(b)
+    return -quotient if (a < 0) != (b < 0) else quotient
+
+
+class SCCPPass(FunctionPass):
+    """Sparse conditional constant propagation.
+
+    Replace values which are constant by constants, remove branches which
+    are never taken and remove phi nodes with a single value.
+
+    .. code::
+
+        block0:
+          i32 a = 2
+          jmp block1
+        block1:
+          i32 b = phi block0: a, block2: c
+          cjmp b < a ? block2 : block3
+        block2:
+          i32 c = b * a
+          jmp block1
+        block3:
+          return b
+
+    transforms into:
+
+    .. code::
+
+        block0:
+          i32 a = 2
+          jmp block1
+        block1:
+          i32 b = 2
+          jmp block3
+        block3:
+          return b
+    """
+
+    binops = {
+        "+": operator.add,
+        "-": operator.sub,
+        "*": operator.mul,
+        "&": operator.and_,
+        "|": operator.or_,
+        "^": operator.xor,
+    }
+    conditions = {
+        "==": operator.eq,
+        "<": operator.lt,
+        ">": operator.gt,
+        ">=": operator.ge,
+        "<=": operator.le,
+        "!=": operator.ne,
+    }
+
+    def on_function(self, function):
+        self.values = {}
+        self.executable = set()  # Executable control flow edges
+        self.visited = set()  # Blocks which are reachable
+        self.solve(function)
+
+        count = self.replace_constants()
+        count += self.fold_jumps(function)
+        function.delete_unreachable()
+        count += self.simplify_phis(function)
+        if count > 0:
+            self.logger.debug(
+                "Simplified %s instructions in %s", count, function.name
+            )
+
+        self.values = None
+        self.executable = None
+        self.visited = None
+
+    def solve(self, function):
+        """ Determine lattice values and reachable blocks """
+        edges = [(None, function.entry)]
+        instructions = []
+        while edges or instructions:
+            if edges:
+                edge = edges.pop()
+                if edge in self.executable:
+                    continue
+                self.executable.add(edge)
+                block = edge[1]
+                if block in self.visited:
+                    changed = [self.visit(phi, edges) for phi in block.phis]
+                else:
+                    self.visited.add(block)
+                    changed = [self.visit(i, edges) for i in block]
+            else:
+                instruction = instructions.pop()
+                if instruction.block not in self.visited:
+                    continue
+                changed = [self.visit(instruction, edges)]
+
+            for value in changed:
+                if value is not None:
+                    instructions.extend(value.used_by)
+
+    def visit(self, instruction, edges):
+        """Evaluate the instruction.
+
+        Returns the instruction when its value changed. Reachable targets of
+        jumps are added to the edges.
+        """
+        if isinstance(instruction, ir.Jump):
+            edges.append((instruction.block, instruction.target))
+        elif isinstance(instruction, ir.CJump):
+            self.visit_cjump(instruction, edges)
+        elif isinstance(instruction, ir.LocalValue):
+            old = self.values.get(instruction, TOP)
+            if old is BOTTOM:
+                return
+
+            new = self.evaluate(instruction)
+            if new is TOP:
+                return
+
+            if old is not TOP and not same(old, new):
+                new = BOTTOM
+
+            if old is TOP or new is BOTTOM:
+                self.values[instruction] = new
+                return instruction
+
+    def visit_cjump(self, instruction, edges):
+        a = self.get_value(instruction.a)
+        b = self.get_value(instruction.b)
+        block = instruction.block
+        if a is TOP or b is TOP:
+            return
+        elif a is BOTTOM or b is BOTTOM:
+            edges.append((block, instruction.lab_yes))
+            edges.append((block, instruction.lab_no))
+        elif self.conditions[instruction.cond](a, b):
+            edges.append((block, instruction.lab_yes))
+        else:
+            edges.append((block, instruction.lab_no))
+
+    def get_value(self, value):
+        """ Get the lattice value of a value """
+        if getattr(value, "block", None) is None:
+            # Parameters and global values:
+            return BOTTOM
+        return self.values.get(value, TOP)
+
+    def evaluate(self, instruction):
+        """ Determine the lattice value of an instruction """
+        if isinstance(instruction, ir.Const):
+            if instruction.ty.is_integer:
+                return correct(instruction.value, instruction.ty)
+            return instruction.value
+        elif isinstance(instruction, ir.Phi):
+            value = TOP
+            for block, incoming in instruction.inputs.items():
+                if (block, instruction.block) in self.executable:
+                    value = meet(value, self.get_value(incoming))
+            return value
+        elif isinstance(instruction, ir.Binop):
+            return self.evaluate_operation(
+                instruction, instruction.a, instruction.b
+            )
+        elif isinstance(instruction, ir.Unop):
+            return self.evaluate_operation(instruction, instruction.a)
+        elif isinstance(instruction, ir.Cast):
+            src = instruction.src
+            if is_integer(src.ty) and is_integer(instruction.ty):
+                value = self.get_value(src)
+                if value is TOP or value is BOTTOM:
+                    return value
+                return cast(value, instruction.ty)
+        return BOTTOM
+
+    def evaluate_operation(self, instruction, *operands):
+        """ Evaluate integer binary and unary operations """
+        ty = instruction.ty
+        if not ty.is_integer:
+            return BOTTOM
+
+        values = [self.get_value(operand) for operand in operands]
+        if BOTTOM in values:
+            return BOTTOM
+        elif TOP in values:
+            return TOP
+
+        values = [correct(value, ty) for value in values]
+        operation = instruction.operation
+        if len(values) == 1:
+            (a,) = values
+            if operation == "-":
+                return correct(-a, ty)
+            elif operation == "~":
+                return correct(~a, ty)
+            return BOTTOM  # pragma: no cover
+
+        a, b = values
+        if operation in self.binops:
+            return correct(self.binops[operation](a, b), ty)
+        elif operation in ("<<", ">>"):
+            if not 0 <= b < ty.bits:
+                return BOTTOM
+            if operation == "<<":
+                return correct(a << b, ty)
+            else:
+                return correct(a >> b, ty)
+        elif operation in ("/", "%"):
+            if b == 0:
+                return BOTTOM
+            quotient = divide(a, b)
+            if operation == "/":
+                return correct(quotient, ty)
+            else:
+                return correct(a - b * quotient, ty)
+        return BOTTOM
+
+    def replace_constants(self):
+        """ Replace values with a constant lattice value by constants """
+        count = 0
+        for instruction, value in self.values.items():
+            if (
+                value is BOTTOM
+                or isinstance(instruction, ir.Const)
+                or instruction.block is None
+            ):
+                continue
+
+            block = instruction.block
+            if isinstance(instruction, ir.Phi):
+                before = next(i for i in block if not i.is_phi)
+            else:
+                before = instruction
+            cnst = ir.Const(value, instruction.name, instruction.ty)
+            block.insert_instruction(cnst, before_instruction=before)
+            instruction.replace_by(cnst)
+            instruction.remove_from_block()
+            count += 1
+        return count
+
+    def fold_jumps(self, function):
+        """ Replace conditional jumps with a single reachable target """
+        count = 0
+        for block in list(function):
+            instruction = block.last_instruction
+            if block not in self.visited or not isinstance(
+                instruction, ir.CJump
+            ):
+                continue
+
+            targets = [
+                target
+                for target in (instruction.lab_yes, instruction.lab_no)
+                if (block, target) in self.executable
+            ]
+            if len(targets) != 1:
+                continue
+
+            (target,) = targets
+            for other in instruction.targets:
+                if other is not target:
+                    for phi in other.phis:
+                        phi.del_incoming(block)
+
+            block.remove_instruction(instruction)
+            instruction.delete()
+            block.add_instruction(ir.Jump(target))
+            count += 1
+        return count
+
+    def simplify_phis(self, function):
+        """ Replace phi nodes which select a single value by the value """
+        count = 0
+        change = True
+        while change:
+            change = False
+            for block in function:
+                for phi in block.phis:
+                    values = set(phi.inputs.values())
+                    values.discard(phi)
+                    if len(values) == 1:
+                        (value,) = values
+                        phi.replace_by(value)
+                        phi.remove_from_block()
+                        count += 1
+                        change = True
+        return count
+
+
+def meet(a, b):
+    """ Combine two lattice values """
+    if a is TOP:
+        return b
+    elif b is TOP:
+        return a
+    elif a is BOTTOM or b is BOTTOM:
+        return BOTTOM
+    elif same(a, b):
+        return a
+    else:
+        return BOTTOM
+
+
+def same(a, b):
+    """ Check if two constants are equal, and 0.0 differs from -0.0 """
+    return repr(a) == repr(b)
+
+
+def is_integer(ty):
+    return ty.is_integer or isinstance(ty, ir.PointerTyp)
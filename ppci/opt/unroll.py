@@ -0,0 +1,240 @@
+""" Loop unrolling.
+
+Loops which are executed a small, constant number of times are replaced
+by a copy of the loop for each iteration. This removes the jumps and
+comparisons of the loop, and the copies can be optimized further by
+constant folding.
+"""
+
+from .transform import FunctionPass
+from .constantfolding import cast, correct
+from .loops import find_loops
+from .sccp import SCCPPass
+from ..graph.domtree import CfgInfo
+from ..irutils import clone_instruction
+from .. import ir
+
+
+class LoopUnrollPass(FunctionPass):
+    """Fully unroll small loops with a constant trip count.
+
+    The loop must consist of a header, which decides whether to leave the
+    loop, followed by a chain of blocks back to the header. The trip count
+    is determined by evaluating the loop, starting with the values which
+    enter the loop.
+
+    .. code::
+
+        block1:
+          i32 zero = 0
+          i32 one = 1
+          i32 two = 2
+          jmp block2
+        block2:
+          i32 i = phi block1: zero, block3: j
+          cjmp i < two ? block3 : block4
+        block3:
+          call f(i)
+          i32 j = i + one
+          jmp block2
+
+    transforms into:
+
+    .. code::
+
+        block1:
+          i32 zero = 0
+          i32 one = 1
+          i32 two = 2
+          jmp block2_unrolled
+        block2_unrolled:
+          call f(zero)
+          i32 j = zero + one
+          call f(j)
+          i32 j_1 = j + one
+          jmp block4
+
+    """
+
+    def __init__(self, max_trip_count=8, max_size=64):
+        super().__init__()
+        self.max_trip_count = max_trip_count
+        self.max_size = max_size
+
+    def on_function(self, function):
+        count = 0
+        for loop in find_loops(CfgInfo(function)):
+            # Only unroll inner loops, the blocks of outer loops change:
+            if loop.children:
+                continue
+
+            chain = self.get_chain(loop)
+            if chain is None:
+                continue
+
+            trip_count = self.get_trip_count(loop, chain)
+            if trip_count is None:
+                continue
+
+            size = (trip_count + 1) * sum(map(len, chain))
+            if size > self.max_size:
+                continue
+
+            self.unroll(loop, chain, trip_count)
+            function.delete_unreachable()
+            count += 1
+
+        if count > 0:
+            self.logger.debug(
+                "Unrolled %s loops in %s", count, function.name
+            )
+
+    def get_chain(self, loop):
+        """Get the blocks of the loop, starting with the header.
+
+        Returns None when the loop is not a header followed by a chain of
+        blocks, or when it is entered from multiple blocks.
+        """
+        header = loop.header
+        jump = header.last_instruction
+        if len(loop.entries) != 1 or not isinstance(jump, ir.CJump):
+            return
+
+        if jump.lab_yes in loop and jump.lab_no not in loop:
+            block = jump.lab_yes
+        elif jump.lab_no in loop and jump.lab_yes not in loop:
+            block = jump.lab_no
+        else:
+            return
+
+        chain = [header]
+        while block is not header:
+            if (
+                len(chain) >= len(loop.blocks)
+                or len(block.predecessors) != 1
+                or block.phis
+                or not isinstance(block.last_instruction, ir.Jump)
+            ):
+                return
+            chain.append(block)
+            block = block.last_instruction.target
+
+        if len(chain) == len(loop.blocks):
+            return chain
+
+    def get_trip_count(self, loop, chain):
+        """Determine how often the loop body is executed.
+
+        Returns None when this is not constant, or more than the maximum
+        trip count.
+        """
+        header = chain[0]
+        (entry,) = loop.entries
+        (latch,) = loop.latches
+        jump = header.last_instruction
+        values = {
+            phi: self.get_value(phi.get_value(entry), {})
+            for phi in header.phis
+        }
+        for trip_count in range(self.max_trip_count + 1):
+            self.evaluate_block(header, values)
+            a = self.get_value(jump.a, values)
+            b = self.get_value(jump.b, values)
+            if a is None or b is None:
+                return
+
+            taken = SCCPPass.conditions[jump.cond](a, b)
+            if taken != (jump.lab_yes in loop):
+                return trip_count
+
+            for block in chain[1:]:
+                self.evaluate_block(block, values)
+            values = {
+                phi: self.get_value(phi.get_value(latch), values)
+                for phi in header.phis
+            }
+
+    def evaluate_block(self, block, values):
+        for instruction in block:
+            if instruction.is_phi:
+                continue
+            if isinstance(instruction, ir.LocalValue):
+                values[instruction] = self.evaluate(instruction, values)
+
+    def evaluate(self, instruction, values):
+        """ Evaluate integer operations, None if this is not possible """
+        if isinstance(instruction, ir.Const):
+            return self.get_value(instruction, values)
+        elif isinstance(instruction, ir.Binop):
+            ty = instruction.ty
+            a = self.get_value(instruction.a, values)
+            b = self.get_value(instruction.b, values)
+            if a is None or b is None or not ty.is_integer:
+                return
+
+            operation = instruction.operation
+            if operation in SCCPPass.binops:
+                return correct(SCCPPass.binops[operation](a, b), ty)
+            elif operation in ("<<", ">>") and 0 <= b < ty.bits:
+                if operation == "<<":
+                    return correct(a << b, ty)
+                else:
+                    return correct(a >> b, ty)
+        elif isinstance(instruction, ir.Cast):
+            value = self.get_value(instruction.src, values)
+            if value is not None and instruction.ty.is_integer:
+                return cast(value, instruction.ty)
+
+    @staticmethod
+    def get_value(value, values):
+        if value in values:
+            return values[value]
+        elif isinstance(value, ir.Const) and value.ty.is_integer:
+            return correct(value.value, value.ty)
+
+    def unroll(self, loop, chain, trip_count):
+        """ Replace the loop by a block with a copy of each iteration """
+        header = chain[0]
+        (entry,) = loop.entries
+        (latch,) = loop.latches
+        jump = header.last_instruction
+        if jump.lab_yes in loop:
+            exit_block = jump.lab_no
+        else:
+            exit_block = jump.lab_yes
+
+        block = ir.Block("{}_unrolled".format(header.name))
+        header.function.add_block(block)
+
+        value_map = {phi: phi.get_value(entry) for phi in header.phis}
+        for iteration in range(trip_count + 1):
+            if iteration > 0:
+                value_map = {
+                    phi: value_map.get(
+                        phi.get_value(latch), phi.get_value(latch)
+                    )
+                    for phi in header.phis
+                }
+
+            # The last iteration only executes the header:
+            blocks = chain if iteration < trip_count else chain[:1]
+            for original in blocks:
+                for instruction in original:
+                    if instruction.is_phi or instruction.is_terminator:
+                        continue
+                    new_instruction = clone_instruction(instruction, value_map)
+                    block.add_instruction(new_instruction)
+                    value_map[instruction] = new_instruction
+        block.add_instruction(ir.Jump(exit_block))
+
+        # Values of the header are used after the loop:
+        for phi in exit_block.phis:
+            value = phi.get_value(header)
+            phi.set_incoming(block, value_map.get(value, value))
+        for instruction in header:
+            if isinstance(instruction, ir.LocalValue):
+                for user in list(instruction.used_by):
+                    if user.block not in loop:
+                        user.replace_use(instruction, value_map[instruction])
+
+        entry.change_target(header, block)
@@ -0,0 +1,208 @@
+""" On-disk caching of compilation results.
+
+Cache entries are addressed by a key, which is a hash over everything
+that influences the result. The version of ppci is always part of the key,
+so upgrading ppci invalidates old entries.
+
+The cache is bounded in size. When the size is exceeded, the least recently
+used entries are removed.
+
+Example usage:
+
+>>> import tempfile
+>>> from ppci.utils.cache import DiskCache, make_key
+>>> cache = DiskCache(tempfile.mkdtemp())
+>>> key = make_key('example', 42)
+>>> cache.get(key) is None
+True
+>>> cache.put(key, b'data')
+>>> cache.get(key)
+b'data'
+>>> cache.hits, cache.misses
+(1, 1)
+
+"""
+
+import hashlib
+import io
+import logging
+import os
+import tempfile
+from .. import __version__
+
+
+def get_cache_dir():
+    """Determine the directory in which ppci caches data.
+
+    This is the directory set in the PPCI_CACHE_DIR environment variable,
+    or a ppci folder in the users cache directory.
+    """
+    if "PPCI_CACHE_DIR" in os.environ:
+        return os.environ["PPCI_CACHE_DIR"]
+
+    if "XDG_CACHE_HOME" in os.environ:
+        base = os.environ["XDG_CACHE_HOME"]
+    elif os.name == "nt" and "LOCALAPPDATA" in os.environ:
+        base = os.environ["LOCALAPPDATA"]
+    else:
+        base = os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "ppci")
+
+
+def make_key(*parts):
+    """Create a cache key from the given parts.
+
+    Parts can be bytes, or any value with a stable string representation.
+    """
+    h = hashlib.sha256()
+    for part in (__version__,) + parts:
+        if not isinstance(part, bytes):
+            part = str(part).encode("utf8")
+        # Prefix each part with its length, to prevent ambiguity:
+        h.update(len(part).to_bytes(8, "little"))
+        h.update(part)
+    return h.hexdigest()
+
+
+class DiskCache:
+    """Size bounded on-disk cache of binary data.
+
+    Each entry is stored in a file named by its key. The modification time
+    of the file is updated on each hit, so that the least recently used
+    entries can be evicted when the cache grows beyond its maximum size.
+
+    Args:
+        directory: the directory to store the cache entries in. Defaults
+            to :func:`get_cache_dir`.
+        max_size: the maximum total size of the cache in bytes.
+    """
+
+    logger = logging.getLogger("cache")
+
+    def __init__(self, directory=None, max_size=256 * 1024 * 1024):
+        if directory is None:
+            directory = get_cache_dir()
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __repr__(self):
+        return "DiskCache({})".format(self.directory)
+
+    @property
+    def stats(self):
+        """ Get hit, miss and eviction statistics of this cache """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _filename(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        """ Get the data stored under key, or None in case of a miss. """
+        filename = self._filename(key)
+        try:
+            with open(filename, "rb") as f:
+                data = f.read()
+        except OSError:
+            self.misses += 1
+            self.logger.debug("Cache miss for %s", key)
+            return None
+
+        # Mark the entry as recently used:
+        try:
+            os.utime(filename)
+        except OSError:  # pragma: no cover
+            pass
+
+        self.hits += 1
+        self.logger.debug("Cache hit for %s", key)
+        return data
+
+    def put(self, key, data):
+        """ Store data under the given key. """
+        assert isinstance(data, bytes)
+        filename = self._filename(key)
+        folder = os.path.dirname(filename)
+        os.makedirs(folder, exist_ok=True)
+
+        # Write to a temporary file first, so that concurrent readers
+        # never see a partially written entry:
+        fd, tmp_filename = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_filename, filename)
+        self.logger.debug("Stored %s bytes under %s", len(data), key)
+        self.evict()
+
+    def _entries(self):
+        """ Get a list of (mtime, size, filename) of all cache entries """
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+
+        for folder in os.listdir(self.directory):
+            path = os.path.join(self.directory, folder)
+            if not os.path.isdir(path):
+                continue
+            for name in os.listdir(path):
+                if name.endswith(".tmp"):
+                    continue
+                filename = os.path.join(path, name)
+                try:
+                    st = os.stat(filename)
+                except OSError:  # pragma: no cover
+                    continue
+                entries.append((st.st_mtime, st.st_size, filename))
+        return entries
+
+    def size(self):
+        """ Determine the total size of the cache in bytes """
+        return sum(e[1] for e in self._entries())
+
+    def evict(self):
+        """ Remove least recently used entries until the cache fits """
+        entries = self._entries()
+        total = sum(e[1] for e in entries)
+        if total <= self.max_size:
+            return
+
+        entries.sort()
+        for _, size, filename in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(filename)
+            except OSError:  # pragma: no cover
+                continue
+            total -= size
+            self.evictions += 1
+            self.logger.debug("Evicted %s", filename)
+
+    def clear(self):
+        """ Remove all entries from the cache """
+        for _, _, filename in self._entries():
+            try:
+                os.remove(filename)
+            except OSError:  # pragma: no cover
+                pass
+
+    def get_object(self, key):
+        """ Load an object file from the cache, or None on a miss. """
+        from ..binutils.objectfile import ObjectFile
+
+        data = self.get(key)
+        if data is None:
+            return None
+        return ObjectFile.load(io.BytesIO(data))
+
+    def put_object(self, key, obj):
+        """ Store an object file in the cache. """
+        f = io.BytesIO()
+        obj.save(f)
+        self.put(key, f.getvalue())
@@ -117,6 +117,9 @@ class Mod:
             elif isinstance(imp_obj, MemoryPage):
                 self._import_symbols.append((name, imp_obj))
                 extra_symbols[name] = imp_obj.addr
+            elif isinstance(imp_obj, int):
+                # A raw address, for example of code loaded before:
+                extra_symbols[name] = imp_obj
             else:
                 raise ValueError(
                     "Cannot import {} of type {}".format(name, type(imp_obj))
@@ -190,6 +193,10 @@ class Mod:
         """ Get the memory address of a symbol """
         return self._obj.get_symbol(name).value
 
+    def get_symbol_address(self, name):
+        """ Get the absolute memory address of a symbol """
+        return self._obj.get_symbol_id_value(self._obj.get_symbol(name).id)
+
 
 def load_code_as_module(source_file, reporter=None):
     """ Load c3 code as a module """
@@ -218,6 +225,7 @@ def load_obj(obj, imports=None):
         imports: A dictionary of functions to attach.
 
     Optionally a dictionary of functions that must be imported can
-    be provided.
+    be provided. Values can be python functions, memory pages or
+    addresses.
     """
     return Mod(obj, imports=imports)
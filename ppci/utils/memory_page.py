@@ -1,4 +1,5 @@
 import logging
+import os
 import sys
 import ctypes
 import struct
@@ -43,6 +44,127 @@ class MemoryPage:
             return bytes()
 
 
+class ReservedMemoryPage:
+    """Memory which can grow without moving.
+
+    Address space for the maximum size is reserved up front, and memory
+    is committed in place when it grows. The address of the memory stays
+    the same, so growing does not copy any data.
+
+    The view on the memory keeps the reservation alive, so the memory is
+    not released while a view on it exists.
+    """
+
+    def __init__(self, size, max_size):
+        if size > max_size:
+            raise ValueError("Size must not be larger than the maximum size")
+        self.max_size = max_size
+        self.size = 0
+        self._committed = 0
+        if max_size == 0:
+            # Nothing to reserve:
+            self._page = None
+            self.addr = 0
+        else:
+            if sys.platform == "win32":
+                self._page = WinReservation(max_size)
+            else:
+                self._page = UnixReservation(max_size)
+            self.addr = self._page.addr
+            logger.debug("Reserved %s bytes at 0x%x", max_size, self.addr)
+        self.view = memoryview(b"")
+        self.grow(size)
+
+    def grow(self, size):
+        """ Grow the memory to the given size in bytes """
+        if size > self.max_size:
+            raise ValueError("Cannot grow beyond the reserved size")
+        if size < self.size:
+            raise ValueError("Cannot shrink memory")
+
+        # Commit whole pages of the operating system:
+        committed = -(-size // mmap.PAGESIZE) * mmap.PAGESIZE
+        committed = min(committed, self.max_size)
+        if committed > self._committed:
+            self._page.commit(self._committed, committed - self._committed)
+            self._committed = committed
+        self.size = size
+        if size > 0:
+            buf = (ctypes.c_char * size).from_address(self.addr)
+            # Prevent release of the memory while the buffer is in use:
+            buf._reservation = self._page
+            self.view = memoryview(buf).cast("B")
+
+    def read(self, address, size):
+        """ Read a range of bytes """
+        if address < 0 or address + size > self.size:
+            raise IndexError("Memory read out of bounds")
+        return bytes(self.view[address : address + size])
+
+    def write(self, address, data):
+        """ Write data at the given address """
+        if address < 0 or address + len(data) > self.size:
+            raise IndexError("Memory write out of bounds")
+        self.view[address : address + len(data)] = data
+
+
+class UnixReservation:
+    """ Reserve address space with mmap, and commit with mprotect """
+
+    PROT_NONE = 0
+    PROT_READ_WRITE = 1 | 2
+
+    def __init__(self, size):
+        # Nothing is mapped until the reservation succeeds:
+        self.addr = None
+        self.size = 0
+        libc = ctypes.CDLL(None, use_errno=True)
+        self._mmap = libc.mmap
+        self._mmap.argtypes = (
+            ctypes.c_void_p,
+            ctypes.c_size_t,
+            ctypes.c_int,
+            ctypes.c_int,
+            ctypes.c_int,
+            ctypes.c_long,
+        )
+        self._mmap.restype = ctypes.c_void_p
+        self._mprotect = libc.mprotect
+        self._mprotect.argtypes = (
+            ctypes.c_void_p,
+            ctypes.c_size_t,
+            ctypes.c_int,
+        )
+        self._munmap = libc.munmap
+        self._munmap.argtypes = (ctypes.c_void_p, ctypes.c_size_t)
+
+        flags = (
+            mmap.MAP_PRIVATE
+            | mmap.MAP_ANONYMOUS
+            | getattr(mmap, "MAP_NORESERVE", 0)
+        )
+        addr = self._mmap(None, size, self.PROT_NONE, flags, -1, 0)
+        if addr is None or addr == ctypes.c_void_p(-1).value:
+            errno = ctypes.get_errno()
+            raise MemoryError(
+                "Cannot reserve {} bytes: {}".format(size, os.strerror(errno))
+            )
+        self.addr = addr
+        self.size = size
+
+    def commit(self, offset, size):
+        """ Make a part of the reserved memory usable """
+        if self._mprotect(self.addr + offset, size, self.PROT_READ_WRITE):
+            errno = ctypes.get_errno()
+            raise MemoryError(
+                "Cannot commit {} bytes: {}".format(size, os.strerror(errno))
+            )
+
+    def __del__(self):
+        if self.addr is not None:
+            self._munmap(self.addr, self.size)
+
+
 uintt = ctypes.c_uint64 if struct.calcsize("P") == 8 else ctypes.c_uint32
 
 
@@ -83,3 +205,35 @@ class WinPage:
         vfree = kern.VirtualFree
         vfree.argtypes = (uintt,) * 3
         vfree(self.addr, self.size, 0x8000)
+
+
+class WinReservation:
+    """ Reserve address space with VirtualAlloc, and commit parts of it """
+
+    def __init__(self, size):
+        kern = ctypes.windll.kernel32
+        valloc = kern.VirtualAlloc
+        valloc.argtypes = (uintt,) * 4
+        valloc.restype = uintt
+        # Reserve with no access:
+        self.addr = valloc(0, size, 0x2000, 0x01)
+        self.size = size
+        if not self.addr:
+            raise MemoryError("Cannot reserve {} bytes".format(size))
+
+    def commit(self, offset, size):
+        """ Make a part of the reserved memory usable """
+        kern = ctypes.windll.kernel32
+        valloc = kern.VirtualAlloc
+        valloc.argtypes = (uintt,) * 4
+        valloc.restype = uintt
+        # Commit as read write memory:
+        if not valloc(self.addr + offset, size, 0x1000, 0x04):
+            raise MemoryError("Cannot commit {} bytes".format(size))
+
+    def __del__(self):
+        if self.addr:
+            kern = ctypes.windll.kernel32
+            vfree = kern.VirtualFree
+            vfree.argtypes = (uintt,) * 3
+            vfree(self.addr, 0, 0x8000)
@@ -6,8 +6,6 @@
 import logging
 import struct
 from contextlib import contextmanager
-from io import BytesIO
-from ...utils.leb128 import unsigned_leb128_decode, signed_leb128_decode
 from ..opcodes import ArgType, OPERANDS, REVERZ
 from ..components import Ref, Instruction, SECTION_IDS, DEFINITION_CLASSES
 from .. import components
@@ -18,12 +16,21 @@ logger = logging.getLogger("wasm")
 
 
 class BinaryFileReader:
-    """ Reader which can read binary wasm. """
+    """Reader which can read binary wasm.
+
+    The whole file is read into memory, and values are decoded from
+    offsets into a memoryview of the data. The bodies of functions are
+    decoded into instructions when they are first used.
+    """
 
     def __init__(self, f):
-        self._f = [f]
-        self._buffer = bytes()
+        if isinstance(f, (bytes, bytearray, memoryview)):
+            data = f
+        else:
+            data = f.read()
+        self._data = memoryview(data).cast("B")
         self._pos = 0
+        self._end = len(self._data)
 
         self._section_id_to_name = {}
         for name, id in SECTION_IDS.items():
@@ -49,14 +56,10 @@ class BinaryFileReader:
 
         # Read sections that contain definitions
         self._definitions = []
-        while True:
-            try:
-                section_id = self.read_byte()
-            except EOFError:
-                break
-
-            section_data = self.read_length_prefixed_bytes()
-            with self.push_data(section_data):
+        while self._pos < self._end:
+            section_id = self.read_byte()
+            section_size = self.read_uint()
+            with self.limit(section_size):
                 self.read_section(section_id)
 
         logger.info(
@@ -123,50 +126,88 @@ class BinaryFileReader:
         return mp[cls]()
 
     def read_exactly(self, amount=None):
-        if amount is not None and amount < 0:
+        """ Read the given amount of bytes, or all remaining bytes """
+        if amount is None:
+            amount = self._end - self._pos
+        elif amount < 0:
             raise ValueError("Cannot read {} bytes".format(amount))
-        data = self._f[-1].read(amount)
-        if amount is not None and len(data) != amount:
+        data = self.read_view(amount)
+        return data.tobytes()
+
+    def read_view(self, amount):
+        """ Get a view on the next amount of bytes, without copying """
+        pos = self._pos
+        if pos + amount > self._end:
             raise EOFError("Reading beyond end of file")
-        return data
+        self._pos = pos + amount
+        return self._data[pos : pos + amount]
 
     @contextmanager
-    def push_data(self, data):
-        """Process the given data first."""
-        self._f.append(BytesIO(data))
+    def limit(self, size):
+        """ Process the given amount of bytes, which must all be used """
+        end = self._end
+        self._end = self._pos + size
+        if self._end > end:
+            raise EOFError("Reading beyond end of file")
         yield
-        f = self._f.pop()
-        remaining = f.read()
-        assert remaining == bytes(), str(remaining)
+        assert self._pos == self._end, "{} bytes remaining".format(
+            self._end - self._pos
+        )
+        self._end = end
 
     def read_fmt(self, fmt):
         """ Read data according to the given format. """
         size = struct.calcsize(fmt)
-        data = self.read_exactly(size)
+        data = self.read_view(size)
         return struct.unpack(fmt, data)[0]
 
-    def bytefile(self, f):
-        b = f.read(1)
-        while b:
-            yield b[0]
-            b = f.read(1)
-
-    def __next__(self):
-        b = self.read_exactly(1)
-        return b[0]
-
     def read_byte(self):
         """ Read the value of a single byte """
-        data = self.read_exactly(1)
-        return data[0]
+        pos = self._pos
+        if pos >= self._end:
+            raise EOFError("Reading beyond end of file")
+        self._pos = pos + 1
+        return self._data[pos]
 
     def read_int(self):
         """ Read variable size signed int """
-        return signed_leb128_decode(self)
+        data = self._data
+        pos = self._pos
+        result = 0
+        shift = 0
+        while True:
+            if pos >= self._end:
+                raise EOFError("Reading beyond end of file")
+            byte = data[pos]
+            pos += 1
+            result |= (byte & 0x7F) << shift
+            shift += 7
+            if byte & 0x80 == 0:
+                break
+        self._pos = pos
+
+        if byte & 0x40:
+            # Sign extend:
+            result -= 1 << shift
+        return result
 
     def read_uint(self):
         """ Read variable size unsigned integer """
-        return unsigned_leb128_decode(self)
+        data = self._data
+        pos = self._pos
+        result = 0
+        shift = 0
+        while True:
+            if pos >= self._end:
+                raise EOFError("Reading beyond end of file")
+            byte = data[pos]
+            pos += 1
+            result |= (byte & 0x7F) << shift
+            shift += 7
+            if byte & 0x80 == 0:
+                break
+        self._pos = pos
+        return result
 
     def read_f32(self) -> float:
         """ Read a single f32 value """
@@ -187,8 +228,8 @@ class BinaryFileReader:
 
     def read_str(self):
         """ Read a string """
-        data = self.read_length_prefixed_bytes()
-        return data.decode("utf-8")
+        amount = self.read_uint()
+        return str(self.read_view(amount), "utf-8")
 
     def read_type(self):
         """ Read a wasm type """
@@ -364,24 +405,29 @@ class BinaryFileReader:
         return components.Elem(ref, offset, refs)
 
     def read_func_definition(self, index):
-        """ Read a function with locals and instructions. """
+        """Read a function with locals and instructions.
+
+        The instructions are not decoded here, but when they are first
+        used.
+        """
         # First read on the function body block:
-        body_data = self.read_length_prefixed_bytes()
+        body_size = self.read_uint()
 
-        with self.push_data(body_data):
+        with self.limit(body_size):
             num_local_pairs = self.read_uint()
             localz = []
             for _ in range(num_local_pairs):
                 c = self.read_uint()
                 t = self.read_type()
                 localz.extend([(None, t)] * c)
-            instructions = self.read_expression()
+            code = self.read_exactly()
 
         # Function type ref:
         ref = Ref("type", index=self._type4func[index])
 
         id = self.gen_id("func")
-        func = components.Func(id, ref, localz, instructions)
+        func = components.Func(id, ref, localz, [])
+        func.code = code
         self.add_definition("func", func)
         return func
 
@@ -399,6 +445,15 @@ class BinaryFileReader:
         return components.Custom(name, data)
 
 
+def read_code(code):
+    """ Decode the binary code of a function body into instructions """
+    reader = BinaryFileReader(code)
+    instructions = reader.read_expression()
+    if reader._pos != reader._end:
+        raise ValueError("Code continues after the end of the function")
+    return instructions
+
+
 # This is a list of functions to read specific argument types:
 rfm = {
     ArgType.TYPE: lambda reader: reader.read_type(),
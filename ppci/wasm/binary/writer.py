@@ -324,9 +324,13 @@ class BinaryFileWriter(BaseIoWriter):
             f3.write_type(loc_type)
 
         # Instructions:
-        for instruction in func.instructions:
-            f3.write_instruction(instruction)
-        f3.write(b"\x0b")  # end
+        if func.code is None:
+            for instruction in func.instructions:
+                f3.write_instruction(instruction)
+            f3.write(b"\x0b")  # end
+        else:
+            # The instructions were never decoded, so write the original:
+            f3.write(func.code)
         body = f3.f.getvalue()
         self.write_vu32(len(body))  # number of bytes in body
         self.write(body)
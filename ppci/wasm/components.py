@@ -667,12 +667,17 @@ class Func(Definition):
     * locals: a list of ($id, typ) tuples. The id can be None to indicate
       implicit id's (note that the id is offset by the parameters).
     * instructions: a list of instructions (may be given as tuples).
+    * code: the binary code of the instructions of a function loaded from
+      binary, until the instructions are decoded.
 
     """
 
     # todo: force local ids to be either int or str?
 
-    __slots__ = ("id", "ref", "locals", "instructions")  # ref to type
+    # ref to type, the instructions are stored in _instructions, or as
+    # binary code in _code when they are not decoded yet:
+    __slots__ = ("id", "ref", "locals", "_instructions", "_code")
+    _fields = ("id", "ref", "locals", "instructions")
 
     def _from_args(self, id, ref, locals, instructions):
         if not isinstance(ref, Ref):
@@ -683,6 +688,7 @@ class Func(Definition):
         self.id = check_id(id)
         self.ref = ref
         self.locals = tuple(locals)
+        self._code = None
         # Parse instructions
         if instructions and isinstance(instructions[0], Instruction):
             self.instructions = instructions  # assume all are instructions
@@ -696,6 +702,38 @@ class Func(Definition):
     def __repr__(self):
         return "<WASM-Func %s>" % (self.id)
 
+    def __getitem__(self, i):
+        return getattr(self, self._fields[i])
+
+    @property
+    def instructions(self):
+        """ The instructions, which are decoded from binary on first use """
+        if self._code is not None:
+            from .binary.reader import read_code
+
+            self._instructions = read_code(self._code)
+            self._code = None
+        return self._instructions
+
+    @instructions.setter
+    def instructions(self, instructions):
+        self._instructions = instructions
+        self._code = None
+
+    @property
+    def code(self):
+        """The binary code of the instructions, when they are not decoded.
+
+        The code ends with the end opcode. When the instructions are
+        decoded, this is None.
+        """
+        return self._code
+
+    @code.setter
+    def code(self, code):
+        self._instructions = None
+        self._code = code
+
     def to_string(self):
         """ Render function def as text """
         from .text.writer import TextWriter
@@ -19,7 +19,12 @@ __all__ = ("instantiate",)
 
 
 def instantiate(
-    module, imports=None, target="native", reporter=None, cache_file=None
+    module,
+    imports=None,
+    target="native",
+    reporter=None,
+    cache_file=None,
+    lazy=False,
 ):
     """Instantiate a wasm module.
 
@@ -30,7 +35,14 @@ def instantiate(
                 Use 'python' to generate python code. This option is slower
                 but more reliable.
         reporter: A reporter which can record detailed compilation information.
-        cache_file: a file to use as cache
+        cache_file: cache for natively compiled code. Either None for no
+            caching, True to use the default cache directory, a directory
+            name or a :class:`ppci.utils.cache.DiskCache` instance. The
+            cache is keyed on the module contents, the host architecture
+            and the ppci version. The cache is not used in lazy mode.
+        lazy: compile each function on its first call, instead of
+            compiling all functions up front. This reduces the startup
+            time of large modules of which only a few functions are used.
 
     """
     if imports is None:
@@ -66,9 +78,13 @@ def instantiate(
         symbols["wasm_rt_{}".format(func_name)] = func
 
     if target == "native":
-        instance = native_instantiate(module, symbols, reporter, cache_file)
+        instance = native_instantiate(
+            module, symbols, reporter, cache_file, lazy=lazy
+        )
     elif target == "python":
-        instance = python_instantiate(module, symbols, reporter, cache_file)
+        instance = python_instantiate(
+            module, symbols, reporter, cache_file, lazy=lazy
+        )
     else:
         raise ValueError("Unknown instantiation target {}".format(target))
 
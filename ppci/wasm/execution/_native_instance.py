@@ -2,14 +2,19 @@
 
 """
 
+import ctypes
+import io
+import json
 import logging
-import os
-import shelve
 import struct
 
+from ...binutils.objectfile import ObjectFile
+from ...utils.cache import make_key
 from ...utils.codepage import load_obj, MemoryPage
+from ...utils.memory_page import ReservedMemoryPage
 from ...irutils import verify_module
 from .. import wasm_to_ir
+from ..wasm2ppci import WasmToIrCompiler, lazy_body_name
 from ..components import Table
 from ..util import PAGE_SIZE
 from ._base_instance import ModuleInstance, WasmMemory, WasmGlobal
@@ -17,26 +22,30 @@ from ._base_instance import ModuleInstance, WasmMemory, WasmGlobal
 
 logger = logging.getLogger("instantiate")
 
+# The maximum amount of pages of a 32-bit wasm memory (4 GiB):
+MAX_PAGES = 0x10000
 
-def native_instantiate(module, imports, reporter, cache_file):
+
+def native_instantiate(module, imports, reporter, cache_file, lazy=False):
     """ Load wasm module native """
-    from ...api import ir_to_object, get_current_arch
+    from ...api import ir_to_object, get_current_arch, get_cache
 
     logger.info("Instantiating wasm module as native code")
     arch = get_current_arch()
-    # key = (arch, module)
-    # TODO: think of clever caching trickery:
-    cache_file = None
-    if cache_file and os.path.exists(cache_file):
-        logger.info("Using cached object from %s", cache_file)
-        with shelve.open(cache_file) as s:
-            obj = s["obj"]
-            ppci_module = s["ppci_module"]
+    if lazy:
+        return native_instantiate_lazy(module, imports, reporter, arch)
+
+    cache = get_cache(cache_file)
+    if cache is not None:
+        key = make_key("wasm-native", module.to_bytes(), arch.make_id_str())
+        entry = _load_cache_entry(cache, key)
+    else:
+        entry = None
+
+    if entry:
+        logger.info("Using cached object from %s", cache)
+        obj, function_names, global_names = entry
     else:
-        # TODO: use cache here to short circuit re-compilation
-        # hash(key)
-        # print(hash(key))
-        # hgkfdg
         ppci_module = wasm_to_ir(
             module, arch.info.get_type_info("ptr"), reporter=reporter
         )
@@ -46,18 +55,80 @@ def native_instantiate(module, imports, reporter, cache_file):
         # from ...api import optimize
         # optimize(ppci_module, level=2, reporter=reporter)
 
-        obj = ir_to_object([ppci_module], arch, debug=True, reporter=reporter)
-        if cache_file:
-            logger.info("Saving object to %s for later use", cache_file)
-            with shelve.open(cache_file) as s:
-                s["obj"] = obj
-                s["ppci_module"] = ppci_module
+        obj = ir_to_object(
+            [ppci_module],
+            arch,
+            debug=True,
+            reporter=reporter,
+            regalloc="linear",
+        )
+        function_names = ppci_module._wasm_function_names
+        global_names = [g[1].name for g in ppci_module._wasm_global_names]
+        if cache is not None:
+            logger.info("Saving object to %s for later use", cache)
+            _save_cache_entry(cache, key, obj, function_names, global_names)
+    instance = NativeModuleInstance(obj, imports)
+    instance._wasm_function_names = function_names
+    instance._wasm_global_names = global_names
+    return instance
+
+
+def native_instantiate_lazy(module, imports, reporter, arch):
+    """Load wasm module native, compiling functions on first use.
+
+    Only the global variables, tables and initialization code are
+    compiled up front.
+    """
+    from ...api import ir_to_object
+
+    compiler = WasmToIrCompiler(arch.info.get_type_info("ptr"))
+    ppci_module = compiler.generate(module, lazy=True)
+    reporter.dump_ir(ppci_module)
+    verify_module(ppci_module)
+    obj = ir_to_object(
+        [ppci_module],
+        arch,
+        debug=True,
+        reporter=reporter,
+        regalloc="linear",
+    )
     instance = NativeModuleInstance(obj, imports)
     instance._wasm_function_names = ppci_module._wasm_function_names
-    instance._wasm_global_names = ppci_module._wasm_global_names
+    instance._wasm_global_names = [
+        g[1].name for g in ppci_module._wasm_global_names
+    ]
+    instance._init_lazy_functions(compiler, arch)
     return instance
 
 
+def _save_cache_entry(cache, key, obj, function_names, global_names):
+    """Store an object and the wasm name maps as a single cache entry.
+
+    The entry is a length prefixed json header with the names, followed
+    by the object file in binary format.
+    """
+    header = json.dumps(
+        {"functions": function_names, "globals": global_names}
+    ).encode("utf8")
+    f = io.BytesIO()
+    f.write(struct.pack("<I", len(header)))
+    f.write(header)
+    obj.save(f)
+    cache.put(key, f.getvalue())
+
+
+def _load_cache_entry(cache, key):
+    """ Load object and name maps from the cache, or None on a miss. """
+    data = cache.get(key)
+    if data is None:
+        return None
+
+    (header_size,) = struct.unpack_from("<I", data, 0)
+    header = json.loads(data[4 : 4 + header_size].decode("utf8"))
+    obj = ObjectFile.load(io.BytesIO(data[4 + header_size :]))
+    return obj, header["functions"], header["globals"]
+
+
 class NativeModuleInstance(ModuleInstance):
     """ Wasm module loaded as natively compiled code """
 
@@ -88,6 +159,61 @@ class NativeModuleInstance(ModuleInstance):
                 imports[name] = imp_obj
 
         self._code_module = load_obj(obj, imports=imports)
+        self._lazy_modules = []
+
+    def _init_lazy_functions(self, compiler, arch):
+        """Fill the lazy table with stubs which compile on first call.
+
+        Each stub compiles the function body, loads it into memory and
+        patches the lazy table entry, so that further calls go to the
+        compiled code directly.
+        """
+        self._lazy_compiler = compiler
+        self._lazy_arch = arch
+        self._lazy_stubs = []
+        for index, gen_function in enumerate(compiler.gen_functions):
+            name = gen_function[0].name
+            ftype = type(getattr(self._code_module, name))
+            stub = ftype(self._make_lazy_stub(index, ftype))
+            self._lazy_stubs.append(stub)
+            address = ctypes.cast(stub, ctypes.c_void_p).value
+            self._set_lazy_table_entry(index, address)
+
+    def _make_lazy_stub(self, index, ftype):
+        def stub(*args):
+            address = self._compile_lazy_function(index)
+            return ftype(address)(*args)
+
+        return stub
+
+    def _compile_lazy_function(self, index):
+        """ Compile and load a single function, returns its address """
+        from ...api import ir_to_object
+
+        ppci_module = self._lazy_compiler.generate_lazy_function(index)
+        logger.info("Lazily compiling %s", ppci_module.name)
+        verify_module(ppci_module)
+        obj = ir_to_object(
+            [ppci_module], self._lazy_arch, debug=True, regalloc="linear"
+        )
+
+        # Refer to the code and data which is already loaded:
+        imports = {
+            name: self._code_module.get_symbol_address(name)
+            for name in obj.get_undefined_symbols()
+        }
+        code_module = load_obj(obj, imports=imports)
+        self._lazy_modules.append(code_module)
+
+        name = self._lazy_compiler.gen_functions[index][0].name
+        address = code_module.get_symbol_address(lazy_body_name(name))
+        self._set_lazy_table_entry(index, address)
+        return address
+
+    def _set_lazy_table_entry(self, index, address):
+        offset = self._code_module.get_symbol_offset("wasm_lazy_table")
+        self._code_module._data_page.seek(offset + 8 * index)
+        self._code_module._data_page.write(struct.pack("Q", address))
 
     def _run_init(self):
         self._code_module._run_init()
@@ -99,39 +225,40 @@ class NativeModuleInstance(ModuleInstance):
     def memory_grow(self, amount: int) -> int:
         """Grow memory and return the old size.
 
-        Current strategy:
-        - claim new memory
-        - copy all data
-        - free old memory
-        - update wasm memory base pointer
+        The address space for the maximum size of the memory is reserved
+        when the memory is created, so growing commits more of this space
+        in place, and the memory base pointer stays the same.
         """
-        max_size = self._memories[0].max_size
         old_size = self.memory_size()
         new_size = old_size + amount
 
-        # Keep memory within sensible bounds:
-        if new_size >= 0x10000:
+        if new_size * PAGE_SIZE > self._memory_data_page.max_size:
             return -1
 
-        if max_size is not None and new_size > max_size:
+        try:
+            self._memory_data_page.grow(new_size * PAGE_SIZE)
+        except MemoryError:
+            logger.exception("Could not grow memory to %s pages", new_size)
             return -1
-
-        # Read old data:
-        self._memory_data_page.seek(0)
-        old_data = self._memory_data_page.read(old_size * PAGE_SIZE)
-
-        # Create new page and fill with old data:
-        self._memory_data_page = MemoryPage(new_size * PAGE_SIZE)
-        self._memory_data_page.seek(0)
-        self._memory_data_page.write(old_data)
-
-        # Update pointer:
-        self.set_mem_base_ptr(self._memory_data_page.addr)
         return old_size
 
     def memory_create(self, min_size, max_size):
         assert len(self._memories) == 0
-        self._memory_data_page = MemoryPage(min_size * PAGE_SIZE)
+        # Reserve the address space for the largest possible memory:
+        max_pages = MAX_PAGES if max_size is None else min(max_size, MAX_PAGES)
+        while True:
+            try:
+                self._memory_data_page = ReservedMemoryPage(
+                    min_size * PAGE_SIZE, max_pages * PAGE_SIZE
+                )
+                break
+            except MemoryError:
+                # Not enough address space, for example on 32-bit hosts.
+                # Reserve less, so that growing beyond it fails:
+                if max_pages <= min_size:
+                    raise
+                max_pages = max(min_size, max_pages // 2)
+                logger.warning("Reserving memory for %s pages", max_pages)
         mem0 = NativeWasmMemory(self, min_size, max_size)
         self._memories.append(mem0)
         self.set_mem_base_ptr(self._memory_data_page.addr)
@@ -163,18 +290,19 @@ class NativeWasmMemory(WasmMemory):
 
     def memory_size(self) -> int:
         """ return memory size in pages """
-        return self._memory_data_page.size // PAGE_SIZE
+        return self._instance.memory_size()
+
+    @property
+    def view(self):
+        """ A memoryview of the memory, which does not copy the data """
+        return self._instance._memory_data_page.view
 
     def write(self, address: int, data):
         """ Write some data to memory """
-        self._instance._memory_data_page.seek(address)
-        self._instance._memory_data_page.write(data)
+        self._instance._memory_data_page.write(address, data)
 
     def read(self, address: int, size: int) -> bytes:
-        self._instance._memory_data_page.seek(address)
-        data = self._instance._memory_data_page.read(size)
-        assert len(data) == size
-        return data
+        return self._instance._memory_data_page.read(address, size)
 
 
 class NativeWasmGlobal(WasmGlobal):
@@ -184,7 +312,7 @@ class NativeWasmGlobal(WasmGlobal):
 
     def _get_ptr(self):
         # print('Getting address of', self.name)
-        vpointer = getattr(self._code_obj, self.name[1].name)
+        vpointer = getattr(self._code_obj, self.name)
         return vpointer
 
     def read(self):
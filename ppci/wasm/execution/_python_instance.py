@@ -6,22 +6,29 @@ import io
 from types import ModuleType
 from ...arch.arch_info import TypeInfo
 from ...irutils import verify_module
+from ...lang.python.ir2py import IrToPythonCompiler
 from ... import ir
 from ..components import Table
 from .. import wasm_to_ir
+from ..wasm2ppci import WasmToIrCompiler, lazy_body_name
 from ..util import PAGE_SIZE
 from ._base_instance import ModuleInstance, WasmMemory, WasmGlobal
 
 logger = logging.getLogger("instantiate")
 
 
-def python_instantiate(module, imports, reporter, cache_file):
+def python_instantiate(module, imports, reporter, cache_file, lazy=False):
     """ Load wasm module as a PythonModuleInstance """
     from ...api import ir_to_python
 
     logger.info("Instantiating wasm module as python")
     ptr_info = TypeInfo(4, 4)
-    ppci_module = wasm_to_ir(module, ptr_info, reporter=reporter)
+    if lazy:
+        compiler = WasmToIrCompiler(ptr_info)
+        ppci_module = compiler.generate(module, lazy=True)
+        reporter.dump_ir(ppci_module)
+    else:
+        ppci_module = wasm_to_ir(module, ptr_info, reporter=reporter)
     verify_module(ppci_module)
     f = io.StringIO()
     ir_to_python([ppci_module], f, reporter=reporter)
@@ -33,6 +40,8 @@ def python_instantiate(module, imports, reporter, cache_file):
     instance = PythonModuleInstance(_py_module, imports)
     instance._wasm_function_names = ppci_module._wasm_function_names
     instance._wasm_global_names = ppci_module._wasm_global_names
+    if lazy:
+        instance._init_lazy_functions(compiler)
     return instance
 
 
@@ -62,6 +71,57 @@ class PythonModuleInstance(ModuleInstance):
 
             self._py_module._irpy_externals[name] = obj
 
+    def _init_lazy_functions(self, compiler):
+        """Fill the lazy table with stubs which compile on first call.
+
+        Each stub generates python code for the function body, and replaces
+        all references to the function by this body.
+        """
+        self._lazy_compiler = compiler
+        py_module = self._py_module
+        for index in range(len(compiler.gen_functions)):
+            func_ptr = len(py_module._irpy_func_pointers)
+            py_module._irpy_func_pointers.append(self._make_lazy_stub(index))
+            slot = py_module.wasm_lazy_table + 4 * index
+            py_module.store_ptr(func_ptr, slot)
+
+    def _make_lazy_stub(self, index):
+        def stub(*args):
+            return self._compile_lazy_function(index)(*args)
+
+        return stub
+
+    def _compile_lazy_function(self, index):
+        """ Generate and load python code for a single function """
+        ppci_module = self._lazy_compiler.generate_lazy_function(index)
+        logger.info("Lazily compiling %s", ppci_module.name)
+        verify_module(ppci_module)
+        # Generate code without header, since the generated code is
+        # added to the already loaded module:
+        f = io.StringIO()
+        IrToPythonCompiler(f, None).generate(ppci_module)
+        pycode = compile(f.getvalue(), "<string>", "exec")
+        py_module = self._py_module
+        for external in ppci_module.externals:
+            if external.name not in py_module._irpy_externals:
+                value = getattr(py_module, external.name)
+                py_module._irpy_externals[external.name] = value
+        exec(pycode, py_module.__dict__)
+
+        name = self._lazy_compiler.gen_functions[index][0].name
+        body = getattr(py_module, lazy_body_name(name))
+
+        # Patch the stub, and the function pointer used by tables:
+        func_pointers = py_module._irpy_func_pointers
+        stub_ptr = py_module.load_ptr(py_module.wasm_lazy_table + 4 * index)
+        func_pointers[stub_ptr] = body
+        trampoline = getattr(py_module, name)
+        func_pointers[func_pointers.index(trampoline)] = body
+        setattr(py_module, name, body)
+        if name in py_module._irpy_externals:
+            py_module._irpy_externals[name] = body
+        return body
+
     def _run_init(self):
         self._py_module._run_init()
 
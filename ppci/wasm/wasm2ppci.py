@@ -41,6 +41,7 @@ class WasmToIrCompiler:
     def __init__(self, ptr_info):
         self.builder = irutils.Builder()
         self.blocknr = 0
+        self._references = None
         if not isinstance(ptr_info, TypeInfo):
             raise TypeError("Expected ptr_info to be TypeInfo")
         self.ptr_info = ptr_info
@@ -171,7 +172,16 @@ class WasmToIrCompiler:
         for opcode in ["f64.promote_f32", "f32.demote_f64"]:
             self._opcode_dispatch[opcode] = self.gen_promote_instruction
 
-    def generate(self, wasm_module: components.Module):
+    def generate(self, wasm_module: components.Module, lazy=False):
+        """Generate an ir-module for the given wasm module.
+
+        Args:
+            wasm_module: the wasm module to compile.
+            lazy: when set, the functions are not compiled. Instead each
+                function calls the function pointer in its slot of the
+                ``wasm_lazy_table`` variable. The bodies can be compiled
+                later on with :meth:`generate_lazy_function`.
+        """
         assert isinstance(wasm_module, components.Module)
 
         # Create module:
@@ -198,8 +208,15 @@ class WasmToIrCompiler:
             self.gen_definition(definition)
 
         # Generate functions:
-        for ppci_function, signature, wasm_function in self.gen_functions:
-            self.generate_function(ppci_function, signature, wasm_function)
+        if lazy:
+            self.gen_lazy_table()
+            for index, (ppci_function, signature, _) in enumerate(
+                self.gen_functions
+            ):
+                self.gen_lazy_trampoline(ppci_function, signature, index)
+        else:
+            for ppci_function, signature, wasm_function in self.gen_functions:
+                self.generate_function(ppci_function, signature, wasm_function)
 
         # Generate run_init function:
         self.gen_init_procedure()
@@ -213,6 +230,58 @@ class WasmToIrCompiler:
 
         return self.builder.module
 
+    def generate_lazy_function(self, index):
+        """Generate an ir-module with the body of a single function.
+
+        This must be called after :meth:`generate` was called in lazy mode.
+        The body is named after the function, with a ``_body`` suffix. Other
+        functions and global variables are referred to by name.
+
+        Args:
+            index: the slot in the lazy table, which is the index of the
+                function amongst the functions defined by the module.
+        """
+        trampoline, signature, wasm_function = self.gen_functions[index]
+        name = lazy_body_name(trampoline.name)
+        self.debug_db = debuginfo.DebugDb()
+        self.builder.module = ir.Module(name, debug_db=self.debug_db)
+        self._runtime_functions = {}
+        self._references = {}
+        try:
+            ppci_function = self.new_function(name, signature)
+            self.generate_function(ppci_function, signature, wasm_function)
+        finally:
+            self._references = None
+        return self.builder.module
+
+    def get_reference(self, value):
+        """Get a reference to a function or variable of the main module.
+
+        When generating a lazy function body, the value is declared as an
+        external of the module containing the body.
+        """
+        if self._references is None:
+            return value
+
+        if value.name not in self._references:
+            if isinstance(value, (ir.Variable, ir.ExternalVariable)):
+                external = ir.ExternalVariable(value.name)
+            else:
+                if isinstance(value, ir.SubRoutine):
+                    argument_types = [a.ty for a in value.arguments]
+                else:
+                    argument_types = value.argument_types
+
+                if isinstance(value, (ir.Function, ir.ExternalFunction)):
+                    external = ir.ExternalFunction(
+                        value.name, argument_types, value.return_ty
+                    )
+                else:
+                    external = ir.ExternalProcedure(value.name, argument_types)
+            self.builder.module.add_external(external)
+            self._references[value.name] = external
+        return self._references[value.name]
+
     def gen_definition(self, definition):
         """ Generate code for a single wasm definition. """
         if isinstance(definition, components.Type):
@@ -348,7 +417,12 @@ class WasmToIrCompiler:
         else:
             name = "_unnamed_{}".format(definition.id)
 
-        # Create ir-function:
+        ppci_function = self.new_function(name, signature)
+        self.functions.append((ppci_function, signature))
+        self.gen_functions.append((ppci_function, signature, definition))
+
+    def new_function(self, name, signature):
+        """ Create an ir-function for the given wasm signature. """
         binding = ir.Binding.GLOBAL
         if signature.results:
             if len(signature.results) == 1:
@@ -362,9 +436,49 @@ class WasmToIrCompiler:
                 ppci_function = self.builder.new_procedure(name, binding)
         else:
             ppci_function = self.builder.new_procedure(name, binding)
+        return ppci_function
 
-        self.functions.append((ppci_function, signature))
-        self.gen_functions.append((ppci_function, signature, definition))
+    def gen_lazy_table(self):
+        """ Create a table with a function pointer for each function. """
+        size = max(len(self.gen_functions), 1) * self.ptr_info.size
+        self.lazy_table_var = ir.Variable(
+            "wasm_lazy_table",
+            ir.Binding.GLOBAL,
+            size,
+            self.ptr_info.alignment,
+        )
+        self.builder.module.add_variable(self.lazy_table_var)
+
+    def gen_lazy_trampoline(self, ppci_function, signature, index):
+        """Generate a function which forwards to a lazy table entry.
+
+        The lazy table initially contains pointers to stubs which compile
+        the function on first use, and are then replaced by the compiled
+        function.
+        """
+        self.builder.set_function(ppci_function)
+        entryblock = self.new_block()
+        self.builder.set_block(entryblock)
+        ppci_function.entry = entryblock
+        parameters = self.gen_function_signature(ppci_function, signature)
+
+        offset = self.emit(
+            ir.Const(index * self.ptr_info.size, "offset", ir.ptr)
+        )
+        address = self.emit(
+            ir.add(self.lazy_table_var, offset, "slot_address", ir.ptr)
+        )
+        func_ptr = self.emit(ir.Load(address, "func_ptr", ir.ptr))
+        if isinstance(ppci_function, ir.Function):
+            value = self.emit(
+                ir.FunctionCall(
+                    func_ptr, parameters, "call", ppci_function.return_ty
+                )
+            )
+            self.emit(ir.Return(value))
+        else:
+            self.emit(ir.ProcedureCall(func_ptr, parameters))
+            self.emit(ir.Exit())
 
     def gen_table_definition(self, definition):
         """ Create room for a table of function pointers. """
@@ -549,39 +663,19 @@ class WasmToIrCompiler:
             self.debug_db.enter(name, dbg_typ)
             return dbg_typ
 
-    def gen_expression(self, expression):
-        self.stack = []
-        for instruction in expression:
-            self.generate_instruction(instruction)
-        assert len(self.stack) == 1
-        return self.stack[-1]
-
-    def generate_function(self, ppci_function, signature, wasm_function):
-        """ Generate code for a single function """
-        self.logger.info(
-            "Generating wasm function %s %s",
-            ppci_function.name,
-            signature.to_string(),
-        )
-        self.stack = []
-        self.block_stack = []
+    def gen_function_signature(self, ppci_function, signature):
+        """Add parameters and debug info to a function.
 
+        Returns the list of created parameters.
+        """
         # Create correct debug signature for function:
-
         if signature.results and len(signature.results) == 1:
             dbg_return_type = self.get_debug_type(signature.results[0])
         else:
             dbg_return_type = self.get_debug_type("void")
-        self.builder.set_function(ppci_function)
-
-        entryblock = self.new_block()
-        self.builder.set_block(entryblock)
-        ppci_function.entry = entryblock
 
+        parameters = []
         dbg_arg_types = []
-        self.locals = []  # todo: ak: why store on self?
-
-        # First locals are the function arguments:
         for i, a_typ in enumerate(signature.params):
             ir_typ = self.get_ir_type(a_typ[1])
             ir_arg = ir.Parameter("param{}".format(i), ir_typ)
@@ -591,13 +685,7 @@ class WasmToIrCompiler:
                 )
             )
             ppci_function.add_parameter(ir_arg)
-            size = ir_typ.size
-            alignment = size
-            alloc = self.emit(ir.Alloc("alloc{}".format(i), size, alignment))
-            addr = self.emit(ir.AddressOf(alloc, "local{}".format(i)))
-            self.locals.append((ir_typ, addr))
-            # Store parameter into local variable:
-            self.emit(ir.Store(ir_arg, addr))
+            parameters.append(ir_arg)
 
         # Insert multiple return values data area pointer:
         if signature.results and len(signature.results) > 1:
@@ -605,6 +693,7 @@ class WasmToIrCompiler:
                 "multiple_return_ptr", ir.ptr
             )
             ppci_function.add_parameter(multiple_return_data_ptr)
+            parameters.append(multiple_return_data_ptr)
             dbg_void_ptr = debuginfo.DebugPointerType(
                 self.get_debug_type("void")
             )
@@ -620,6 +709,47 @@ class WasmToIrCompiler:
             dbg_arg_types,
         )
         self.debug_db.enter(ppci_function, db_function_info)
+        return parameters
+
+    def gen_expression(self, expression):
+        self.stack = []
+        for instruction in expression:
+            self.generate_instruction(instruction)
+        assert len(self.stack) == 1
+        return self.stack[-1]
+
+    def generate_function(self, ppci_function, signature, wasm_function):
+        """ Generate code for a single function """
+        self.logger.info(
+            "Generating wasm function %s %s",
+            ppci_function.name,
+            signature.to_string(),
+        )
+        self.stack = []
+        self.block_stack = []
+
+        self.builder.set_function(ppci_function)
+
+        entryblock = self.new_block()
+        self.builder.set_block(entryblock)
+        ppci_function.entry = entryblock
+
+        parameters = self.gen_function_signature(ppci_function, signature)
+        self.locals = []  # todo: ak: why store on self?
+
+        # First locals are the function arguments:
+        for i, ir_arg in enumerate(parameters[: len(signature.params)]):
+            ir_typ = ir_arg.ty
+            size = ir_typ.size
+            alignment = size
+            alloc = self.emit(ir.Alloc("alloc{}".format(i), size, alignment))
+            addr = self.emit(ir.AddressOf(alloc, "local{}".format(i)))
+            self.locals.append((ir_typ, addr))
+            # Store parameter into local variable:
+            self.emit(ir.Store(ir_arg, addr))
+
+        if signature.results and len(signature.results) > 1:
+            multiple_return_data_ptr = parameters[-1]
 
         # Next are the rest of the locals:
         for i, local in enumerate(wasm_function.locals, len(self.locals)):
@@ -971,11 +1101,13 @@ class WasmToIrCompiler:
 
     def gen_global_get(self, instruction):
         ty, addr = self.globalz[instruction.args[0].index]
+        addr = self.get_reference(addr)
         value = self.emit(ir.Load(addr, "global_get", ty))
         self.push_value(value)
 
     def gen_global_set(self, instruction):
         ty, addr = self.globalz[instruction.args[0].index]
+        addr = self.get_reference(addr)
         value = self.pop_value(ir_typ=ty)
         self.emit(ir.Store(value, addr))
 
@@ -1108,7 +1240,11 @@ class WasmToIrCompiler:
             base = self.emit(ir.Cast(base, "cast", ir.ptr))
         offset = self.emit(ir.Const(offset, "offset", ir.ptr))
         address = self.emit(ir.add(base, offset, "address", ir.ptr))
-        mem0 = self.emit(ir.Load(self.memory_base_address, "mem0", ir.ptr))
+        mem0 = self.emit(
+            ir.Load(
+                self.get_reference(self.memory_base_address), "mem0", ir.ptr
+            )
+        )
         address = self.emit(ir.add(mem0, address, "address", ir.ptr))
         return address
 
@@ -1291,7 +1427,7 @@ class WasmToIrCompiler:
         # Call another function!
         idx = instruction.args[0].index
         ir_function, signature = self.functions[idx]
-        self._gen_call_helper(ir_function, signature)
+        self._gen_call_helper(self.get_reference(ir_function), signature)
 
     def gen_call_indirect_instruction(self, instruction):
         """ Call another function by pointer! """
@@ -1309,7 +1445,12 @@ class WasmToIrCompiler:
             )
         )
         element_address = self.emit(
-            ir.add(self.table_var, element_offset, "element_address", ir.ptr)
+            ir.add(
+                self.get_reference(self.table_var),
+                element_offset,
+                "element_address",
+                ir.ptr,
+            )
         )
         func_ptr = self.emit(ir.Load(element_address, "func_ptr", ir.ptr))
         # TODO: how to check function type during runtime?
@@ -1538,6 +1679,11 @@ class WasmToIrCompiler:
             self.push_value(value)
 
 
+def lazy_body_name(name):
+    """ Get the name of the body of a lazily compiled function. """
+    return "{}_body".format(name)
+
+
 class BlockLevel:
     """Store some info about blocks.
 
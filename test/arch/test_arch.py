@@ -1,8 +1,14 @@
 """ Test architecture related classes """
 
 
+import tempfile
 import unittest
+from unittest import mock
+from ppci.arch.msp430 import Msp430Arch
+from ppci.arch.riscv import RiscvArch
 from ppci.arch.stack import Frame, FramePointerLocation
+from ppci.arch.target_list import target_names, get_target_class
+from ppci.utils.cache import DiskCache
 
 
 class FrameTestCase(unittest.TestCase):
@@ -20,5 +26,65 @@ class FrameTestCase(unittest.TestCase):
         self.assertEqual(5, frame.stacksize)
 
 
+class TargetListTestCase(unittest.TestCase):
+    """ Test the lazy creation of targets """
+    def test_target_classes(self):
+        for name in target_names:
+            self.assertEqual(name, get_target_class(name).name)
+
+    def test_assembler_created_on_use(self):
+        arch = RiscvArch()
+        self.assertIsNone(arch._assembler)
+        assembler = arch.assembler
+        self.assertIs(assembler, arch.assembler)
+
+
+class RuntimeCacheTestCase(unittest.TestCase):
+    """ Test the caching of the compiler runtime between processes """
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_runtime_cached(self):
+        cache = DiskCache(self.tmpdir.name)
+        arch = Msp430Arch()
+        arch.runtime_cache = cache
+        obj = arch.runtime
+        self.assertEqual(1, cache.misses)
+
+        # A new instance loads the runtime from the cache:
+        arch = Msp430Arch()
+        arch.runtime_cache = cache
+        obj2 = arch.runtime
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(obj.get_symbol('__shl').value,
+                         obj2.get_symbol('__shl').value)
+        self.assertEqual(obj.byte_size, obj2.byte_size)
+
+    def test_runtime_sources_changed(self):
+        """ A change to the runtime sources does not use the cached one """
+        cache = DiskCache(self.tmpdir.name)
+        arch = Msp430Arch()
+        arch.runtime_cache = cache
+        sources = arch.get_runtime_sources()
+        self.assertTrue(any(b'RT_ASM_SRC' in source for source in sources))
+        arch.runtime
+
+        arch = Msp430Arch()
+        arch.runtime_cache = cache
+        with mock.patch.object(
+            Msp430Arch, 'get_runtime_sources', return_value=[b'changed']
+        ):
+            arch.runtime
+        self.assertEqual((0, 2), (cache.hits, cache.misses))
+
+    def test_no_cache(self):
+        arch = RiscvArch()
+        arch.runtime_cache = None
+        self.assertIs(arch.runtime, arch.get_compiler_rt_lib())
+
+
 if __name__ == '__main__':
     unittest.main()
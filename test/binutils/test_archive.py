@@ -17,6 +17,43 @@ class ArchiveFileTestCase(unittest.TestCase):
         lib2 = get_archive(f2)
         self.assertTrue(lib2)
 
+    def test_save_load_binary(self):
+        """ Test binary format of archives. """
+        arch = get_arch('msp430')
+        obj1 = ObjectFile(arch)
+        obj1.create_section('foo').add_data(bytes(range(7)))
+        obj1.add_symbol(0, 'syscall', 'global', 0, 'foo', 'func', 0)
+        obj2 = ObjectFile(arch)
+        obj2.create_section('foo')
+        obj2.add_symbol(0, 'putc', 'global', None, None, 'func', 0)
+        lib = archive([obj1, obj2])
+        f = io.BytesIO()
+        lib.save(f)
+        lib2 = get_archive(io.BytesIO(f.getvalue()))
+        self.assertEqual({'syscall': 0}, lib2.symbol_index)
+        self.assertEqual([obj1, obj2], list(lib2))
+
+    def test_symbol_index(self):
+        """ Test that the symbol index is stored in the archive. """
+        arch = get_arch('msp430')
+        obj1 = ObjectFile(arch)
+        obj1.create_section('foo')
+        obj1.add_symbol(0, 'a', 'global', 0, 'foo', 'func', 0)
+        obj1.add_symbol(1, 'b', 'global', None, None, 'func', 0)
+        obj1.add_symbol(2, 'c', 'local', 0, 'foo', 'func', 0)
+        obj2 = ObjectFile(arch)
+        obj2.create_section('foo')
+        obj2.add_symbol(0, 'b', 'global', 0, 'foo', 'func', 0)
+        obj2.add_symbol(1, 'a', 'global', 0, 'foo', 'func', 0)
+        lib = archive([obj1, obj2])
+        self.assertEqual({'a': 0, 'b': 1}, lib.symbol_index)
+        f = io.StringIO()
+        lib.save(f)
+        lib2 = get_archive(io.StringIO(f.getvalue()))
+        self.assertEqual({'a': 0, 'b': 1}, lib2.symbol_index)
+        self.assertIs(lib2.find_symbol('b'), lib2.get_object(1))
+        self.assertIsNone(lib2.find_symbol('c'))
+
     def test_linking(self):
         """ Test pull in of undefined symbols from libraries. """
         arch = get_arch('msp430')
@@ -41,6 +78,30 @@ class ArchiveFileTestCase(unittest.TestCase):
         lib2 = archive([obj4, obj5])
 
         obj = link([obj1], libraries=[lib1, lib2])
+        self.assertEqual(
+            {'printf', 'putc', 'syscall'}, set(obj.get_defined_symbols()))
+
+    def test_linking_only_loads_used_objects(self):
+        """ Only objects defining required symbols are loaded. """
+        arch = get_arch('msp430')
+        obj1 = ObjectFile(arch)
+        obj1.create_section('foo')
+        obj1.add_symbol(0, 'b', 'global', None, None, 'func', 0)  # undefined
+        objs = []
+        for i in range(10):
+            obj = ObjectFile(arch)
+            obj.create_section('foo').add_data(bytes(2))
+            obj.add_symbol(0, 'f{}'.format(i), 'global', 0, 'foo', 'func', 0)
+            objs.append(obj)
+        objs[7].add_symbol(1, 'b', 'global', 1, 'foo', 'func', 0)
+        f = io.BytesIO()
+        archive(objs).save(f)
+        lib = get_archive(io.BytesIO(f.getvalue()))
+        obj = link([obj1], libraries=[lib])
+        self.assertIn('f7', obj.get_defined_symbols())
+        self.assertEqual(
+            [False] * 7 + [True] + [False] * 2,
+            [o is not None for o in lib._objs])
 
 
 if __name__ == '__main__':
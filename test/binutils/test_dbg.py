@@ -79,6 +79,50 @@ class DebuggerTestCase(unittest.TestCase):
         addr = self.debugger.find_address('', 7)
         self.assertTrue(addr is not None)
 
+    def test_address_lookups(self):
+        """ Test lookups of locations and functions by address """
+        src = """
+        module x;
+        function int f(int a)
+        {
+            return a + 1;
+        }
+        function int g(int b)
+        {
+            return f(b) * 2;
+        }
+        """
+        obj = c3c([io.StringIO(src)], [], self.arch, debug=True)
+        self.debugger.load_symbols(obj)
+        self.assertEqual(
+            sorted(self.debugger.addr_map), self.debugger.addresses)
+        functions = {
+            f.name: (self.debugger.calc_address(f.begin),
+                     self.debugger.calc_address(f.end))
+            for f in obj.debug_info.functions}
+        for name in ('f', 'g'):
+            begin, end = functions[name]
+            for pc in (begin, end - 1):
+                with patch.object(self.debugger, 'get_pc', return_value=pc):
+                    self.assertEqual(
+                        name, self.debugger.current_function().name)
+        with patch.object(
+                self.debugger, 'get_pc', return_value=max(functions['g'])):
+            self.assertIsNone(self.debugger.current_function())
+
+        # The closest location is found for any program counter:
+        for pc in range(0, max(functions['g']) + 8, 2):
+            expected = min(
+                self.debugger.addresses, key=lambda a: (abs(a - pc), a))
+            with patch.object(self.debugger, 'get_pc', return_value=pc):
+                loc = self.debugger.addr_map[expected].loc
+                self.assertEqual(
+                    (loc.filename, loc.row), self.debugger.find_pc())
+
+        for row in self.debugger.get_possible_breakpoints(''):
+            address = self.debugger.find_address('', row)
+            self.assertEqual(row, self.debugger.addr_map[address].loc.row)
+
     def test_expressions_with_globals(self):
         """ See if expressions involving global variables can be evaluated """
         src = """
@@ -0,0 +1,92 @@
+import unittest
+import io
+
+from ppci.api import asm, get_arch
+from ppci.arch.data_instructions import DByte
+from ppci.binutils.disasm import Disassembler, DecodeError
+from ppci.binutils.outstream import TextOutputStream
+
+
+class DisassemblerTestCase(unittest.TestCase):
+    """ Test that assembled instructions disassemble into the source """
+
+    def disasm(self, march, data):
+        f = io.StringIO()
+        disassembler = Disassembler(get_arch(march))
+        disassembler.disasm(data, TextOutputStream(f=f))
+        return [line.strip() for line in f.getvalue().splitlines()]
+
+    def check_roundtrip(self, march, lines):
+        obj = asm(io.StringIO("\n".join(lines)), march)
+        data = bytes(obj.get_section("code").data)
+        self.assertEqual(lines, self.disasm(march, data))
+
+    def test_riscv(self):
+        self.check_roundtrip(
+            "riscv",
+            [
+                "addi x6, x4, -5",
+                "lui x6, 5",
+                "sw x5, -8(x2)",
+                "lw x3, -12(x8)",
+                "add x1, x2, x3",
+                "mul x1, x2, x3",
+                "slli x3, x4, 5",
+                "rdcycle x5",
+                "mv x4, x5",
+                "nop",
+                "ebreak",
+            ],
+        )
+
+    def test_msp430(self):
+        """ Test instructions with different addressing modes """
+        self.check_roundtrip(
+            "msp430",
+            [
+                "mov.w r4, r5",
+                "mov.w #1000, r7",
+                "add.w 4(r5), r6",
+                "mov.w @r5+, r6",
+                "mov.b r4, 2(r5)",
+                "push r5",
+            ],
+        )
+
+    def test_unknown_data(self):
+        """ Data which is no instruction is emitted as bytes """
+        disassembler = Disassembler(get_arch("riscv"))
+        self.assertEqual((None, 0), disassembler.take_one(bytes(4)))
+        self.assertEqual([".byte 0"] * 5, self.disasm("riscv", bytes(5)))
+
+    def test_invalid_register(self):
+        """ A register number without register cannot be decoded """
+        disassembler = Disassembler(get_arch("riscv"))
+        # csrwi with an unknown control and status register:
+        data = bytes.fromhex("735091ed")
+        (variant,) = [
+            v
+            for v in disassembler.decoder.candidates(data)
+            if v.instruction.__name__ == "Csrwi"
+        ]
+        tokens = variant.new_tokens()
+        tokens.fill(data)
+        with self.assertRaises(DecodeError):
+            variant.create(variant.root, tokens)
+        self.assertIsNone(variant.decode(data))
+        self.assertEqual((None, 0), disassembler.take_one(data))
+
+    def test_candidates(self):
+        """ Test that only few instructions are tried for decoding """
+        disassembler = Disassembler(get_arch("riscv"))
+        data = bytes.fromhex("1303b2ff")
+        candidates = disassembler.decoder.candidates(data)
+        self.assertLessEqual(len(candidates), 2)
+        ins, size = disassembler.take_one(data)
+        self.assertEqual("addi x6, x4, -5", str(ins))
+        self.assertEqual(4, size)
+        self.assertNotIsInstance(ins, DByte)
+
+
+if __name__ == "__main__":
+    unittest.main()
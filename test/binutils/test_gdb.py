@@ -1,9 +1,14 @@
+import binascii
+import socket
+import threading
+import time
 import unittest
 
 from ppci.api import get_arch
 from ppci.binutils.dbg.debug_driver import DebugState
 from ppci.binutils.dbg.gdb.client import GdbDebugDriver
 from ppci.binutils.dbg.gdb.rsp import decoder, RspHandler
+from ppci.binutils.dbg.gdb.transport import TCP
 
 
 class GdbDecoderTestCase(unittest.TestCase):
@@ -63,14 +68,19 @@ class TransportMock:
     def __init__(self):
         self.send_data = bytearray()
         self.response = None
+        self.responses = []
 
     def send(self, dt):
         self.send_data.extend(dt)
         if self.response:
             data = self.response
             self.response = None
-            for byte in data:
-                self.on_byte(bytes([byte]))
+        elif self.responses and dt.startswith(b'$'):
+            data = self.responses.pop(0)
+        else:
+            return
+        for byte in data:
+            self.on_byte(bytes([byte]))
 
     def inject(self, data):
         for byte in data:
@@ -132,18 +142,47 @@ class GdbClientTestCase(unittest.TestCase):
         self.gdbc.clear_breakpoint(98)
         self.check_send(b'$z0,62,4#9E+')
 
+    def test_get_register_cached(self):
+        """ Test that a register is read with all other registers """
+        self.prepare_response(b'+$010000000200000003000000#86')
+        self.assertEqual(1, self.gdbc.get_pc())
+        self.check_send(b'$g#67+')
+        self.assertEqual(1, self.gdbc.get_pc())
+        self.check_send(b'$g#67+')
+
     def test_read_mem(self):
         """ Test reading of memory """
-        self.prepare_response(b'+$01027309#96')
-        contents = self.gdbc.read_mem(101, 4)
-        self.assertEqual(bytes([1, 2, 0x73, 9]), contents)
-        self.check_send(b'$m 65,4#58+')
+        data = bytes(range(64))
+        pkt = RspHandler.rsp_pack(binascii.b2a_hex(data).decode('ascii'))
+        self.prepare_response(b'+' + pkt.encode('ascii'))
+        contents = self.gdbc.read_mem(37, 4)
+        self.assertEqual(bytes([37, 38, 39, 40]), contents)
+        self.check_send(b'$m 0,40#4D+')
+
+        # The second read is served from the cache:
+        contents = self.gdbc.read_mem(60, 4)
+        self.assertEqual(bytes([60, 61, 62, 63]), contents)
+        self.check_send(b'$m 0,40#4D+')
 
     def test_write_mem(self):
         """ Test write to memory """
-        self.prepare_response(b'+$01027309#96')
+        self.prepare_response(b'+$OK#9a')
+        self.gdbc.write_mem(100, bytes([1, 2, 0x73, 9]))
+        self.check_send(b'$X 64,4:\x01\x02s\t#FB+')
+
+    def test_write_mem_escaped(self):
+        """ Test that special characters are escaped in binary writes """
+        self.prepare_response(b'+$OK#9a')
+        self.gdbc.write_mem(0, b'#$}*\xff')
+        self.check_send(b'$X 0,5:}\x03}\x04}]}\n\xff#A4+')
+
+    def test_write_mem_hex(self):
+        """ Test write to memory when binary writes are not supported """
+        self.transport_mock.responses = [b'+$#00', b'+$OK#9a', b'+$OK#9a']
         self.gdbc.write_mem(100, bytes([1, 2, 0x73, 9]))
-        self.check_send(b'$M 64,4:01027309#07+')
+        self.gdbc.write_mem(100, bytes([1, 2, 0x73, 9]))
+        self.check_send(
+            b'$X 64,4:\x01\x02s\t#FB+$M 64,4:01027309#07+$M 64,4:01027309#07+')
 
     def prepare_response(self, data):
         """ Prepare mock that we expect this data to be received """
@@ -158,5 +197,164 @@ class GdbClientTestCase(unittest.TestCase):
         self.assertEqual(data, self.transport_mock.send_data)
 
 
+class GdbStubServer:
+    """ A minimal gdb server, to test the client against """
+    def __init__(self, arch):
+        self.arch = arch
+        self.memory = bytearray(range(256)) * 16
+        self.registers = [0x10, 0x20, 0x30]
+        self.commands = []
+        self.no_ack_mode = False
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(('localhost', 0))
+        self.server.listen(1)
+        self.port = self.server.getsockname()[1]
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.start()
+
+    def serve(self):
+        connection, _ = self.server.accept()
+        self.connection = connection
+        buffer = bytearray()
+        while True:
+            data = connection.recv(4096)
+            if not data:
+                break
+            buffer.extend(data)
+            while buffer:
+                if buffer[0] in b'+-':
+                    del buffer[0]
+                elif buffer[0] == 3:
+                    del buffer[0]
+                    self.send('S02')
+                elif buffer[0] == ord('$'):
+                    end = buffer.find(b'#')
+                    if end < 0 or len(buffer) < end + 3:
+                        break
+                    packet = buffer[1:end]
+                    del buffer[:end + 3]
+                    if not self.no_ack_mode:
+                        connection.sendall(b'+')
+                    self.handle(unescape(packet).decode('latin-1'))
+                else:
+                    del buffer[0]
+        connection.close()
+        self.server.close()
+
+    def send(self, data):
+        self.connection.sendall(RspHandler.rsp_pack(data).encode('latin-1'))
+
+    def handle(self, command):
+        self.commands.append(command)
+        if command == 'qSupported':
+            self.send('PacketSize=200;QStartNoAckMode+')
+        elif command == 'QStartNoAckMode':
+            self.send('OK')
+            self.no_ack_mode = True
+        elif command == 'g':
+            self.send(''.join('%08x' % swap(r) for r in self.registers))
+        elif command == 's':
+            self.registers[0] += 4
+            self.send('T0500:%08x;' % swap(self.registers[0]))
+        elif command[0] in 'mMX':
+            address, size = command[1:].split(':')[0].split(',')
+            address, size = int(address, 16), int(size, 16)
+            if command[0] == 'm':
+                data = self.memory[address:address + size]
+                self.send(binascii.b2a_hex(data).decode('ascii'))
+            else:
+                data = command.split(':', 1)[1]
+                if command[0] == 'M':
+                    data = binascii.a2b_hex(data)
+                else:
+                    data = data.encode('latin-1')
+                assert len(data) == size
+                self.memory[address:address + size] = data
+                self.send('OK')
+        else:
+            self.send('')
+
+
+def unescape(packet):
+    data = bytearray()
+    escape = False
+    for byte in packet:
+        if escape:
+            data.append(byte ^ 0x20)
+            escape = False
+        elif byte == ord('}'):
+            escape = True
+        else:
+            data.append(byte)
+    return bytes(data)
+
+
+def swap(value):
+    """ Swap the bytes of a 32-bit value, registers are little endian """
+    return int.from_bytes(value.to_bytes(4, 'little'), 'big')
+
+
+class GdbStubServerTestCase(unittest.TestCase):
+    """ Test the client against a gdb server over tcp """
+    arch = get_arch('example')
+
+    def setUp(self):
+        self.server = GdbStubServer(self.arch)
+        self.gdbc = GdbDebugDriver(self.arch, transport=TCP(self.server.port))
+        self.gdbc.connect()
+        self.gdbc.status = DebugState.STOPPED
+
+    def tearDown(self):
+        self.gdbc.disconnect()
+        self.server.thread.join()
+
+    def step(self):
+        self.gdbc.step()
+        for _ in range(100):
+            if self.gdbc.status == DebugState.STOPPED:
+                break
+            time.sleep(0.01)
+        self.assertEqual(DebugState.STOPPED, self.gdbc.status)
+
+    def test_session(self):
+        self.assertTrue(self.gdbc._rsp.no_ack_mode)
+        self.assertEqual(0x200, self.gdbc.max_packet_size)
+        self.step()
+
+        # The program counter is given in the stop packet:
+        self.assertEqual(0x14, self.gdbc.get_pc())
+        regs = self.gdbc.get_registers(self.arch.gdb_registers)
+        self.assertEqual([0x14, 0x20, 0x30], list(regs.values()))
+        self.assertEqual(['qSupported', 'QStartNoAckMode', 's', 'g'],
+                         self.server.commands)
+
+        # Reading memory is done in blocks, and is cached:
+        del self.server.commands[:]
+        self.assertEqual(bytes(range(10, 110)), self.gdbc.read_mem(10, 100))
+        self.assertEqual(bytes(range(20, 30)), self.gdbc.read_mem(20, 10))
+        self.assertEqual(['m 0,80'], self.server.commands)
+
+        # A large read is split over multiple packets:
+        del self.server.commands[:]
+        self.assertEqual(self.server.memory[:1024],
+                         self.gdbc.read_mem(0, 1024))
+        self.assertEqual(
+            ['m 80,c0', 'm 140,c0', 'm 200,c0', 'm 2c0,c0', 'm 380,80'],
+            self.server.commands)
+
+        # Writes are binary, and update the cache:
+        data = b'#$}*\x00\xff'
+        self.gdbc.write_mem(30, data)
+        self.assertEqual(data, self.server.memory[30:36])
+        self.assertEqual(data, self.gdbc.read_mem(30, 6))
+
+        # Continuing invalidates the cache:
+        self.server.memory[31] = 7
+        self.step()
+        del self.server.commands[:]
+        self.assertEqual(7, self.gdbc.read_mem(31, 1)[0])
+        self.assertEqual(['m 0,40'], self.server.commands)
+
+
 if __name__ == '__main__':
     unittest.main()
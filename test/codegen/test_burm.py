@@ -180,6 +180,77 @@ class TreeMatchingTestCase(unittest.TestCase):
         v = selector.gen(context, tree)
         self.assertEqual((1, '+', 2), v)
 
+    class Ctx:
+        tree = None
+
+    def make_const_system(self, accept):
+        system = BurgSystem()
+        for terminal in ['ADD', 'CONST', 'VAL']:
+            system.add_terminal(terminal)
+        system.add_rule(
+            'stm',
+            Tree('ADD', Tree('reg'), Tree('reg')),
+            2,
+            None,
+            lambda ctx, tree, c0, c1: ('add', c0, c1))
+        system.add_rule(
+            'stm',
+            Tree('ADD', Tree('reg'), Tree('CONST')),
+            1,
+            accept,
+            lambda ctx, tree, c0: ('addi', c0, tree[1].value))
+        system.add_rule(
+            'reg',
+            Tree('CONST'),
+            1,
+            None,
+            lambda ctx, tree: tree.value)
+        system.add_rule(
+            'reg',
+            Tree('VAL'),
+            1,
+            None,
+            lambda ctx, tree: tree.value)
+        system.check()
+        return system
+
+    def test_nested_terminal_and_acceptance(self):
+        """ Test patterns with terminals below the root and a condition """
+        def accept(tree):
+            return tree[1].value < 10
+        selector = TreeSelector(self.make_const_system(accept))
+        tree = Tree('ADD', Tree('VAL', value=1), Tree('CONST', value=2))
+        self.assertEqual(('addi', 1, 2), selector.gen(self.Ctx(), tree))
+        tree = Tree('ADD', Tree('VAL', value=1), Tree('CONST', value=20))
+        self.assertEqual(('add', 1, 20), selector.gen(self.Ctx(), tree))
+
+    def test_matcher_cached(self):
+        """ Test that the compiled matcher is shared for equal rules """
+        def accept(tree):
+            return True
+        selector1 = TreeSelector(self.make_const_system(accept))
+        selector2 = TreeSelector(self.make_const_system(accept))
+        self.assertIs(selector1.matcher, selector2.matcher)
+        selector3 = TreeSelector(self.make_const_system(None))
+        self.assertIsNot(selector1.matcher, selector3.matcher)
+
+    def test_undefined_terminal(self):
+        """ Test that trees with unknown names are refused """
+        selector = TreeSelector(self.make_const_system(None))
+        with self.assertRaises(burg.BurgError):
+            selector.gen(self.Ctx(), Tree('SUB', Tree('VAL'), Tree('VAL')))
+
+    def test_chain_closure(self):
+        """ Test that chain rules are applied transitively once """
+        system = BurgSystem()
+        system.add_terminal('VAL')
+        system.add_rule('a', Tree('VAL'), 1, None, None)
+        system.add_rule('b', Tree('a'), 2, None, None)
+        system.add_rule('c', Tree('b'), 3, None, None)
+        system.add_rule('a', Tree('c'), 4, None, None)
+        closure = burg.BurgCompiler(system).chain_closure('a')
+        self.assertEqual([('b', 2, 2), ('c', 5, 3), ('a', 9, 4)], closure)
+
 
 if __name__ == '__main__':
     unittest.main()
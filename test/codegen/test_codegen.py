@@ -9,7 +9,12 @@ from ppci.codegen.irdag import SelectionGraphBuilder
 from ppci.codegen.irdag import FunctionInfo, prepare_function_info
 from ppci.arch.example import ExampleArch
 from ppci.binutils.debuginfo import DebugDb
-from ppci.api import get_arch
+from ppci.binutils.outstream import TextOutputStream
+from ppci.api import get_arch, c_to_ir, ir_to_object, optimize
+from ppci.arch.arch import Frame
+from ppci.codegen import CodeGenerator
+from ppci.codegen.registerallocator import LinearScanRegisterAllocator
+from ppci.utils.reporting import DummyReportGenerator
 
 
 def print_module(m):
@@ -189,5 +194,95 @@ class IrDagTestCase(unittest.TestCase):
         # self.assertTrue(sg_value.vreg)
 
 
+class ParallelCodegenTestCase(unittest.TestCase):
+    """ Check that code generation in several processes works """
+    source = """
+    int g;
+    static int f(int a, int b) { return a * b + g; }
+    int h(int *p, int n) {
+      int s = 0;
+      for (int i = 0; i < n; i++) s += p[i] * f(i, n);
+      return s;
+    }
+    const char *k(void) { return "hello"; }
+    int m(int x) {
+      switch (x) {
+        case 1: return 3;
+        case 2: return 5;
+        default: return h(&x, 1);
+      }
+    }
+    """
+
+    def compile(self, arch, jobs):
+        ir_module = c_to_ir(io.StringIO(self.source), arch)
+        optimize(ir_module, level=2)
+        obj = ir_to_object([ir_module], arch, jobs=jobs)
+        f = io.StringIO()
+        obj.save(f)
+        return f.getvalue()
+
+    def test_identical_output(self):
+        """ Test that a parallel build equals a serial build """
+        for arch in ['arm', 'riscv', 'x86_64']:
+            with self.subTest(arch=arch):
+                serial = self.compile(arch, None)
+                parallel = self.compile(arch, 3)
+                self.assertEqual(serial, parallel)
+
+    def test_text_outstream(self):
+        """ Test that assembly is written when jobs are given """
+        listings = []
+        for jobs in [None, 3]:
+            ir_module = c_to_ir(io.StringIO(self.source), 'arm')
+            f = io.StringIO()
+            ir_to_object(
+                [ir_module], 'arm', outstream=TextOutputStream(f=f), jobs=jobs
+            )
+            listings.append(f.getvalue())
+        self.assertEqual(listings[0], listings[1])
+        self.assertNotIn('encoded', listings[1])
+
+
+class RegisterAllocatorSelectionTestCase(unittest.TestCase):
+    """ Check the selection of the register allocator """
+    source = """
+    int f(int a, int b, int c, int d) {
+      int e = a * b, f = b * c, g = c * d, h = d * a;
+      int i = a + c, j = b + d, k = a - d, l = b - c;
+      int m = e * i + f * j, n = g * k + h * l;
+      return m * n + e + f + g + h + i + j + k + l;
+    }
+    """
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            CodeGenerator(
+                get_arch('x86_64'), DummyReportGenerator(), regalloc='x')
+
+    def test_auto(self):
+        """ Large functions are allocated with linear scan """
+        code_generator = CodeGenerator(
+            get_arch('example'), DummyReportGenerator())
+        code_generator.linear_scan_threshold = 2
+        frame = Frame('tst')
+        frame.instructions.extend([None] * 2)
+        self.assertIs(
+            code_generator.register_allocator,
+            code_generator.get_register_allocator(frame))
+        frame.instructions.append(None)
+        self.assertIsInstance(
+            code_generator.get_register_allocator(frame),
+            LinearScanRegisterAllocator)
+
+    def test_linear_scan(self):
+        """ Test linear scan allocation, with spilling on msp430 """
+        for arch in ['arm', 'msp430', 'riscv', 'x86_64']:
+            with self.subTest(arch=arch):
+                ir_module = c_to_ir(io.StringIO(self.source), arch)
+                obj = ir_to_object([ir_module], arch, regalloc='linear')
+                self.assertTrue(obj.get_section('code').data)
+
+
 if __name__ == '__main__':
     unittest.main()
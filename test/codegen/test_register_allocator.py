@@ -1,10 +1,12 @@
 import unittest
 from unittest.mock import MagicMock
 from ppci.codegen.registerallocator import GraphColoringRegisterAllocator
+from ppci.codegen.registerallocator import LinearScanRegisterAllocator
 from ppci.api import get_arch
 from ppci.arch.arch import Frame
 from ppci.arch.example import Def, Use, Add, Mov, R0, R1, ExampleRegister
 from ppci.arch.example import R10, R10l, DefHalf, UseHalf
+from ppci.arch.example import HalfExampleRegister
 from ppci.arch.x86_64.registers import XmmRegisterSingle, xmm6
 from ppci.arch.x86_64.registers import XmmRegisterDouble
 
@@ -168,5 +170,75 @@ class GraphColoringRegisterAllocatorTestCase(unittest.TestCase):
         assert frame.is_used(xmm6, arch.info.alias)
 
 
+class LinearScanRegisterAllocatorTestCase(unittest.TestCase):
+    """ Test the linear scan register allocator on the example target """
+    def setUp(self):
+        arch = get_arch('example')
+        self.register_allocator = LinearScanRegisterAllocator(
+            arch, None, None)
+
+    def test_register_allocation(self):
+        f = Frame('tst')
+        t1 = ExampleRegister('t1')
+        t2 = ExampleRegister('t2')
+        t3 = ExampleRegister('t3')
+        t4 = ExampleRegister('t4')
+        t5 = ExampleRegister('t5')
+        f.instructions.append(Def(t1))
+        f.instructions.append(Def(t2))
+        f.instructions.append(Def(t3))
+        f.instructions.append(Add(t4, t1, t2))
+        f.instructions.append(Add(t5, t4, t3))
+        f.instructions.append(Use(t5))
+        self.register_allocator.alloc_frame(f)
+        self.assertTrue(all(t.is_colored for t in (t1, t2, t3, t4, t5)))
+        self.assertEqual(3, len({t1.color, t2.color, t3.color}))
+        self.assertNotEqual(t3.color, t4.color)
+
+    def test_precolored(self):
+        """ Virtual registers do not get a register which is in use """
+        f = Frame('tst')
+        t1 = ExampleRegister('t1')
+        t2 = ExampleRegister('t2')
+        f.instructions.append(Def(R0))
+        f.instructions.append(Def(t1))
+        f.instructions.append(Def(R1))
+        f.instructions.append(Add(t2, t1, R0))
+        f.instructions.append(Use(R1))
+        f.instructions.append(Use(t2))
+        self.register_allocator.alloc_frame(f)
+        self.assertNotIn(t1.get_real(), (R0, R1))
+        self.assertNotEqual(R1, t2.get_real())
+
+    def test_move_hint(self):
+        """ A move between registers which get the same color is removed """
+        f = Frame('tst')
+        t1 = ExampleRegister('t1')
+        t2 = ExampleRegister('t2')
+        f.instructions.append(Def(t1))
+        move = Mov(t2, t1, ismove=True)
+        f.instructions.append(move)
+        f.instructions.append(Use(t2))
+        self.register_allocator.alloc_frame(f)
+        self.assertEqual(t1.color, t2.color)
+        self.assertNotIn(move, f.instructions)
+
+    def test_alias(self):
+        """ A register is not used when an alias of it is in use """
+        f = Frame('tst')
+        th = HalfExampleRegister('th')
+        temps = [ExampleRegister('t{}'.format(i)) for i in range(4)]
+        f.instructions.append(DefHalf(th))
+        for t in temps:
+            f.instructions.append(Def(t))
+        for t in temps:
+            f.instructions.append(Use(t))
+        f.instructions.append(UseHalf(th))
+        self.register_allocator.alloc_frame(f)
+        self.assertIs(R10l, th.get_real())
+        self.assertEqual(4, len({t.color for t in temps}))
+        self.assertNotIn(R10, [t.get_real() for t in temps])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,22 @@
+""" Pytest configuration for the ppci test suite.
+
+Compiled objects, such as the runtime of each architecture, are cached on
+disk. The tests use a temporary cache directory, instead of the cache in
+the home folder of the user.
+"""
+
+import os
+import shutil
+import tempfile
+
+_cache_dir = None
+
+
+def pytest_configure(config):
+    global _cache_dir
+    _cache_dir = tempfile.mkdtemp(prefix="ppci-test-cache-")
+    os.environ["PPCI_CACHE_DIR"] = _cache_dir
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_cache_dir, ignore_errors=True)
@@ -328,6 +328,38 @@ class InterferenceGraphTestCase(unittest.TestCase):
         # For repr called:
         self.assertTrue(str(ig.get_node(t4)))
 
+    def test_live_at_entry(self):
+        """ Registers live at entry interfere without being defined """
+        t1 = ExampleRegister('t1')
+        t2 = ExampleRegister('t2')
+        t3 = ExampleRegister('t3')
+        instrs = [Nop(), Use(t1), Def(t3), Use(t2), Use(t3)]
+        cfg = FlowGraph(instrs)
+        cfg.calculate_liveness()
+        ig = InterferenceGraph()
+        ig.calculate_interference(cfg)
+        self.assertTrue(ig.interfere(t1, t2))
+        self.assertTrue(ig.interfere(t2, t3))
+        self.assertFalse(ig.interfere(t1, t3))
+
+    def test_live_sets(self):
+        """ Test the bit vector live sets and live ranges """
+        t1 = ExampleRegister('t1')
+        t2 = ExampleRegister('t2')
+        t3 = ExampleRegister('t3')
+        i1 = Def(t1)
+        i2 = Def(t2)
+        i3 = Use(t1)
+        i4 = Use(t2)
+        cfg = FlowGraph([i1, i2, i3, i4])
+        cfg.calculate_liveness()
+        self.assertEqual({t1, t2}, i2.live_out)
+        self.assertIn(t1, i2.live_out)
+        self.assertNotIn(t3, i2.live_out)
+        self.assertEqual(2, len(i2.live_out))
+        self.assertEqual({t2}, i2.live_out - {t1})
+        self.assertEqual([(i1, i2), (i2, i3)], cfg.live_ranges(t1))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,10 +1,16 @@
 import unittest
 import io
+import os
+import tempfile
 from unittest import mock
 from ppci.common import CompilerError
 from ppci.lang.c import CPreProcessor
 from ppci.lang.c import COptions
 from ppci.lang.c import CTokenPrinter
+from ppci.lang.c.lexer import CLexer, SourceFile
+from ppci.lang.c.preprocessor import IncludeCache, TokenCache
+from ppci.lang.c.preprocessor import find_include_guard, split_lines
+from ppci.utils.cache import DiskCache
 
 
 class CPreProcessorTestCase(unittest.TestCase):
@@ -631,5 +637,138 @@ class CPreProcessorTestCase(unittest.TestCase):
         self.preprocess(src, expected)
 
 
+class CPreProcessorIncludeTestCase(unittest.TestCase):
+    """ Test multiple include optimization and token caching """
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.coptions = COptions()
+        self.coptions.add_include_path(self.folder)
+        self.token_cache = TokenCache()
+        self.include_cache = IncludeCache()
+
+    def make_header(self, name, src):
+        filename = os.path.join(self.folder, name)
+        with open(filename, "w") as f:
+            f.write(src)
+        return filename
+
+    def preprocess(self, src):
+        preprocessor = CPreProcessor(
+            self.coptions,
+            token_cache=self.token_cache,
+            include_cache=self.include_cache,
+        )
+        tokens = preprocessor.process_file(io.StringIO(src), "main.c")
+        return [t.val for t in tokens if hasattr(t, "typ")]
+
+    def test_include_guard(self):
+        self.make_header("a.h", "#ifndef A_H\n#define A_H\nint a;\n#endif\n")
+        src = '#include "a.h"\n#include "a.h"\n#include <a.h>\n'
+        with mock.patch.object(
+            self.token_cache, "get_tokens", wraps=self.token_cache.get_tokens
+        ) as get_tokens:
+            values = self.preprocess(src)
+        self.assertEqual(1, values.count("a"))
+        self.assertEqual(1, get_tokens.call_count)
+
+    def test_pragma_once(self):
+        self.make_header("b.h", "#pragma once\nint b;\n")
+        values = self.preprocess('#include "b.h"\n#include "b.h"\n')
+        self.assertEqual(1, values.count("b"))
+
+    def test_no_include_guard(self):
+        """ Content after the #endif means no guard """
+        self.make_header("c.h", "#ifndef C_H\n#define C_H\n#endif\nint c;\n")
+        values = self.preprocess('#include "c.h"\n#include "c.h"\n')
+        self.assertEqual(2, values.count("c"))
+
+    def test_token_cache(self):
+        """ Test that headers are lexed once, until they are modified """
+        filename = self.make_header("d.h", "int d;\n")
+        with mock.patch.object(
+            self.token_cache, "lex_file", wraps=self.token_cache.lex_file
+        ) as lex_file:
+            self.assertIn("d", self.preprocess('#include "d.h"\n'))
+            self.assertIn("d", self.preprocess('#include "d.h"\n'))
+            self.assertEqual(1, lex_file.call_count)
+
+            self.make_header("d.h", "int e;\n")
+            os.utime(filename, ns=(0, 0))
+            self.assertIn("e", self.preprocess('#include "d.h"\n'))
+            self.assertEqual(2, lex_file.call_count)
+
+    def test_disk_cache(self):
+        """ Test that a new token cache can use lexed tokens from disk """
+        disk_cache = DiskCache(tempfile.mkdtemp())
+        self.make_header("f.h", "#ifndef F_H\n#define F_H\nint f;\n#endif\n")
+        self.token_cache = TokenCache(disk_cache=disk_cache)
+        self.assertIn("f", self.preprocess('#include "f.h"\n'))
+        self.token_cache = TokenCache(disk_cache=disk_cache)
+        with mock.patch.object(self.token_cache, "lex_file") as lex_file:
+            self.assertIn("f", self.preprocess('#include "f.h"\n'))
+            self.assertEqual(0, lex_file.call_count)
+        self.assertEqual(1, disk_cache.hits)
+
+    def test_line_directive_not_cached(self):
+        self.make_header("e.h", '#line 100 "x.h"\nint e;\n')
+        preprocessor = CPreProcessor(
+            self.coptions, token_cache=self.token_cache
+        )
+        src = io.StringIO('#include "e.h"\n')
+        tokens = preprocessor.process_file(src, "main.c")
+        e_token = [t for t in tokens if getattr(t, "val", None) == "e"][0]
+        self.assertEqual(100, e_token.loc.row)
+        self.assertEqual("x.h", e_token.loc.filename)
+
+    def test_include_cache(self):
+        """ Test that search directories are listed once """
+        other = tempfile.mkdtemp()
+        self.coptions.add_include_path(other)
+        with open(os.path.join(other, "g.h"), "w") as f:
+            f.write("int g;\n")
+        self.make_header("h.h", "int h;\n")
+        src = "#include <g.h>\n#include <h.h>\n"
+        with mock.patch("os.listdir", wraps=os.listdir) as listdir:
+            self.assertIn("g", self.preprocess(src))
+            self.assertIn("h", self.preprocess(src))
+        self.assertEqual(2, listdir.call_count)
+        self.assertEqual(2, len(self.include_cache.resolved))
+
+        self.include_cache.clear()
+        self.assertFalse(self.include_cache.listings)
+        self.assertFalse(self.include_cache.resolved)
+
+    def test_dependencies(self):
+        self.make_header("i.h", "#pragma once\n#include <j.h>\n")
+        self.make_header("j.h", "int j;\n")
+        preprocessor = CPreProcessor(self.coptions)
+        src = io.StringIO('#include "i.h"\n#include "i.h"\n')
+        list(preprocessor.process_file(src, "main.c"))
+        self.assertEqual(
+            [
+                os.path.join(self.folder, "i.h"),
+                os.path.join(self.folder, "j.h"),
+            ],
+            preprocessor.dependencies,
+        )
+
+    def find_guard(self, src):
+        tokens = CLexer(self.coptions).lex(io.StringIO(src), SourceFile("x"))
+        return find_include_guard(split_lines(list(tokens)))
+
+    def test_find_include_guard(self):
+        self.assertEqual("X", self.find_guard("#ifndef X\n#endif"))
+        self.assertEqual("X", self.find_guard("#if !defined(X)\n#endif"))
+        self.assertEqual("X", self.find_guard("#if !defined X\n#endif"))
+        self.assertEqual(
+            "X", self.find_guard("#ifndef X\n#if Y\n#endif\n#endif")
+        )
+        self.assertIsNone(self.find_guard("#ifdef X\n#endif"))
+        self.assertIsNone(self.find_guard("#ifndef X\n#else\n#endif"))
+        self.assertIsNone(self.find_guard("#ifndef X\n#endif\n#if Y\n#endif"))
+        self.assertIsNone(self.find_guard("int x;\n#ifndef X\n#endif"))
+
+
 if __name__ == "__main__":
     unittest.main()
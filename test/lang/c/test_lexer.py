@@ -53,6 +53,19 @@ class CLexerTestCase(unittest.TestCase):
         self.assertSequenceEqual(["", " "], [t.space for t in tokens])
         self.assertSequenceEqual([True, False], [t.first for t in tokens])
 
+    def test_locations_after_continued_lines(self):
+        """ Test that locations refer to the lines in the source file """
+        src = "a \\\n  b ??=\n\tc\n/* x\ny */ d"
+        tokens = self.tokenize(src)
+        self.assertSequenceEqual(
+            ["a", "b", "#", "c", "d"], [t.val for t in tokens]
+        )
+        self.assertSequenceEqual([1, 2, 2, 3, 5], [t.loc.row for t in tokens])
+        self.assertSequenceEqual([1, 3, 5, 9, 6], [t.loc.col for t in tokens])
+        self.assertSequenceEqual(
+            [True, False, False, True, True], [t.first for t in tokens]
+        )
+
     def test_block_comment(self):
         """ Test block comments """
         src = "/* bla bla */"
@@ -169,6 +182,14 @@ class CLexerTestCase(unittest.TestCase):
             self.tokenize(src)
         self.assertEqual("Expected '", cm.exception.msg)
 
+    def test_unexpected_character(self):
+        """ Check that the location of an unexpected character is given """
+        src = "int x = 1 \\\n @;"
+        with self.assertRaises(CompilerError) as cm:
+            self.tokenize(src)
+        self.assertEqual("Unexpected character '@'", cm.exception.msg)
+        self.assertEqual((2, 2), (cm.exception.loc.row, cm.exception.loc.col))
+
     def test_float_constant(self):
         """ Test floating point constant
 
@@ -138,5 +138,60 @@ class PythonToIrCompilerTestCase(unittest.TestCase):
         self.do(src7)
 
 
+class IrToPythonTestCase(unittest.TestCase):
+    """ Test the python code generated from ir-code """
+
+    src = """
+    module main;
+    function int f(int a) {
+        var int[4] x;
+        x[1] = a;
+        return x[1] + 1;
+    }
+    function int g(int* p) {
+        return *p;
+    }
+    """
+
+    def load(self, bounds_check, memory_model='flat'):
+        ir_module = api.c3_to_ir([io.StringIO(self.src)], [], 'arm')
+        f = io.StringIO()
+        api.ir_to_python(
+            [ir_module], f, bounds_check=bounds_check,
+            memory_model=memory_model)
+        namespace = {}
+        exec(f.getvalue(), namespace)
+        return namespace
+
+    def test_load_store(self):
+        namespace = self.load(True)
+        self.assertEqual(42, namespace['main_f'](41))
+        address = namespace['_irpy_heap_top']()
+        namespace['_irpy_heap'].extend(bytes(4))
+        namespace['store_i32'](1337, address)
+        self.assertEqual(1337, namespace['main_g'](address))
+        self.assertEqual(1337, namespace['load_i32'](address))
+
+    def test_bounds_check(self):
+        namespace = self.load(True)
+        with self.assertRaises(AssertionError):
+            namespace['main_g'](-4)
+
+        namespace = self.load(False)
+        namespace['main_g'](-4)
+
+    def test_split_memory_model(self):
+        namespace = self.load(True, memory_model='split')
+        self.assertEqual(42, namespace['main_f'](41))
+        address = namespace['_irpy_heap_top']()
+        self.assertGreaterEqual(address, namespace['HEAP_START'])
+        namespace['_irpy_heap'].extend(bytes(4))
+        namespace['store_i32'](1337, address)
+        self.assertEqual(1337, namespace['main_g'](address))
+        self.assertEqual(1337, namespace['load_i32'](address))
+        with self.assertRaises(ValueError):
+            self.load(True, memory_model='paged')
+
+
 if __name__ == '__main__':
     unittest.main()
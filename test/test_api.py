@@ -1,8 +1,11 @@
 import io
+import tempfile
 import unittest
 from unittest.mock import patch
 
-from ppci.api import construct, objcopy, disasm, link
+from ppci.api import construct, objcopy, disasm, link, cc, c3c
+from ppci.api import c_to_ir, ir_to_object
+from ppci.utils.cache import DiskCache
 from ppci.build.tasks import TaskError
 import ppci.build.buildtasks
 
@@ -99,5 +102,52 @@ class ObjcopyTestCase(unittest.TestCase):
             objcopy(None, None, 'invalid_format', None)
 
 
+class CacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = DiskCache(self.tmpdir.name)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_cc_cache(self):
+        """ Check that the preprocessed source is the key into the cache """
+        src = "int add(int a, int b) { return a + b; }"
+        obj1 = cc(io.StringIO(src), 'arm', cache=self.cache)
+        self.assertEqual((0, 1), (self.cache.hits, self.cache.misses))
+        obj2 = cc(io.StringIO(src), 'arm', cache=self.cache)
+        self.assertEqual((1, 1), (self.cache.hits, self.cache.misses))
+        self.assertEqual(obj1, obj2)
+
+        # Different macro usage, but equal preprocessed tokens:
+        src2 = "#define X a\nint add(int X, int b) { return X + b; }"
+        cc(io.StringIO(src2), 'arm', cache=self.cache)
+        self.assertEqual((2, 1), (self.cache.hits, self.cache.misses))
+
+        # Other target:
+        cc(io.StringIO(src), 'riscv', cache=self.cache)
+        self.assertEqual((2, 2), (self.cache.hits, self.cache.misses))
+
+    def test_c3c_cache(self):
+        src = "module main; var int a;"
+        obj1 = c3c([io.StringIO(src)], [], 'arm', cache=self.cache)
+        obj2 = c3c([io.StringIO(src)], [], 'arm', cache=self.cache)
+        self.assertEqual((1, 1), (self.cache.hits, self.cache.misses))
+        self.assertEqual(obj1, obj2)
+
+    def test_ir_cache_variable_values(self):
+        """ Check that the values of variables are part of the key """
+        objs = []
+        for src in ["int x = 1;", "int x = 2;", "int x = 1;"]:
+            ir_module = c_to_ir(io.StringIO(src), 'riscv')
+            objs.append(ir_to_object([ir_module], 'riscv', cache=self.cache))
+        self.assertEqual((1, 2), (self.cache.hits, self.cache.misses))
+        self.assertEqual(
+            [bytes([1, 0, 0, 0]), bytes([2, 0, 0, 0])],
+            [bytes(obj.get_section('data').data) for obj in objs[:2]],
+        )
+        self.assertEqual(objs[0], objs[2])
+
+
 if __name__ == '__main__':
     unittest.main()
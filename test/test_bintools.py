@@ -1,8 +1,11 @@
 import unittest
 import io
+import os
+import tempfile
 from unittest.mock import patch
 
 from ppci.binutils.objectfile import ObjectFile, serialize, deserialize, Image
+from ppci.binutils.objectfile import get_object
 from ppci.binutils.outstream import DummyOutputStream, TextOutputStream
 from ppci.binutils.outstream import binary_and_logging_stream
 from ppci.common import CompilerError
@@ -176,6 +179,45 @@ class ObjectFileTestCase(unittest.TestCase):
         object3 = deserialize(serialize(object1))
         self.assertEqual(object3, object1)
 
+    def test_save_and_load_binary(self):
+        object1, object2 = self.make_twins()
+        object1.entry_symbol_id = 1
+        f1 = io.BytesIO()
+        object1.save(f1)
+        self.assertTrue(f1.getvalue().startswith(b'PPCIOBJ'))
+        f2 = io.BytesIO(f1.getvalue())
+        object3 = ObjectFile.load(f2)
+        self.assertEqual(object3, object1)
+        self.assertEqual(1, object3.entry_symbol_id)
+
+    def test_load_binary_from_disk(self):
+        """ Load a binary object from file """
+        object1, object2 = self.make_twins()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'a.o')
+            with open(filename, 'wb') as f:
+                object1.save(f)
+            object3 = get_object(filename)
+            self.assertEqual(55, object3.get_section('code').size)
+            self.assertEqual(object3, object1)
+            with open(filename, 'r') as f:
+                object4 = get_object(f)
+            self.assertEqual(object4, object1)
+
+    def test_overwrite_loaded_binary_file(self):
+        """ Save a loaded binary object to the file it was loaded from """
+        object1, object2 = self.make_twins()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'a.o')
+            with open(filename, 'wb') as f:
+                object1.save(f)
+            with open(filename, 'rb') as f:
+                object3 = get_object(f)
+            with open(filename, 'wb') as f:
+                object3.save(f)
+            self.assertEqual(object3, object1)
+            self.assertEqual(get_object(filename), object1)
+
     def test_overlapping_sections(self):
         """ Check that overlapping sections are detected """
         obj = ObjectFile(get_arch('msp430'))
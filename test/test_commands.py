@@ -114,6 +114,17 @@ class CcTestCase(unittest.TestCase):
         oj_file = new_temp_file('.oj')
         cc(['-m', 'arm', '-E', self.c_file, '-o', oj_file])
 
+    @patch('sys.stdout', new_callable=io.StringIO)
+    @patch('sys.stderr', new_callable=io.StringIO)
+    def test_cc_command_m(self, mock_stdout, mock_stderr):
+        """ Test emitting a makefile rule with the dependencies """
+        mk_file = new_temp_file('.mk')
+        cc(['-M', self.c_file, '-o', mk_file])
+        with open(mk_file) as f:
+            rule = f.read()
+        self.assertTrue(rule.startswith('std.o: '))
+        self.assertIn('std.h', rule)
+
     @patch('sys.stdout', new_callable=io.StringIO)
     @patch('sys.stderr', new_callable=io.StringIO)
     def test_cc_command_ir(self, mock_stdout, mock_stderr):
@@ -32,6 +32,57 @@ class IrCodeTestCase(unittest.TestCase):
         self.assertEqual({c3, c4}, add.uses)
         self.assertEqual(c4, add.b)
 
+    def test_use_twice(self):
+        """ Check use information of a value used twice """
+        c1 = ir.Const(1, "one", ir.i32)
+        c2 = ir.Const(2, "two", ir.i32)
+        add = ir.add(c1, c1, "add", ir.i32)
+        self.assertEqual({c1}, add.uses)
+
+        # Changing one operand keeps the other usage:
+        add.a = c2
+        self.assertEqual({c1, c2}, add.uses)
+        self.assertEqual({add}, c1.used_by)
+
+        add.replace_use(c1, c2)
+        self.assertEqual({c2}, add.uses)
+        self.assertFalse(c1.is_used)
+        self.assertEqual((c2, c2), (add.a, add.b))
+
+        # Replace all arguments of a call:
+        f = ir.ExternalFunction("f", [ir.i32, ir.i32], ir.i32)
+        call = ir.FunctionCall(f, [c1, c1], "call", ir.i32)
+        c1.replace_by(c2)
+        self.assertEqual([c2, c2], call.arguments)
+        self.assertFalse(c1.is_used)
+
+    def test_clone(self):
+        """ Clone instructions with replaced values and blocks """
+        c1 = ir.Const(1, "one", ir.i32)
+        c2 = ir.Const(2, "two", ir.i32)
+        add = ir.add(c1, c1, "add", ir.i32)
+        add2 = irutils.clone_instruction(add, {c1: c2})
+        self.assertEqual((c2, c2), (add2.a, add2.b))
+        self.assertEqual("add", add2.name)
+        self.assertEqual({add}, c1.used_by)
+
+        block1 = ir.Block("block1")
+        block2 = ir.Block("block2")
+        cjump = ir.CJump(c1, "<", c2, block1, block1)
+        cjump2 = irutils.clone_instruction(cjump, block_map={block1: block2})
+        self.assertEqual([block2, block2], cjump2.targets)
+        self.assertIs(c2, cjump2.b)
+
+    def test_delete_jump_to_same_block(self):
+        """ Delete a conditional jump with the same block as both targets """
+        c1 = ir.Const(1, "one", ir.i32)
+        block = ir.Block("block")
+        cjump = ir.CJump(c1, "<", c1, block, block)
+        self.assertEqual({cjump}, block.references)
+        cjump.delete()
+        self.assertFalse(block.references)
+        self.assertFalse(c1.is_used)
+
 
 class IrBuilderTestCase(unittest.TestCase):
     def setUp(self):
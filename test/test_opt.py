@@ -4,14 +4,24 @@
 import unittest
 import io
 import sys
-from ppci import ir
+from ppci import api, ir
 from ppci import irutils
 from ppci.binutils.debuginfo import DebugDb
 from ppci.irutils import verify_module
 from ppci.opt import Mem2RegPromotor
 from ppci.opt import CleanPass
+from ppci.opt import ConstantFolder, DeleteUnusedInstructionsPass
+from ppci.opt import GlobalValueNumberingPass
+from ppci.opt import SCCPPass
+from ppci.opt import LoopInvariantCodeMotionPass, LoopUnrollPass
+from ppci.opt import InliningPass, PassManager
+from ppci.opt.loops import find_loops
+from ppci.graph.domtree import CfgInfo
+from ppci.graph.callgraph import mod_to_call_graph
 from ppci.opt.constantfolding import correct
 from ppci.opt.tailcall import TailCallOptimization
+from ppci.opt.transform import InstructionPass
+from ppci.utils.reporting import TextReportGenerator
 
 
 class OptTestCase(unittest.TestCase):
@@ -137,6 +147,527 @@ class Mem2RegTestCase(OptTestCase):
         self.assertIn(alloc, self.function.entry.instructions)
 
 
+class GlobalValueNumberingTestCase(OptTestCase):
+    """ Test the removal of redundant computations across blocks """
+    def setUp(self):
+        super().setUp()
+        self.gvn = GlobalValueNumberingPass()
+        self.p = self.builder.emit(ir.Alloc('p', 4, 4))
+        self.address = self.builder.emit(ir.AddressOf(self.p, 'address'))
+        self.a = self.builder.emit(ir.Const(1, 'a', ir.i32))
+        self.b = self.builder.emit(ir.Const(2, 'b', ir.i32))
+
+    def diamond(self):
+        """ Create an if-then-else, and return the three new blocks """
+        then_block = self.builder.new_block()
+        else_block = self.builder.new_block()
+        join_block = self.builder.new_block()
+        self.builder.emit(
+            ir.CJump(self.a, '<', self.b, then_block, else_block))
+        self.builder.set_block(then_block)
+        self.builder.emit(ir.Jump(join_block))
+        self.builder.set_block(else_block)
+        self.builder.emit(ir.Jump(join_block))
+        self.builder.set_block(join_block)
+        return then_block, else_block, join_block
+
+    def test_dominated_block(self):
+        """ Values in a dominating block are reused """
+        add1 = self.builder.emit(ir.add(self.a, self.b, 'add1', ir.i32))
+        cast1 = self.builder.emit(ir.Cast(add1, 'cast1', ir.i8))
+        then_block, _, join_block = self.diamond()
+        add2 = self.builder.emit(ir.add(self.b, self.a, 'add2', ir.i32))
+        cast2 = self.builder.emit(ir.Cast(add2, 'cast2', ir.i8))
+        self.builder.emit(ir.Store(cast2, self.address))
+        self.builder.emit(ir.Exit())
+        self.gvn.run(self.module)
+        self.assertNotIn(add2, join_block)
+        self.assertNotIn(cast2, join_block)
+        self.assertIs(cast1, join_block.instructions[0].value)
+
+    def test_sibling_blocks(self):
+        """ Values in blocks which do not dominate each other remain """
+        then_block, else_block, join_block = self.diamond()
+        add1 = ir.add(self.a, self.b, 'add1', ir.i32)
+        then_block.insert_instruction(ir.Store(add1, self.address))
+        then_block.insert_instruction(add1)
+        add2 = ir.add(self.a, self.b, 'add2', ir.i32)
+        else_block.insert_instruction(ir.Store(add2, self.address))
+        else_block.insert_instruction(add2)
+        self.builder.emit(ir.Exit())
+        self.gvn.run(self.module)
+        self.assertIn(add1, then_block)
+        self.assertIn(add2, else_block)
+
+    def test_load(self):
+        """ Loads are reused when memory was not written in between """
+        load1 = self.builder.emit(ir.Load(self.address, 'load1', ir.i32))
+        _, _, join_block = self.diamond()
+        load2 = self.builder.emit(ir.Load(self.address, 'load2', ir.i32))
+        self.builder.emit(ir.Store(load2, self.address))
+        self.builder.emit(ir.Exit())
+        self.gvn.run(self.module)
+        self.assertNotIn(load2, join_block)
+        self.assertIs(load1, join_block.instructions[0].value)
+
+    def test_load_after_store_on_path(self):
+        """ A store on one path to the block invalidates loads """
+        self.builder.emit(ir.Load(self.address, 'load1', ir.i32))
+        then_block, _, join_block = self.diamond()
+        then_block.insert_instruction(ir.Store(self.b, self.address))
+        load2 = self.builder.emit(ir.Load(self.address, 'load2', ir.i32))
+        self.builder.emit(ir.Store(load2, self.address))
+        self.builder.emit(ir.Exit())
+        self.gvn.run(self.module)
+        self.assertIn(load2, join_block)
+
+    def test_load_after_store(self):
+        """ A load after a store gets the stored value """
+        self.builder.emit(ir.Store(self.b, self.address))
+        _, _, join_block = self.diamond()
+        load = self.builder.emit(ir.Load(self.address, 'load', ir.i32))
+        volatile = self.builder.emit(
+            ir.Load(self.address, 'volatile', ir.i32, volatile=True))
+        self.builder.emit(ir.Store(load, self.address))
+        self.builder.emit(ir.Store(volatile, self.address))
+        self.builder.emit(ir.Exit())
+        self.gvn.run(self.module)
+        self.assertNotIn(load, join_block)
+        self.assertIn(volatile, join_block)
+        self.assertIs(self.b, join_block.instructions[1].value)
+
+
+class SCCPTestCase(OptTestCase):
+    """ Test sparse conditional constant propagation """
+    def setUp(self):
+        super().setUp()
+        self.sccp = SCCPPass()
+        self.p = self.builder.emit(ir.Alloc('p', 4, 4))
+        self.address = self.builder.emit(ir.AddressOf(self.p, 'address'))
+        self.a = self.builder.emit(ir.Const(2, 'a', ir.i32))
+
+    def loop(self, condition):
+        """ Create a loop around a phi, and return the phi and blocks """
+        loop_block = self.builder.new_block()
+        body_block = self.builder.new_block()
+        exit_block = self.builder.new_block()
+        self.builder.emit(ir.Jump(loop_block))
+        self.builder.set_block(loop_block)
+        phi = self.builder.emit(ir.Phi('b', ir.i32))
+        self.builder.emit(
+            ir.CJump(phi, condition, self.a, body_block, exit_block))
+        self.builder.set_block(body_block)
+        c = self.builder.emit(ir.mul(phi, self.a, 'c', ir.i32))
+        self.builder.emit(ir.Jump(loop_block))
+        phi.set_incoming(self.function.entry, self.a)
+        phi.set_incoming(body_block, c)
+        self.builder.set_block(exit_block)
+        self.builder.emit(ir.Store(phi, self.address))
+        self.builder.emit(ir.Exit())
+        return phi, loop_block, body_block
+
+    def test_loop_not_taken(self):
+        """ The loop body is never executed, so the phi is constant """
+        phi, loop_block, body_block = self.loop('<')
+        self.sccp.run(self.module)
+        self.assertNotIn(body_block, self.function)
+        self.assertNotIn(phi, loop_block)
+        self.assertIsInstance(loop_block.last_instruction, ir.Jump)
+        const = loop_block.instructions[0]
+        self.assertIsInstance(const, ir.Const)
+        self.assertEqual(2, const.value)
+
+    def test_loop_taken(self):
+        """ The phi gets different values, and the loop remains """
+        phi, loop_block, body_block = self.loop('<=')
+        self.sccp.run(self.module)
+        self.assertIn(body_block, self.function)
+        self.assertIn(phi, loop_block)
+        self.assertIsInstance(loop_block.last_instruction, ir.CJump)
+
+    def test_fold_operations(self):
+        """ Operations on constants are folded, wrapping on overflow """
+        b = self.builder.emit(ir.Const(127, 'b', ir.i8))
+        c = self.builder.emit(ir.add(b, b, 'c', ir.i8))
+        d = self.builder.emit(ir.Cast(c, 'd', ir.i32))
+        e = self.builder.emit(ir.Binop(d, '/', self.a, 'e', ir.i32))
+        self.builder.emit(ir.Store(e, self.address))
+        self.builder.emit(ir.Exit())
+        self.sccp.run(self.module)
+        self.assertEqual(-1, self.function.entry.instructions[-2].value.value)
+
+    def test_division_by_zero(self):
+        """ Division by zero is not folded """
+        zero = self.builder.emit(ir.Const(0, 'zero', ir.i32))
+        c = self.builder.emit(ir.Binop(self.a, '/', zero, 'c', ir.i32))
+        self.builder.emit(ir.Store(c, self.address))
+        self.builder.emit(ir.Exit())
+        self.sccp.run(self.module)
+        self.assertIn(c, self.function.entry)
+
+
+class LoopTestCase(OptTestCase):
+    """ Test loop analysis and the passes which transform loops """
+    def setUp(self):
+        super().setUp()
+        self.p = self.builder.emit(ir.Alloc('p', 4, 4))
+        self.address = self.builder.emit(ir.AddressOf(self.p, 'address'))
+        self.zero = self.builder.emit(ir.Const(0, 'zero', ir.i32))
+        self.one = self.builder.emit(ir.Const(1, 'one', ir.i32))
+
+    def loop(self, count):
+        """Create a loop which counts from zero to count.
+
+        Returns the header and the body of the loop. The builder is
+        positioned in the body.
+        """
+        entry = self.builder.block
+        header = self.builder.new_block()
+        body = self.builder.new_block()
+        self.exit_block = self.builder.new_block()
+        self.builder.emit(ir.Jump(header))
+        self.builder.set_block(header)
+        phi = self.builder.emit(ir.Phi('i', ir.i32))
+        self.builder.emit(
+            ir.CJump(phi, '<', count, body, self.exit_block))
+        phi.set_incoming(entry, self.zero)
+        self.builder.set_block(body)
+        self.i = phi
+        return header, body
+
+    def close_loop(self, header):
+        """ Increment the counter and jump back to the header """
+        body = self.builder.block
+        j = self.builder.emit(ir.add(self.i, self.one, 'j', ir.i32))
+        self.builder.emit(ir.Jump(header))
+        self.i.set_incoming(body, j)
+        self.builder.set_block(self.exit_block)
+
+    def test_find_nested_loops(self):
+        """ Test nesting of loops """
+        count = self.builder.emit(ir.Const(5, 'count', ir.i32))
+        outer_header, outer_body = self.loop(count)
+        outer_i = self.i
+        outer_exit = self.exit_block
+        inner_header, inner_body = self.loop(count)
+        self.close_loop(inner_header)
+        self.i = outer_i
+        self.exit_block = outer_exit
+        self.close_loop(outer_header)
+        self.builder.emit(ir.Exit())
+        inner, outer = find_loops(CfgInfo(self.function))
+        self.assertIs(inner_header, inner.header)
+        self.assertEqual({inner_header, inner_body}, inner.blocks)
+        self.assertIs(outer_header, outer.header)
+        self.assertIs(outer, inner.parent)
+        self.assertEqual([inner], outer.children)
+        self.assertEqual(5, len(outer.blocks))
+        self.assertEqual([inner_header], inner.exits)
+        self.assertIs(outer_body, inner.preheader)
+        self.assertIs(self.function.entry, outer.preheader)
+
+    def test_make_preheader(self):
+        """ A preheader is created for a loop entered by a branch """
+        header = self.builder.new_block()
+        self.builder.emit(
+            ir.CJump(self.zero, '<', self.one, header, header))
+        self.builder.set_block(header)
+        phi = self.builder.emit(ir.Phi('i', ir.i32))
+        exit_block = self.builder.new_block()
+        self.builder.emit(ir.CJump(phi, '<', self.one, header, exit_block))
+        phi.set_incoming(self.function.entry, self.zero)
+        phi.set_incoming(header, self.one)
+        self.builder.set_block(exit_block)
+        self.builder.emit(ir.Exit())
+        (loop,) = find_loops(CfgInfo(self.function))
+        self.assertIsNone(loop.preheader)
+        preheader = loop.make_preheader()
+        self.assertIs(preheader, loop.preheader)
+        self.assertEqual({preheader}, set(self.function.entry.successors))
+        self.assertIs(self.zero, phi.get_value(preheader))
+
+    def test_hoist_invariants(self):
+        """ Operations on values from outside the loop are moved """
+        a = self.builder.emit(ir.Load(self.address, 'a', ir.i32))
+        header, body = self.loop(a)
+        b = self.builder.emit(ir.mul(a, a, 'b', ir.i32))
+        c = self.builder.emit(ir.Cast(b, 'c', ir.i8))
+        d = self.builder.emit(ir.Binop(self.i, '/', a, 'd', ir.i32))
+        e = self.builder.emit(ir.Binop(a, '/', a, 'e', ir.i32))
+        self.builder.emit(ir.Store(c, self.address))
+        self.builder.emit(ir.Store(d, self.address))
+        self.builder.emit(ir.Store(e, self.address))
+        self.close_loop(header)
+        self.builder.emit(ir.Exit())
+        LoopInvariantCodeMotionPass().run(self.module)
+        self.assertIs(self.function.entry, b.block)
+        self.assertIs(self.function.entry, c.block)
+        self.assertIs(body, d.block)
+        # The division might trap, and is not executed in each iteration:
+        self.assertIs(body, e.block)
+
+    def test_hoist_load(self):
+        """ Loads are moved only when the memory is not written """
+        q = self.builder.emit(ir.Alloc('q', 4, 4))
+        address_q = self.builder.emit(ir.AddressOf(q, 'address_q'))
+        header = self.builder.new_block()
+        exit_block = self.builder.new_block()
+        self.builder.emit(ir.Jump(header))
+        self.builder.set_block(header)
+        a = self.builder.emit(ir.Load(self.address, 'a', ir.i32))
+        b = self.builder.emit(ir.Load(address_q, 'b', ir.i32))
+        self.builder.emit(ir.Store(a, address_q))
+        self.builder.emit(ir.CJump(a, '<', b, header, exit_block))
+        self.builder.set_block(exit_block)
+        self.builder.emit(ir.Exit())
+        LoopInvariantCodeMotionPass().run(self.module)
+        self.assertIsNot(header, a.block)
+        self.assertIs(header, b.block)
+
+    def test_no_hoist_load_with_unknown_store(self):
+        """ A store through an unknown pointer might write any memory """
+        g = ir.Variable('g', ir.Binding.GLOBAL, 4, 4)
+        self.module.add_variable(g)
+        p = ir.Parameter('p', ir.ptr)
+        self.function.add_parameter(p)
+        header = self.builder.new_block()
+        exit_block = self.builder.new_block()
+        self.builder.emit(ir.Jump(header))
+        self.builder.set_block(header)
+        self.builder.emit(ir.Store(self.zero, p))
+        a = self.builder.emit(ir.Load(g, 'a', ir.i32))
+        self.builder.emit(ir.CJump(a, '<', self.one, header, exit_block))
+        self.builder.set_block(exit_block)
+        self.builder.emit(ir.Exit())
+        LoopInvariantCodeMotionPass().run(self.module)
+        self.assertIs(header, a.block)
+
+    def test_unroll(self):
+        """ A loop with a constant trip count is replaced by copies """
+        count = self.builder.emit(ir.Const(3, 'count', ir.i32))
+        header, _ = self.loop(count)
+        self.builder.emit(ir.Store(self.i, self.address))
+        self.close_loop(header)
+        self.builder.emit(ir.Store(self.i, self.address))
+        self.builder.emit(ir.Exit())
+        LoopUnrollPass().run(self.module)
+        self.assertEqual(3, len(self.function.blocks))
+        self.assertNotIn(header, self.function)
+        unrolled = self.function.entry.successors[0]
+        stores = [i for i in unrolled if isinstance(i, ir.Store)]
+        self.assertEqual(3, len(stores))
+        self.assertIs(self.zero, stores[0].value)
+        last_store = self.exit_block.instructions[0]
+        self.assertIs(unrolled.instructions[-2], last_store.value)
+
+    def test_no_unroll(self):
+        """ Loops with an unknown or large trip count remain """
+        count = self.builder.emit(ir.Const(100, 'count', ir.i32))
+        header, _ = self.loop(count)
+        self.close_loop(header)
+        header2, _ = self.loop(
+            self.builder.emit(ir.Load(self.address, 'a', ir.i32)))
+        self.close_loop(header2)
+        self.builder.emit(ir.Exit())
+        LoopUnrollPass().run(self.module)
+        self.assertIn(header, self.function)
+        self.assertIn(header2, self.function)
+
+
+class LoopOptimizationTestCase(unittest.TestCase):
+    """ Run optimized C code with loops """
+    def test_aliased_load_in_loop(self):
+        """ A global written through a pointer is loaded in each iteration """
+        src = """
+        int g;
+        int f(int *p, int n)
+        {
+            int s = 0, i = 0;
+            do {
+                *p = i;
+                s += g;
+                i++;
+            } while (i < n);
+            return s;
+        }
+        int main() { return f(&g, 4); }
+        """
+        for level in ('0', '2', '3'):
+            ir_module = api.c_to_ir(io.StringIO(src), 'arm')
+            api.optimize(ir_module, level=level)
+            f = io.StringIO()
+            api.ir_to_python([ir_module], f)
+            namespace = {}
+            exec(f.getvalue(), namespace)
+            self.assertEqual(6, namespace['main'](), level)
+
+
+class InliningTestCase(OptTestCase):
+    """ Test the inlining of function calls """
+    def setUp(self):
+        super().setUp()
+        self.entry = self.function.entry
+        self.x = self.builder.emit(ir.Const(3, 'x', ir.i32))
+        p = self.builder.emit(ir.Alloc('p', 4, 4))
+        self.address = self.builder.emit(ir.AddressOf(p, 'address'))
+
+    def new_function(self, name, binding=ir.Binding.LOCAL):
+        """ Create a function with one parameter """
+        function = self.builder.new_function(name, binding, ir.i32)
+        self.builder.set_function(function)
+        function.entry = self.builder.new_block()
+        self.builder.set_block(function.entry)
+        parameter = ir.Parameter('a', ir.i32)
+        function.add_parameter(parameter)
+        return function, parameter
+
+    def call(self, function, name='r'):
+        self.builder.set_function(self.function)
+        self.builder.set_block(self.entry)
+        return self.builder.emit(
+            ir.FunctionCall(function, [self.x], name, ir.i32))
+
+    def finish(self):
+        self.builder.set_function(self.function)
+        self.builder.set_block(self.entry)
+        self.builder.emit(ir.Exit())
+
+    def test_inline_small_function(self):
+        """ A small local function is inlined and removed """
+        square, a = self.new_function('square')
+        b = self.builder.emit(ir.mul(a, a, 'b', ir.i32))
+        self.builder.emit(ir.Return(b))
+        r1 = self.call(square, 'r1')
+        r2 = self.call(square, 'r2')
+        self.builder.emit(ir.Store(r1, self.address))
+        self.builder.emit(ir.Store(r2, self.address))
+        self.finish()
+        InliningPass().run(self.module)
+        self.assertNotIn(square, self.module.functions)
+        calls = list(self.function.get_out_calls())
+        self.assertEqual([], calls)
+        store = [
+            i for i in self.function.get_instructions()
+            if isinstance(i, ir.Store)][0]
+        self.assertIsInstance(store.value, ir.Binop)
+        self.assertIs(self.x, store.value.a)
+
+    def test_global_function_kept(self):
+        """ Inlined global functions are not removed """
+        f, a = self.new_function('f', ir.Binding.GLOBAL)
+        self.builder.emit(ir.Return(a))
+        self.call(f)
+        self.finish()
+        InliningPass().run(self.module)
+        self.assertIn(f, self.module.functions)
+        self.assertEqual([], list(self.function.get_out_calls()))
+
+    def test_recursion_not_inlined(self):
+        """ Recursive functions are never inlined """
+        f, a = self.new_function('f')
+        r = self.builder.emit(ir.FunctionCall(f, [a], 'r', ir.i32))
+        self.builder.emit(ir.Return(r))
+        call = self.call(f)
+        self.finish()
+        InliningPass().run(self.module)
+        self.assertIn(f, self.module.functions)
+        self.assertIs(self.function, call.function)
+
+    def test_multiple_returns(self):
+        """ The result of a function with several returns is a phi """
+        f, a = self.new_function('max')
+        block1 = self.builder.new_block()
+        block2 = self.builder.new_block()
+        zero = self.builder.emit(ir.Const(0, 'zero', ir.i32))
+        self.builder.emit(ir.CJump(a, '<', zero, block1, block2))
+        self.builder.set_block(block1)
+        self.builder.emit(ir.Return(zero))
+        self.builder.set_block(block2)
+        self.builder.emit(ir.Return(a))
+        r = self.call(f)
+        store = self.builder.emit(ir.Store(r, self.address))
+        self.finish()
+        InliningPass(max_single_size=0).run(self.module)
+        self.assertNotIn(f, self.module.functions)
+        self.assertIsInstance(store.value, ir.Phi)
+        self.assertIn(self.x, store.value.inputs.values())
+
+    def test_call_graph_components(self):
+        """ Components of the call graph are sorted bottom-up """
+        f, a = self.new_function('f')
+        g, b = self.new_function('g')
+        self.builder.set_function(f)
+        self.builder.set_block(f.entry)
+        r = self.builder.emit(ir.FunctionCall(g, [a], 'r', ir.i32))
+        self.builder.emit(ir.Return(r))
+        self.builder.set_function(g)
+        self.builder.set_block(g.entry)
+        r = self.builder.emit(ir.FunctionCall(f, [b], 'r', ir.i32))
+        self.builder.emit(ir.Return(r))
+        self.call(f)
+        self.finish()
+        call_graph = mod_to_call_graph(self.module)
+        components = call_graph.strongly_connected_components()
+        routines = [{node.routine for node in c} for c in components]
+        self.assertEqual([{f, g}, {self.function}], routines)
+        self.assertFalse(call_graph.get_node(f).is_recursive)
+
+
+class PassManagerTestCase(OptTestCase):
+    """ Test the running of passes by the pass manager """
+    def setUp(self):
+        super().setUp()
+        a = self.builder.emit(ir.Const(1, 'a', ir.i32))
+        b = self.builder.emit(ir.Const(2, 'b', ir.i32))
+        self.c = self.builder.emit(ir.add(a, b, 'c', ir.i32))
+        self.builder.emit(ir.Exit())
+
+    def test_fixpoint(self):
+        """ Passes are repeated until the module does not change """
+        pass_manager = PassManager()
+        pass_manager.add_pass(ConstantFolder())
+        pass_manager.add_fixpoint(
+            [ConstantFolder(), DeleteUnusedInstructionsPass()])
+        pass_manager.run(self.module)
+        self.assertEqual(1, len(self.function.entry))
+        # The last round does not change the module anymore:
+        stats = pass_manager.statistics['DeleteUnusedInstructionsPass']
+        self.assertEqual(3, stats.runs)
+        folder_stats = pass_manager.statistics['ConstantFolder']
+        self.assertEqual(4, folder_stats.runs)
+        self.assertEqual(-3, stats.delta + folder_stats.delta)
+
+    def test_fixpoint_in_place_change(self):
+        """ A change to an instruction in place is a change of the module """
+        c = self.c
+
+        class SubtractPass(InstructionPass):
+            def on_instruction(self, instruction):
+                if instruction is c:
+                    instruction.operation = '-'
+
+        pass_manager = PassManager()
+        pass_manager.add_fixpoint([SubtractPass()])
+        pass_manager.run(self.module)
+        self.assertEqual('-', c.operation)
+        self.assertEqual(2, pass_manager.statistics['SubtractPass'].runs)
+
+    def test_levels(self):
+        """ Each optimization level has a pipeline """
+        for level in [0, 1, 2, 3, 's']:
+            PassManager.from_level(level).run(self.module)
+        with self.assertRaises(ValueError):
+            PassManager.from_level(4)
+
+    def test_report(self):
+        """ The pass statistics are reported """
+        pass_manager = PassManager.from_level(2)
+        pass_manager.run(self.module)
+        f = io.StringIO()
+        pass_manager.report(TextReportGenerator(f))
+        self.assertIn('GlobalValueNumberingPass', f.getvalue())
+
+
 class TypedEvalTestCase(unittest.TestCase):
     """ Test various integer values wrapped at bitsizes and signedness """
     def test_char_overflow(self):
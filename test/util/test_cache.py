@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+
+from ppci.utils.cache import DiskCache, make_key
+
+
+class DiskCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_hit_and_miss(self):
+        cache = DiskCache(self.tmpdir.name)
+        key = make_key('a', 1)
+        self.assertIsNone(cache.get(key))
+        cache.put(key, b'abc')
+        self.assertEqual(b'abc', cache.get(key))
+        self.assertEqual({'hits': 1, 'misses': 1, 'evictions': 0}, cache.stats)
+
+    def test_keys_differ(self):
+        self.assertNotEqual(make_key('ab', 'c'), make_key('a', 'bc'))
+        self.assertEqual(make_key('ab', 'c'), make_key('ab', 'c'))
+
+    def test_lru_eviction(self):
+        """ Check that the least recently used entry is evicted """
+        cache = DiskCache(self.tmpdir.name, max_size=25)
+        key1, key2, key3 = make_key(1), make_key(2), make_key(3)
+        cache.put(key1, bytes(10))
+        cache.put(key2, bytes(10))
+
+        # Make key1 most recently used:
+        os.utime(cache._filename(key2), (1, 1))
+        cache.get(key1)
+
+        cache.put(key3, bytes(10))
+        self.assertEqual(1, cache.evictions)
+        self.assertIsNone(cache.get(key2))
+        self.assertIsNotNone(cache.get(key1))
+        self.assertIsNotNone(cache.get(key3))
+        self.assertEqual(20, cache.size())
+
+    def test_clear(self):
+        cache = DiskCache(self.tmpdir.name)
+        cache.put(make_key(1), bytes(10))
+        cache.clear()
+        self.assertEqual(0, cache.size())
+
+
+if __name__ == '__main__':
+    unittest.main()
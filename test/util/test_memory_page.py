@@ -1,6 +1,6 @@
 import unittest
 
-from ppci.utils.memory_page import MemoryPage
+from ppci.utils.memory_page import MemoryPage, ReservedMemoryPage
 
 
 class MemoryPageTestCase(unittest.TestCase):
@@ -17,3 +17,17 @@ class MemoryPageTestCase(unittest.TestCase):
         p.seek(8)
         data = p.read(6)
         self.assertEqual(data, bytes([9, 88, 89, 92, 13, 0]))
+
+    def test_reserved_memory_page(self):
+        p = ReservedMemoryPage(100, 1 << 24)
+        address = p.addr
+        p.write(98, bytes([1, 2]))
+        with self.assertRaises(IndexError):
+            p.write(99, bytes([1, 2]))
+        p.grow(1 << 20)
+        p.write(99, bytes([3, 4]))
+        self.assertEqual(address, p.addr)
+        self.assertEqual(bytes([1, 3, 4, 0]), p.read(98, 4))
+        self.assertEqual(bytes([1, 3, 4, 0]), p.view[98:102])
+        with self.assertRaises(ValueError):
+            p.grow(1 << 25)
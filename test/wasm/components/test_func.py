@@ -2,6 +2,8 @@
 Test WASM Func definition class.
 """
 
+import pickle
+
 from ppci.wasm import Module, Func, run_wasm_in_node, has_node, Ref
 from ppci.wasm import instantiate
 
@@ -100,6 +102,47 @@ def test_func1():
     assert m1.to_bytes() == b0
 
 
+def test_func_lazy_code():
+    """ Test that instructions of a binary function are decoded on use """
+    m0 = Module("""
+    (module
+      (func $add (param i32 i32) (result i32)
+        (local f32)
+        (i32.add (local.get 0) (local.get 1)))
+    )
+    """)
+    b0 = m0.to_bytes()
+    m1 = Module(b0)
+    f = m1['func'][0]
+    assert f.code is not None
+    assert [(None, 'f32')] == list(f.locals)
+    assert m1.to_bytes() == b0
+
+    # Decode the instructions:
+    assert ['local.get', 'local.get', 'i32.add'] == [
+        i.opcode for i in f.instructions]
+    assert f.code is None
+    assert f[3] is f.instructions
+    assert m1.to_bytes() == b0
+
+
+def test_func_lazy_code_pickle():
+    """ Test that a module with undecoded function bodies can be pickled """
+    b0 = Module("""
+    (module
+      (func $answer (result i32)
+        (i32.const 42))
+    )
+    """).to_bytes()
+    m1 = Module(b0)
+    assert m1['func'][0].code is not None
+    m2 = pickle.loads(pickle.dumps(m1))
+    assert m2.to_bytes() == b0
+    assert ['i32.const'] == [i.opcode for i in m2['func'][0].instructions]
+
+
 if __name__ == '__main__':
     test_func0()
     test_func1()
+    test_func_lazy_code()
+    test_func_lazy_code_pickle()
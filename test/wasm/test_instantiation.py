@@ -1,11 +1,15 @@
 """ Test the ppci.wasm.instantiate function
 """
 
+import gc
 import math
+import tempfile
 import unittest
+from unittest import mock
 from ppci.wasm import instantiate, Module
 from ppci.utils.reporting import html_reporter
 from ppci.api import is_platform_supported
+from ppci.utils.cache import DiskCache
 
 # The below snippet is from the wasm spec test suite.
 # It detected an issue in the x86_64 backend.
@@ -111,3 +115,136 @@ class WasmInstantiationTestCase(unittest.TestCase):
         self.assertEqual(b"abcd", instance.exports.mem0ry[0:4])
         instance.exports.mem0ry[1:3] = bytes([1,2])
         self.assertEqual(b'a\x01\x02d', instance.exports.mem0ry[0:4])
+
+    @unittest.skipUnless(is_platform_supported(), "native code not supported")
+    def test_native_memory_grow(self):
+        """ Test that memory grows in place, and keeps its data """
+        module = Module(
+            ('memory', ('export', 'mem0'), 1, 100),
+            ('func', ('export', 'grow'), ('param', 'i32'), ('result', 'i32'),
+                ('local.get', 0),
+                ('memory.grow',),
+            ),
+            ('func', ('export', 'load'), ('param', 'i32'), ('result', 'i32'),
+                ('local.get', 0),
+                ('i32.load8_u',),
+            ),
+        )
+        instance = instantiate(module, target='native')
+        mem0 = instance.exports.mem0
+        address = instance._memory_data_page.addr
+        mem0[10:12] = bytes([3, 4])
+        for size in range(1, 50):
+            self.assertEqual(size, instance.exports.grow(1))
+        self.assertEqual(-1, instance.exports.grow(51))
+        self.assertEqual(50, instance.memory_size())
+        self.assertEqual(address, instance._memory_data_page.addr)
+        self.assertEqual(bytes([3, 4]), mem0[10:12])
+        mem0[49 * 65536:49 * 65536 + 1] = bytes([5])
+        self.assertEqual(5, instance.exports.load(49 * 65536))
+        self.assertEqual(50 * 65536, len(mem0.view))
+
+    @unittest.skipUnless(is_platform_supported(), "native code not supported")
+    def test_native_memory_view_lifetime(self):
+        """ Test that a view on the memory outlives the instance """
+        module = Module('(module (memory (export "mem0") 1))')
+        view = instantiate(module, target='native').exports.mem0.view
+        gc.collect()
+        view[0] = 7
+        self.assertEqual(7, view[0])
+
+    @unittest.skipUnless(is_platform_supported(), "native code not supported")
+    def test_native_memory_zero_size(self):
+        """ Test a memory which cannot have any pages """
+        module = Module(
+            ('memory', 0, 0),
+            ('func', ('export', 'grow'), ('param', 'i32'), ('result', 'i32'),
+                ('local.get', 0),
+                ('memory.grow',),
+            ),
+        )
+        instance = instantiate(module, target='native')
+        self.assertEqual(-1, instance.exports.grow(1))
+        self.assertEqual(0, instance.exports.grow(0))
+
+    @unittest.skipUnless(is_platform_supported(), "native code not supported")
+    def test_native_memory_small_reservation(self):
+        """ Test that less memory is reserved when address space is low """
+        from ppci.utils import memory_page
+
+        reservation_class = memory_page.UnixReservation
+
+        def reserve(size):
+            if size > 8 * 65536:
+                raise MemoryError("Cannot reserve {} bytes".format(size))
+            return reservation_class(size)
+
+        module = Module(
+            ('memory', 1),
+            ('func', ('export', 'grow'), ('param', 'i32'), ('result', 'i32'),
+                ('local.get', 0),
+                ('memory.grow',),
+            ),
+        )
+        with mock.patch.object(memory_page, 'UnixReservation', reserve):
+            with mock.patch.object(memory_page, 'WinReservation', reserve):
+                instance = instantiate(module, target='native')
+        self.assertEqual(1, instance.exports.grow(7))
+        self.assertEqual(-1, instance.exports.grow(1))
+
+    def test_python_lazy(self):
+        self.check_lazy('python')
+
+    @unittest.skipUnless(is_platform_supported(), "native code not supported")
+    def test_native_lazy(self):
+        self.check_lazy('native')
+
+    def check_lazy(self, target):
+        """ Test direct, recursive and indirect calls to lazy functions """
+        module = Module("""
+        (module
+          (type $t (func (param i32) (result i32)))
+          (table 2 funcref)
+          (elem (i32.const 0) $double $fac)
+          (func $double (param i32) (result i32)
+            (i32.mul (local.get 0) (i32.const 2)))
+          (func $fac (export "fac") (param i32) (result i32)
+            (if (result i32) (i32.lt_s (local.get 0) (i32.const 2))
+              (then (i32.const 1))
+              (else
+                (i32.mul
+                  (local.get 0)
+                  (call $fac (i32.sub (local.get 0) (i32.const 1)))))))
+          (func (export "indirect") (param i32) (param i32) (result i32)
+            (call_indirect (type $t) (local.get 1) (local.get 0)))
+          (func (export "sqrt") (param f64) (result f64)
+            (f64.sqrt (local.get 0)))
+        )
+        """)
+        instance = instantiate(module, target=target, lazy=True)
+        self.assertEqual(120, instance.exports.fac(5))
+        self.assertEqual(720, instance.exports.fac(6))
+        self.assertEqual(42, instance.exports.indirect(0, 21))
+        self.assertEqual(24, instance.exports.indirect(1, 4))
+        self.assertEqual(4.0, instance.exports.sqrt(16.0))
+
+    @unittest.skipUnless(is_platform_supported(), "native code not supported")
+    def test_native_cache(self):
+        """ Test that a second instantiation uses the cached object """
+        module = Module(
+            ('global', '$g1', ('export', 'var1'), ('mut', 'i32'), ('i32.const', 42)),
+            ('func', ('export', 'inc'), ('param', 'i32'), ('result', 'i32'),
+                ('local.get', 0),
+                ('global.get', '$g1'),
+                ('i32.add',),
+            ),
+        )
+        cache = DiskCache(tempfile.mkdtemp())
+        for _ in range(2):
+            instance = instantiate(module, cache_file=cache)
+            self.assertEqual(43, instance.exports.inc(1))
+            self.assertEqual(42, instance.exports.var1.read())
+            instance.exports.var1.write(7)
+            self.assertEqual(8, instance.exports.inc(1))
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(1, cache.misses)
@@ -10,10 +10,15 @@ python -m pytest benchmark.py
 
 """
 
+import ast
+import functools
+import math
 import time
 import os
 import logging
 from glob import glob
+from unittest import mock
+import pytest
 from ppci import api
 from ppci.lang.c import COptions
 
@@ -28,6 +33,15 @@ def test_compile_8cc(benchmark):
     benchmark(compile_8cc)
 
 
+@pytest.mark.parametrize("memory_model", ["split", "flat", "unchecked"])
+@pytest.mark.parametrize("sample", ["primes", "fac_f32", "fact"])
+def test_wasm_samples_on_python(benchmark, sample, memory_model):
+    load_module, function_name, args, expected = WASM_SAMPLES[sample]
+    instance = load_wasm_on_python(load_module(), memory_model)
+    result = benchmark(instance.exports[function_name], *args)
+    assert math.isclose(result, expected, rel_tol=1e-5)
+
+
 def compile_nos_for_riscv():
     """ Compile nOS for riscv architecture. """
     logging.basicConfig(level=logging.INFO)
@@ -62,6 +76,93 @@ def compile_nos_for_riscv():
     )
 
 
+def load_wasm_on_python(wasm_module, memory_model):
+    """Instantiate a wasm module as python code.
+
+    Running the wasm samples is dominated by memory loads and stores,
+    since the wasm locals live in memory.
+
+    The memory model is one of:
+
+    - split: separate stack and heap memories
+    - flat: a single memory, with bounds checks
+    - unchecked: a single memory, without bounds checks
+    """
+    from ppci.wasm import instantiate
+
+    if memory_model == "unchecked":
+        ir_to_python = functools.partial(
+            api.ir_to_python, bounds_check=False
+        )
+    else:
+        ir_to_python = functools.partial(
+            api.ir_to_python, memory_model=memory_model
+        )
+
+    def f64_print(x: float) -> None:
+        print(x)
+
+    imports = {"env": {"f64_print": f64_print}}
+    with mock.patch("ppci.api.ir_to_python", ir_to_python):
+        return instantiate(wasm_module, imports=imports, target="python")
+
+
+def load_primes_module():
+    """ Compile the python primes code of examples/wasm/primes.py """
+    from ppci.lang.python import python_to_wasm
+    from ppci.wasm import Module, components
+
+    # The generated start function returns a value, which is not
+    # allowed, so drop it:
+    wasm_module = python_to_wasm(get_example_source("primes.py", "py3"))
+    return Module(
+        *[d for d in wasm_module if not isinstance(d, components.Start)]
+    )
+
+
+def load_fac_f32_module():
+    """ Load the wasm module of examples/wasm/fac_f32.py """
+    from ppci.wasm import Module
+
+    return Module(get_example_source("fac_f32.py", "src"))
+
+
+def load_fact_module():
+    """ Load examples/src/wasm_fac/fact.wasm """
+    from ppci.wasm import Module
+
+    filename = os.path.join(
+        this_dir, "..", "examples", "src", "wasm_fac", "fact.wasm"
+    )
+    with open(filename, "rb") as f:
+        return Module(f)
+
+
+def get_example_source(filename, name):
+    """ Get the source code assigned to name in a wasm example script """
+    filename = os.path.join(this_dir, "..", "examples", "wasm", filename)
+    with open(filename) as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and node.targets[0].id == name:
+            return ast.literal_eval(node.value)
+    raise ValueError("No {} found in {}".format(name, filename))
+
+
+# The wasm samples, with the function to run, its arguments and the
+# expected result:
+WASM_SAMPLES = {
+    "primes": (load_primes_module, "main", (), 2741),
+    "fac_f32": (
+        load_fac_f32_module,
+        "fac-f32",
+        (30.0,),
+        math.factorial(30),
+    ),
+    "fact": (load_fact_module, "main_fac", (12,), math.factorial(12)),
+}
+
+
 def get_sources(folder, extension):
     resfiles = []
     resdirs = []